@@ -1,60 +1,345 @@
+import contextvars
+import hashlib
 import json
+import logging
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Optional
 
 from promptflow.tracing import trace
 from promptflow.core import Prompty, AzureOpenAIModelConfiguration
 
 BASE_DIR = Path(__file__).absolute().parent
+EVAL_PROMPTY = "eval.prompty"
+CHECKLIST_PROMPTY = "eval_checklist.prompty"
 
+logger = logging.getLogger(__name__)
 
-@trace
-def check(answer: str, statement: str, model_config: AzureOpenAIModelConfiguration):
-    """Check the answer applies for the check statement."""
-    examples = [
-        {
-            "answer": "ChatGPT is a conversational AI model developed by OpenAI.",
-            "statement": "It contains a brief explanation of ChatGPT.",
-            "score": 5,
-            "explanation": "The statement is correct. The answer contains a brief explanation of ChatGPT.",
-        }
-    ]
-
-    prompty = Prompty.load(
-        source=BASE_DIR / "eval.prompty",
+EXAMPLES = [
+    {
+        "answer": "ChatGPT is a conversational AI model developed by OpenAI.",
+        "statement": "It contains a brief explanation of ChatGPT.",
+        "score": 5,
+        "explanation": "The statement is correct. The answer contains a brief explanation of ChatGPT.",
+    }
+]
+
+CHECKLIST_EXAMPLES = [
+    {
+        "answer": "ChatGPT is a conversational AI model developed by OpenAI.",
+        "statements": {
+            "brief": "It contains a brief explanation of ChatGPT.",
+            "history": "It explains when ChatGPT was released.",
+        },
+        "output": {
+            "brief": {
+                "score": 5,
+                "explanation": (
+                    "The statement is correct. The answer contains a brief "
+                    "explanation of ChatGPT."
+                ),
+            },
+            "history": {
+                "score": 1,
+                "explanation": (
+                    "The statement is incorrect. The answer doesn't mention "
+                    "a release date."
+                ),
+            },
+        },
+    }
+]
+
+# Folder of the evaluation cache, set by prompt_eval --eval_cache_dir
+EVAL_CACHE_DIR_ENV = "EVAL_CACHE_DIR"
+
+
+def hash_flow_folder(settings: dict) -> str:
+    """Hash the files of the evaluator folder, eval.prompty included."""
+    sha256 = hashlib.sha256(json.dumps(settings, sort_keys=True).encode())
+    for path in sorted(BASE_DIR.rglob("*")):
+        generated = {"__pycache__", ".promptflow"} & set(path.parts)
+        if path.is_file() and not generated:
+            sha256.update(str(path.relative_to(BASE_DIR)).encode())
+            sha256.update(path.read_bytes())
+    return sha256.hexdigest()
+
+
+class CheckCache:
+    """Results of previous checks, keyed by evaluator version and line."""
+
+    def __init__(self, cache_dir: str, version: str):
+        self.cache_dir = Path(cache_dir)
+        self.version = version
+
+    def _path(self, answer: str, statement: str) -> Path:
+        key = hashlib.sha256(
+            json.dumps(
+                {
+                    "evaluator": self.version,
+                    "inputs": {"answer": answer, "statement": statement},
+                },
+                sort_keys=True,
+            ).encode()
+        ).hexdigest()
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, answer: str, statement: str) -> Optional[dict]:
+        """Get the cached result of a check, None if not found."""
+        try:
+            with open(self._path(answer, statement)) as entry_file:
+                return json.load(entry_file)["result"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, answer: str, statement: str, result: dict):
+        """Store the result of a check."""
+        path = self._path(answer, statement)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(
+            f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+        )
+        with open(temp_path, "w") as entry_file:
+            json.dump({"result": result}, entry_file)
+        os.replace(temp_path, path)
+
+
+def load_prompty(
+    model_config: AzureOpenAIModelConfiguration, file_name: str = EVAL_PROMPTY
+) -> Prompty:
+    """Load an evaluation prompty with the model configuration."""
+    return Prompty.load(
+        source=BASE_DIR / file_name,
         model={"configuration": model_config},
     )
-    output = prompty(examples=examples, answer=answer, statement=statement)
+
+
+def parse_checklist_output(output: dict, keys: list) -> dict:
+    """Get the well formed results of a checklist output, by statement key."""
+    results = {}
+    if not isinstance(output, dict):
+        return results
+    for key in keys:
+        result = output.get(key)
+        if not isinstance(result, dict):
+            continue
+        try:
+            score = int(result.get("score"))
+        except (TypeError, ValueError):
+            continue
+        if 1 <= score <= 5:
+            results[key] = {
+                "score": str(score),
+                "explanation": result.get("explanation", ""),
+            }
+    return results
+
+
+def parse_score(result) -> Optional[int]:
+    """Get the score of a statement result, None if missing or malformed."""
+    try:
+        return int(result["score"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+@trace
+def check(
+    answer: str,
+    statement: str,
+    model_config: AzureOpenAIModelConfiguration,
+    prompty: Optional[Prompty] = None,
+):
+    """Check the answer applies for the check statement."""
+    prompty = prompty or load_prompty(model_config)
+    output = prompty(examples=EXAMPLES, answer=answer, statement=statement)
     output = json.loads(output)
     return output
 
 
+@trace
+def check_all(
+    answer: str,
+    statements: dict,
+    model_config: AzureOpenAIModelConfiguration,
+    prompty: Optional[Prompty] = None,
+):
+    """Check the answer applies for all the check statements in one call."""
+    prompty = prompty or load_prompty(model_config, CHECKLIST_PROMPTY)
+    output = prompty(
+        examples=CHECKLIST_EXAMPLES, answer=answer, statements=statements
+    )
+    if isinstance(output, str):
+        output = json.loads(output)
+    return output
+
+
 class EvalFlow:
-    def __init__(self, model_config: AzureOpenAIModelConfiguration):
+    def __init__(
+        self,
+        model_config: AzureOpenAIModelConfiguration,
+        cache_dir: Optional[str] = None,
+        max_concurrency: int = 8,
+        single_call: bool = False,
+    ):
         self.model_config = model_config
+        # Statements of an answer are checked at the same time
+        self.max_concurrency = max_concurrency
+        # Or all together in a single call, one by one on parse failures
+        self.single_call = single_call
+        self._prompties = {}
+        self._prompty_lock = threading.Lock()
+        # Unchanged answers and statements are not checked again
+        cache_dir = cache_dir or os.environ.get(EVAL_CACHE_DIR_ENV)
+        self.cache = None
+        if cache_dir:
+            deployment = getattr(model_config, "azure_deployment", None)
+            self.cache = CheckCache(
+                cache_dir,
+                hash_flow_folder(
+                    {"deployment": str(deployment), "single_call": single_call}
+                ),
+            )
+
+    def get_prompty(self, file_name: str = EVAL_PROMPTY) -> Prompty:
+        """Evaluation prompty, loaded once and reused by every check."""
+        with self._prompty_lock:
+            if file_name not in self._prompties:
+                self._prompties[file_name] = load_prompty(
+                    self.model_config, file_name
+                )
+            return self._prompties[file_name]
+
+    def _check(self, answer: str, statement: str) -> dict:
+        r = check(
+            answer=answer,
+            statement=statement,
+            model_config=self.model_config,
+            prompty=self.get_prompty(),
+        )
+        if self.cache:
+            self.cache.put(answer, statement, r)
+        return r
+
+    def _check_each(self, answer: str, statements: dict) -> dict:
+        """Check the statements one by one, at the same time."""
+        if self.max_concurrency <= 1 or len(statements) <= 1:
+            return {
+                key: self._check(answer, statement)
+                for key, statement in statements.items()
+            }
+
+        workers = min(self.max_concurrency, len(statements))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Every check runs in a copy of the context to keep its trace
+            futures = {
+                key: executor.submit(
+                    contextvars.copy_context().run,
+                    self._check,
+                    answer,
+                    statement,
+                )
+                for key, statement in statements.items()
+            }
+            return {key: future.result() for key, future in futures.items()}
+
+    def _check_all(self, answer: str, statements: dict) -> dict:
+        """Check the statements in a single call, return the parsed results."""
+        try:
+            output = check_all(
+                answer=answer,
+                statements=statements,
+                model_config=self.model_config,
+                prompty=self.get_prompty(CHECKLIST_PROMPTY),
+            )
+        except ValueError as error:
+            logger.warning(f"Checklist output is not valid JSON: {error}")
+            return {}
+
+        results = parse_checklist_output(output, list(statements))
+        if len(results) < len(statements):
+            logger.warning(
+                "Checklist output has no valid result for "
+                f"{', '.join(key for key in statements if key not in results)}"
+            )
+        for key, r in results.items():
+            if self.cache:
+                self.cache.put(answer, statements[key], r)
+        return results
 
     def __call__(self, answer: str, statements: dict):
         """Check the answer applies for a collection of check statement."""
         if isinstance(statements, str):
             statements = json.loads(statements)
 
+        # Unchanged statements are served from the cache
         results = {}
+        pending = {}
         for key, statement in statements.items():
-            r = check(
-                answer=answer, statement=statement, model_config=self.model_config
-            )
-            results[key] = r
-        return results
+            r = self.cache.get(answer, statement) if self.cache else None
+            if r is None:
+                pending[key] = statement
+            else:
+                results[key] = r
+
+        if self.single_call and len(pending) > 1:
+            results.update(self._check_all(answer, pending))
+            # Statements without a valid result are checked one by one
+            pending = {
+                key: statement
+                for key, statement in pending.items()
+                if key not in results
+            }
+        results.update(self._check_each(answer, pending))
+        return {key: results[key] for key in statements}
 
     def __aggregate__(self, line_results: list) -> dict:
-        """Aggregate the results."""
-        total = len(line_results)
-        avg_correctness = (
-            sum(int(r["correctness"]["score"]) for r in line_results) / total
-        )
-        return {
-            "average_correctness": avg_correctness,
-            "total": total,
-        }
+        """
+        Aggregate the results in a single pass.
+
+        Every statement reports the count, sum and sum of squares of its
+        scores, so the metrics of evaluation shards merge into the exact
+        metrics of the whole evaluation (see llmops.common.aggregation).
+        Missing or malformed scores are not aggregated, they are counted in
+        invalid_scores.
+        """
+        total = 0
+        invalid_scores = 0
+        stats = {}
+        for line_result in line_results:
+            total += 1
+            for key, r in line_result.items():
+                score = parse_score(r)
+                if score is None:
+                    invalid_scores += 1
+                    continue
+                count, score_sum, score_sumsq = stats.get(key, (0, 0, 0))
+                stats[key] = (
+                    count + 1,
+                    score_sum + score,
+                    score_sumsq + score * score,
+                )
+
+        metrics = {"total": total, "invalid_scores": invalid_scores}
+        for key, (count, score_sum, score_sumsq) in stats.items():
+            variance = 0.0
+            if count > 1:
+                variance = max(
+                    (score_sumsq - score_sum * score_sum / count)
+                    / (count - 1),
+                    0.0,
+                )
+            metrics[f"{key}_count"] = count
+            metrics[f"{key}_sum"] = score_sum
+            metrics[f"{key}_sumsq"] = score_sumsq
+            metrics[f"{key}_mean"] = score_sum / count
+            metrics[f"{key}_ci95"] = 1.96 * math.sqrt(variance / count)
+        if "correctness" in stats:
+            metrics["average_correctness"] = metrics["correctness_mean"]
+        return metrics
 
 
 if __name__ == "__main__":
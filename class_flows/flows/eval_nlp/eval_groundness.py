@@ -4,6 +4,7 @@ from promptflow.core import AzureOpenAIModelConfiguration
 from promptflow.evals.evaluate import evaluate
 from promptflow.evals.evaluators import GroundednessEvaluator
 from class_flows.flows.chat_basic.flow import ChatFlow
+from llmops.common.eval_cache import CachedEvaluator, get_eval_cache
 
 
 def eval_use_case(
@@ -22,6 +23,13 @@ def eval_use_case(
     chat_flow = ChatFlow(model_config=model_config, max_total_token=4096)
 
     groundness_eval = GroundednessEvaluator(model_config=model_config)
+    # Lines scored by a previous evaluation are served from the cache
+    eval_cache = get_eval_cache(
+        os.path.dirname(os.path.abspath(__file__)),
+        {"deployment": model_config.azure_deployment},
+    )
+    if eval_cache is not None:
+        groundness_eval = CachedEvaluator(groundness_eval, eval_cache)
     results = evaluate(
         evaluation_name=run_name,
         data=data_id,
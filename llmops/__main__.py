@@ -0,0 +1,103 @@
+"""
+Run several llmops stages in a single process.
+
+Stages run one after the other with their usual command line arguments.
+They share the Azure credential, tokens and clients of the process (see
+llmops.common.clients), which are created once instead of once per stage.
+
+Usage:
+python -m llmops <stage> [stage arguments] [<stage> [stage arguments] ...]
+
+Stages:
+prompt_pipeline, prompt_eval, leaderboard, register_data_asset, get_workspace,
+register_model, provision_endpoint, provision_deployment,
+kubernetes_endpoint, kubernetes_deployment, test_model_on_aml,
+test_model_on_kubernetes, migrate_connections
+
+Example:
+python -m llmops
+    prompt_pipeline --base_path ./web_classification --variants defaults
+        --output_file run_id.txt
+    prompt_eval --base_path ./web_classification --run_id run_id.txt
+"""
+
+import importlib
+import sys
+import time
+from typing import List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from llmops.common.logger import llmops_logger
+
+logger = llmops_logger("llmops")
+
+STAGES = {
+    "prompt_pipeline": "llmops.common.prompt_pipeline",
+    "prompt_eval": "llmops.common.prompt_eval",
+    "leaderboard": "llmops.common.leaderboard",
+    "register_data_asset": "llmops.common.register_data_asset",
+    "get_workspace": "llmops.common.get_workspace",
+    "register_model": "llmops.common.deployment.register_model",
+    "provision_endpoint": "llmops.common.deployment.provision_endpoint",
+    "provision_deployment": "llmops.common.deployment.provision_deployment",
+    "kubernetes_endpoint": "llmops.common.deployment.kubernetes_endpoint",
+    "kubernetes_deployment": (
+        "llmops.common.deployment.kubernetes_deployment"
+    ),
+    "test_model_on_aml": "llmops.common.deployment.test_model_on_aml",
+    "test_model_on_kubernetes": (
+        "llmops.common.deployment.test_model_on_kubernetes"
+    ),
+    "migrate_connections": "llmops.common.deployment.migrate_connections",
+}
+
+
+def split_stages(argv: List[str]) -> List[Tuple[str, List[str]]]:
+    """
+    Split the command line in stages and their arguments.
+
+    :param argv: Command line arguments.
+    :type argv: List[str]
+    :return: List of stage names and stage arguments.
+    :rtype: List[Tuple[str, List[str]]]
+    :raises ValueError: If the command line doesn't start with a stage.
+    """
+    stages: List[Tuple[str, List[str]]] = []
+    for arg in argv:
+        if arg in STAGES:
+            stages.append((arg, []))
+        elif not stages:
+            raise ValueError(
+                f"Unknown stage {arg}, expected one of {', '.join(STAGES)}"
+            )
+        else:
+            stages[-1][1].append(arg)
+    if not stages:
+        raise ValueError(f"No stage, expected one of {', '.join(STAGES)}")
+    return stages
+
+
+def main(argv: Optional[List[str]] = None):
+    """
+    Run the stages of the command line in order.
+
+    Returns:
+        None
+    """
+    stages = split_stages(sys.argv[1:] if argv is None else argv)
+    for stage, stage_args in stages:
+        logger.info(f"Running stage {stage}")
+        start = time.perf_counter()
+        module = importlib.import_module(STAGES[stage])
+        module.main(stage_args)
+        logger.info(
+            f"Stage {stage} finished in {time.perf_counter() - start:.1f}s"
+        )
+
+
+if __name__ == "__main__":
+    # Load variables from .env file into the environment
+    load_dotenv(override=True)
+
+    main()
@@ -0,0 +1,276 @@
+"""
+Streaming, mergeable aggregation of evaluation metrics.
+
+Aggregations keep a small state instead of every line result: counts, sums,
+sums of squares and a bounded reservoir sample for quantiles. States of
+partial evaluations (shards of a dataset, evaluations run by several
+processes) merge into the exact counts, means and confidence intervals of
+the whole evaluation.
+
+Evaluation flows report the state of their statistics as flat metrics:
+- <name>_count: number of values.
+- <name>_sum: sum of the values.
+- <name>_sumsq: sum of the squared values.
+- <name>_mean: mean of the values.
+- <name>_ci95: half width of the 95% confidence interval of the mean.
+
+The module contains the following classes:
+- StreamingStats: Mergeable count, mean, variance and quantiles.
+
+The module contains the following functions:
+- merge_metrics: Merge the metrics of partial evaluations.
+"""
+
+import math
+import random
+from typing import Any, Dict, Iterable, List, Optional
+
+# Metrics summed when partial evaluations are merged
+ADDITIVE_METRICS = ("total", "invalid_scores")
+
+# Metrics reported under a former name, from their statistics
+METRIC_ALIASES = {
+    "average_correctness": "correctness_mean",
+    "accuracy": "accuracy_mean",
+}
+
+_STATE_SUFFIXES = ("_count", "_sum", "_sumsq")
+_DERIVED_SUFFIXES = ("_mean", "_ci95")
+_Z_95 = 1.96
+
+
+class StreamingStats:
+    """
+    Mergeable count, mean, variance and quantiles of a stream of values.
+
+    Quantiles are estimated from a uniform reservoir sample of at most
+    reservoir_size values. Merged reservoirs stay uniform samples of the
+    merged stream.
+
+    :param reservoir_size: Maximum number of values kept for quantiles,
+    0 to not estimate quantiles.
+    :type reservoir_size: int
+    :param seed: Seed of the reservoir sampling.
+    :type seed: Optional[int]
+    """
+
+    def __init__(self, reservoir_size: int = 1000, seed: Optional[int] = None):
+        """Initialize StreamingStats object."""
+        self.reservoir_size = reservoir_size
+        self.count = 0
+        self.sum = 0.0
+        self.sumsq = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.reservoir: List[float] = []
+        self._random = random.Random(seed)
+
+    def add(self, value: float):
+        """Add a value to the statistics."""
+        value = float(value)
+        self.count += 1
+        self.sum += value
+        self.sumsq += value * value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if len(self.reservoir) < self.reservoir_size:
+            self.reservoir.append(value)
+        elif self.reservoir_size:
+            index = self._random.randrange(self.count)
+            if index < self.reservoir_size:
+                self.reservoir[index] = value
+
+    def update(self, values: Iterable[float]) -> "StreamingStats":
+        """Add every value of an iterable, return the statistics."""
+        for value in values:
+            self.add(value)
+        return self
+
+    def merge(self, other: "StreamingStats") -> "StreamingStats":
+        """Merge the statistics of another stream into these ones."""
+        if other.count:
+            self.reservoir = self._merge_reservoirs(other)
+        self.count += other.count
+        self.sum += other.sum
+        self.sumsq += other.sumsq
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def _merge_reservoirs(self, other: "StreamingStats") -> List[float]:
+        size = min(
+            self.reservoir_size,
+            len(self.reservoir) + len(other.reservoir),
+        )
+        merged = []
+        mine, theirs = list(self.reservoir), list(other.reservoir)
+        count, other_count = self.count, other.count
+        # Each sample is drawn from a stream in proportion to its weight
+        while len(merged) < size and (mine or theirs):
+            take_mine = theirs == [] or (
+                mine != []
+                and self._random.random() * (count + other_count) < count
+            )
+            source = mine if take_mine else theirs
+            merged.append(source.pop(self._random.randrange(len(source))))
+            if take_mine:
+                count -= 1
+            else:
+                other_count -= 1
+        return merged
+
+    @property
+    def mean(self) -> float:
+        """Mean of the values, nan without values."""
+        return self.sum / self.count if self.count else math.nan
+
+    @property
+    def variance(self) -> float:
+        """Sample variance of the values, 0 with less than two values."""
+        if self.count < 2:
+            return 0.0
+        variance = (self.sumsq - self.sum * self.sum / self.count) / (
+            self.count - 1
+        )
+        # Rounding errors can make the variance of equal values negative
+        return max(variance, 0.0)
+
+    @property
+    def ci95(self) -> float:
+        """Half width of the 95% confidence interval of the mean."""
+        if not self.count:
+            return math.nan
+        return _Z_95 * math.sqrt(self.variance / self.count)
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile, q between 0 and 1, from the reservoir."""
+        if not self.reservoir:
+            return math.nan
+        values = sorted(self.reservoir)
+        position = q * (len(values) - 1)
+        lower = math.floor(position)
+        upper = min(lower + 1, len(values) - 1)
+        return values[lower] + (values[upper] - values[lower]) * (
+            position - lower
+        )
+
+    def to_metrics(self, name: str) -> Dict[str, float]:
+        """Get the flat metrics of the statistics."""
+        return {
+            f"{name}_count": self.count,
+            f"{name}_sum": self.sum,
+            f"{name}_sumsq": self.sumsq,
+            f"{name}_mean": self.mean,
+            f"{name}_ci95": self.ci95,
+        }
+
+    @classmethod
+    def from_metrics(
+        cls, metrics: Dict[str, Any], name: str
+    ) -> "StreamingStats":
+        """
+        Restore the statistics of flat metrics, without quantiles.
+
+        A missing sum of squares makes the confidence interval unknown.
+        """
+        stats = cls(reservoir_size=0)
+        stats.count = int(metrics[f"{name}_count"])
+        stats.sum = float(metrics[f"{name}_sum"])
+        stats.sumsq = float(metrics.get(f"{name}_sumsq", math.nan))
+        return stats
+
+
+def _stat_names(metrics: Dict[str, Any]) -> List[str]:
+    return [
+        key[: -len("_count")]
+        for key in metrics
+        if key.endswith("_count") and f"{key[:-len('_count')]}_sum" in metrics
+    ]
+
+
+def merge_metrics(
+    metrics_list: List[Dict[str, Any]],
+    additive: Iterable[str] = ADDITIVE_METRICS,
+    aliases: Optional[Dict[str, str]] = None,
+    weights: Optional[List[float]] = None,
+) -> Dict[str, Any]:
+    """
+    Merge the metrics of partial evaluations.
+
+    Statistics (<name>_count and <name>_sum metrics) are merged exactly and
+    their mean and confidence interval recomputed. Additive metrics are
+    summed, aliases are recomputed from their statistics. Other metrics are
+    kept when all the partial evaluations agree, and dropped otherwise,
+    unless weights are given: numeric metrics are then averaged with the
+    weights, which is exact for means over the lines.
+
+    :param metrics_list: Metrics of the partial evaluations.
+    :type metrics_list: List[Dict[str, Any]]
+    :param additive: Names of the metrics summed.
+    :type additive: Iterable[str]
+    :param aliases: Dictionary from metric name to the derived metric it is
+    computed from. Default is METRIC_ALIASES.
+    :type aliases: Optional[Dict[str, str]]
+    :param weights: Number of lines of the partial evaluations.
+    :type weights: Optional[List[float]]
+    :return: Metrics of the whole evaluation.
+    :rtype: Dict[str, Any]
+    """
+    aliases = METRIC_ALIASES if aliases is None else aliases
+    additive = set(additive)
+    merged: Dict[str, Any] = {}
+    stats: Dict[str, StreamingStats] = {}
+    stat_keys = set()
+
+    for metrics in metrics_list:
+        for name in _stat_names(metrics):
+            partial = StreamingStats.from_metrics(metrics, name)
+            if name in stats:
+                stats[name].merge(partial)
+            else:
+                stats[name] = partial
+            stat_keys.update(
+                f"{name}{suffix}"
+                for suffix in _STATE_SUFFIXES + _DERIVED_SUFFIXES
+            )
+
+    for name, stat in stats.items():
+        merged.update(stat.to_metrics(name))
+        if math.isnan(stat.sumsq):
+            del merged[f"{name}_sumsq"]
+            del merged[f"{name}_ci95"]
+
+    keys = dict.fromkeys(key for metrics in metrics_list for key in metrics)
+    for key in keys:
+        if key in stat_keys:
+            continue
+        values = [metrics[key] for metrics in metrics_list if key in metrics]
+        if key in additive:
+            merged[key] = sum(values)
+        elif key in aliases and aliases[key] in merged:
+            merged[key] = merged[aliases[key]]
+        elif len(values) == len(metrics_list) and all(
+            value == values[0] for value in values
+        ):
+            merged[key] = values[0]
+        elif weights is not None and len(values) == len(metrics_list):
+            mean = _weighted_mean(values, weights)
+            if mean is not None:
+                merged[key] = mean
+    return merged
+
+
+def _weighted_mean(
+    values: List[Any], weights: List[float]
+) -> Optional[float]:
+    if not all(
+        isinstance(value, (int, float)) and not isinstance(value, bool)
+        for value in values
+    ):
+        return None
+    total = sum(weights)
+    if not total:
+        return None
+    return sum(value * weight for value, weight in zip(values, weights)) / (
+        total
+    )
@@ -0,0 +1,177 @@
+"""
+Process-wide cache of Azure credentials and clients.
+
+Every llmops stage needs an Azure credential, an MLClient and a prompt flow
+client. Creating them and acquiring tokens takes seconds, so they are
+created once per process and workspace and shared by all the stages that
+run in the same process (see the llmops driver, python -m llmops).
+
+The module contains the following classes:
+- CachedTokenCredential: Credential reusing tokens until they expire.
+
+The module contains the following functions:
+- get_credential: Shared Azure credential.
+- get_ml_client: Shared MLClient of a workspace.
+- get_azure_pf_client: Shared Azure prompt flow client of a workspace.
+- get_local_pf_client: Shared local prompt flow client.
+- clear_clients: Forget the cached credential and clients.
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from azure.ai.ml import MLClient
+from azure.core.credentials import AccessToken
+from azure.identity import DefaultAzureCredential
+
+# Tokens expiring in less than this number of seconds are refreshed
+_TOKEN_REFRESH_MARGIN = 300
+
+_lock = threading.RLock()
+_credential = None
+_ml_clients: Dict[Tuple[str, str, str], MLClient] = {}
+_pf_clients: Dict[Optional[Tuple[str, str, str]], Any] = {}
+
+
+class CachedTokenCredential:
+    """
+    Credential reusing tokens until they expire.
+
+    Some credentials of the DefaultAzureCredential chain, like the Azure CLI
+    credential, start a new process for every token request.
+
+    :param credential: The wrapped credential.
+    :type credential: azure.core.credentials.TokenCredential
+    """
+
+    def __init__(self, credential):
+        """Initialize CachedTokenCredential object."""
+        self.credential = credential
+        self._tokens: Dict[Tuple, AccessToken] = {}
+        self._lock = threading.Lock()
+
+    def get_token(
+        self,
+        *scopes: str,
+        claims: Optional[str] = None,
+        tenant_id: Optional[str] = None,
+        **kwargs: Any,
+    ) -> AccessToken:
+        """Get a token, reusing the cached one if it is still valid."""
+        key = (scopes, claims, tenant_id)
+        with self._lock:
+            token = self._tokens.get(key)
+            if (
+                token is not None
+                and token.expires_on - time.time() > _TOKEN_REFRESH_MARGIN
+            ):
+                return token
+            token = self.credential.get_token(
+                *scopes, claims=claims, tenant_id=tenant_id, **kwargs
+            )
+            self._tokens[key] = token
+            return token
+
+    def close(self):
+        """Close the wrapped credential."""
+        self.credential.close()
+
+
+def get_credential() -> CachedTokenCredential:
+    """
+    Get the Azure credential shared by the process.
+
+    :return: DefaultAzureCredential with token caching.
+    :rtype: CachedTokenCredential
+    """
+    global _credential
+    with _lock:
+        if _credential is None:
+            _credential = CachedTokenCredential(DefaultAzureCredential())
+        return _credential
+
+
+def get_ml_client(
+    subscription_id: str,
+    resource_group_name: str,
+    workspace_name: str,
+) -> MLClient:
+    """
+    Get the MLClient of a workspace shared by the process.
+
+    :param subscription_id: Subscription ID of the workspace.
+    :type subscription_id: str
+    :param resource_group_name: Resource group of the workspace.
+    :type resource_group_name: str
+    :param workspace_name: Name of the workspace.
+    :type workspace_name: str
+    :return: MLClient of the workspace.
+    :rtype: MLClient
+    """
+    key = (subscription_id, resource_group_name, workspace_name)
+    with _lock:
+        if key not in _ml_clients:
+            _ml_clients[key] = MLClient(
+                subscription_id=subscription_id,
+                resource_group_name=resource_group_name,
+                workspace_name=workspace_name,
+                credential=get_credential(),
+            )
+        return _ml_clients[key]
+
+
+def get_azure_pf_client(
+    subscription_id: str,
+    resource_group_name: str,
+    workspace_name: str,
+):
+    """
+    Get the Azure prompt flow client of a workspace shared by the process.
+
+    :param subscription_id: Subscription ID of the workspace.
+    :type subscription_id: str
+    :param resource_group_name: Resource group of the workspace.
+    :type resource_group_name: str
+    :param workspace_name: Name of the workspace.
+    :type workspace_name: str
+    :return: Azure prompt flow client of the workspace.
+    :rtype: promptflow.azure.PFClient
+    """
+    # Imported on first use, deployment stages don't need prompt flow
+    from promptflow.azure import PFClient
+
+    key = (subscription_id, resource_group_name, workspace_name)
+    with _lock:
+        if key not in _pf_clients:
+            _pf_clients[key] = PFClient(
+                credential=get_credential(),
+                subscription_id=subscription_id,
+                workspace_name=workspace_name,
+                resource_group_name=resource_group_name,
+            )
+        return _pf_clients[key]
+
+
+def get_local_pf_client():
+    """
+    Get the local prompt flow client shared by the process.
+
+    :return: Local prompt flow client.
+    :rtype: promptflow.client.PFClient
+    """
+    from promptflow.client import PFClient
+
+    with _lock:
+        if None not in _pf_clients:
+            _pf_clients[None] = PFClient()
+        return _pf_clients[None]
+
+
+def clear_clients():
+    """Forget the cached credential and clients."""
+    global _credential
+    with _lock:
+        _credential = None
+        _ml_clients.clear()
+        _pf_clients.clear()
@@ -1,22 +1,38 @@
 """Common utility functions for the promptflow package."""
 import ast
+import copy
 import logging
 import os
-import time
 import yaml
-import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from enum import Enum
-from typing import Dict, Union
-
-from promptflow.entities import Run
-
-_FLOW_DAG_FILENAME = ("flow.dag.yml", "flow.dag.yaml")
-_FLOW_FLEX_FILENAME = ("flow.flex.yml", "flow.flex.yaml")
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from llmops.common.folder_hash import hash_file, hash_folder_contents
+from llmops.common.run_poller import COMPLETED_STATUSES, RunPoller
+
+if TYPE_CHECKING:
+    from promptflow.entities import Run
 
 REQUEST_TIMEOUT_MS = 3 * 60 * 1000
+# Seconds to wait for a job whose status can't be refreshed
+STALE_JOB_TIMEOUT = 15.0
 
 yaml_base_name = "config"
 
+# Parsed YAML files of the process, by path, with their modification time
+_yaml_cache: Dict[str, Tuple[Tuple[int, int], Any]] = {}
+
 
 class FlowTypeOption(Enum):
     """Flow type options."""
@@ -45,6 +61,66 @@ class ClientObjectWrapper:
             raise ValueError("Neither 'pf' nor 'ml_client' is available")
 
 
+def generate_file_hash(file_path):
+    """
+    Generate hash of a file, read in fixed-size chunks.
+
+    Returns:
+        hash as string
+    """
+    return hash_file(file_path)
+
+
+def hash_folder(folder_path):
+    """
+    Generate hash for entire folder.
+
+    Files are hashed in parallel, sorted by path and without the files of
+    the ignore file of the folder (see llmops.common.folder_hash).
+
+    Returns:
+        hash as string
+    """
+    return hash_folder_contents(folder_path)
+
+
+def file_signature(file_path: str) -> Optional[Tuple[int, int]]:
+    """
+    Get the modification time and size of a file.
+
+    :return: Modification time in nanoseconds and size in bytes,
+    None if the file doesn't exist.
+    :rtype: Optional[Tuple[int, int]]
+    """
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def load_yaml(file_path: str) -> Any:
+    """
+    Load a YAML file, parsed once per process until it changes.
+
+    Files are parsed again when their modification time or size changes.
+    Every call returns a copy of the parsed content that callers can change.
+
+    :return: The parsed content of the file.
+    :rtype: Any
+    """
+    path = os.path.abspath(file_path)
+    signature = file_signature(path)
+    cached = _yaml_cache.get(path)
+    if signature is None or cached is None or cached[0] != signature:
+        with open(path, "r") as file:
+            content = yaml.safe_load(file)
+        if signature is not None:
+            _yaml_cache[path] = (signature, content)
+        return copy.deepcopy(content)
+    return copy.deepcopy(cached[1])
+
+
 def resolve_env_vars(base_path: str) -> Dict:
     """
     Resolve the environment variables from the config files.
@@ -91,138 +167,99 @@ def resolve_flow_type(
     """
     Resolve the flow type based on the flow folder files.
 
-    :return: The selected flow type.
+    The flow folder is scanned once per process (see
+    llmops.common.flow_manifest).
+
+    :return: The selected flow type and the init parameters of class
+    based flows.
     :rtype: VariantSelectionOption
     """
-    flow_type: FlowTypeOption = None
-    safe_base_path = base_path or ""
-    found_flex = False
-    found_dag = False
-    params_dict = {}
-    for root, dirs, files in os.walk(os.path.join(safe_base_path, flow_path)):
-        for file in files:
-            if file in _FLOW_FLEX_FILENAME:
-                found_flex = True
-                flow_file_path = os.path.abspath(
-                    os.path.join(safe_base_path, flow_path, file)
-                    )
-            elif file in _FLOW_DAG_FILENAME:
-                found_dag = True
-                flow_file_path = os.path.abspath(
-                    os.path.join(safe_base_path, flow_path, file)
-                    )
-
-    if found_flex is False and found_dag is False:
-        flow_type = FlowTypeOption.NO_FLOW
-        params_dict = {}
-
-    if found_flex is True and found_dag is False:
-        with open(flow_file_path) as file:
-            config = yaml.safe_load(file)
-
-        entry_value = config["entry"]
-        file_name, entry_name = entry_value.split(":")
-        with open(os.path.abspath(os.path.join(
-            safe_base_path, flow_path, file_name + ".py"))
-        ) as file:
-            source_code = file.read()
-        tree = ast.parse(source_code)
-
-        entry_object = None
-        for node in ast.walk(tree):
-            if (
-                isinstance(node, (ast.FunctionDef, ast.ClassDef))
-                and node.name == entry_name
-            ):
-                entry_object = node
-                break
-        if entry_object is None:
-            raise ValueError(f"Entry '{entry_name}' not found in the module.")
-
-        if isinstance(entry_object, ast.ClassDef):
-            if os.path.isfile(os.path.abspath(os.path.join(
-                safe_base_path, flow_path, "init.json"))
-            ):
-                with open(os.path.abspath(os.path.join(
-                    safe_base_path, flow_path, "init.json"))
-                ) as file:
-                    init_data = json.load(file)
-
-                for key, value in init_data.items():
-                    # params_dict[key] = value
-                    if isinstance(value, dict):
-                        inner_params = {}
-                        for sub_key, sub_value in value.items():
-                            env_value = ""
-                            if (
-                                isinstance(sub_value, str)
-                                and sub_value.startswith('${')
-                                and sub_value.endswith('}')
-                            ):
-                                env_var_name = f"{key}_{sub_key}"
-
-                                env_var_value = os.environ.get(
-                                    env_var_name.upper()
-                                    )
-                                if env_var_value:
-                                    env_value = env_var_value
-                                else:
-                                    env_value = sub_value
-                            else:
-                                env_value = sub_value
-                            inner_params[sub_key] = env_value
-                        params_dict[key] = inner_params
-                    elif isinstance(value, str):
-                        env_value = ""
-                        if value.startswith('${') and value.endswith('}'):
-                            env_var_value = os.environ.get(key.upper())
-
-                            if env_var_value:
-                                env_value = env_var_value
-                            else:
-                                env_value = value
-                        else:
-                            env_value = value
-
-                        params_dict[key] = env_value
-                    elif isinstance(value, int):
-                        params_dict[key] = value
-
-            flow_type = FlowTypeOption.CLASS_FLOW
-        else:
-            flow_type = FlowTypeOption.FUNCTION_FLOW
-
-    if found_flex is False and found_dag is True:
-        flow_type = FlowTypeOption.DAG_FLOW
-        params_dict = {}
+    from llmops.common.flow_manifest import get_flow_manifest
 
-    return (flow_type, params_dict)
+    manifest = get_flow_manifest(os.path.join(base_path or "", flow_path))
+    return (manifest.flow_type, manifest.init_params)
 
 
-def wait_job_finish(job: Run, logger: logging.Logger):
+def wait_job_finish(
+    job: "Run",
+    logger: logging.Logger,
+    get_job: Optional[Callable[[str], "Run"]] = None,
+    timeout: Optional[float] = None,
+):
     """
     Wait for job to complete/finish.
 
+    The job status is refreshed with an exponential backoff between checks.
+
     :param job: The prompt flow run object.
     :type job: Run
     :param logger: The used logger.
     :type logger: logging.Logger
-    :raises Exception: If job not finished after 3 attempts with 5 second wait.
-    """
-    max_tries = 3
-    attempt = 0
-    while attempt < max_tries:
-        logger.info(
-            "\nWaiting for job %s to finish (attempt: %s)...",
-            job.name,
-            str(attempt + 1),
-        )
-        time.sleep(5)
-        if job.status in ["Completed", "Finished"]:
-            return
-        attempt = attempt + 1
-
-    raise Exception("Sorry, exiting job with failure..")
+    :param get_job: Function returning the up to date job from its name,
+    for example PFClient.runs.get. Default is to read the status of the
+    job object, which isn't refreshed.
+    :type get_job: Optional[Callable[[str], Run]]
+    :param timeout: Maximum number of seconds to wait. If None, no limit
+    with get_job and STALE_JOB_TIMEOUT without.
+    :type timeout: Optional[float]
+    :raises Exception: If job failed, was canceled or did not finish
+    before the timeout.
+    """
+    if get_job is None and timeout is None:
+        # A stale status never changes, don't wait for it forever
+        timeout = STALE_JOB_TIMEOUT
+    poller = RunPoller(get_job or (lambda name: job), logger, timeout=timeout)
+    try:
+        for finished_job in poller.wait([job.name]):
+            if finished_job.status not in COMPLETED_STATUSES:
+                raise Exception(
+                    f"Job {job.name} finished with status "
+                    f"{finished_job.status}"
+                )
+    except TimeoutError as error:
+        raise Exception("Sorry, exiting job with failure..") from error
+
+
+def run_in_parallel(
+    func: Callable[[Any], Any],
+    items: Iterable[Any],
+    max_workers: int = 1,
+) -> Iterator[Tuple[int, Any]]:
+    """
+    Apply a function to every item with bounded concurrency.
+
+    Results are yielded as soon as they are available, together with the
+    index of the item that produced them, so callers can restore the
+    original order. With max_workers of 1 or less the items are processed
+    sequentially in the calling thread.
+
+    :param func: Function called once per item.
+    :type func: Callable[[Any], Any]
+    :param items: Items to process.
+    :type items: Iterable[Any]
+    :param max_workers: Maximum number of items processed at the same time.
+    :type max_workers: int
+    :return: Iterator of (item index, result) tuples in completion order.
+    :rtype: Iterator[Tuple[int, Any]]
+    """
+    items = list(items)
+    if max_workers is None or max_workers <= 1 or len(items) <= 1:
+        for index, item in enumerate(items):
+            yield index, func(item)
+        return
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(items)))
+    try:
+        futures = {
+            executor.submit(func, item): index
+            for index, item in enumerate(items)
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    except BaseException:
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown(wait=True)
 
 
 def resolve_run_ids(run_id: str) -> list[str]:
@@ -1,5 +1,6 @@
 """Create connections for local run."""
 
+from llmops.common.clients import get_local_pf_client
 from llmops.common.common import resolve_flow_type
 
 # from llmops.common.experiment_cloud_config import ExperimentCloudConfig
@@ -13,7 +14,6 @@ from promptflow.entities import (
     SerpConnection,
     AzureContentSafetyConnection,
 )
-from promptflow.client import PFClient
 
 import os
 from typing import Any, Dict
@@ -41,7 +41,7 @@ def create_pf_connections(exp_filename, base_path, env_name):
 
     flow_type, params_dict = resolve_flow_type(experiment.base_path, experiment.flow)
 
-    pf = PFClient()
+    pf = get_local_pf_client()
 
     for connection_details in experiment.connections:
         connection_type = connection_details.connection_type.lower()
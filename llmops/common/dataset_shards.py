@@ -0,0 +1,267 @@
+"""
+Row-level sharding of local JSONL datasets.
+
+A large dataset is split in contiguous shards of rows, the same variant is
+run on every shard in parallel and the details of the shard runs are merged
+back in the original row order under a single logical run.
+
+Shard runs are tagged with the logical run, the dataset and the rows they
+cover, so evaluation runs can use the matching rows of the evaluation
+datasets.
+
+The module contains the following classes:
+- DatasetShard: Contiguous rows of a dataset written to a shard file.
+- ShardedRun: Logical run made of the runs of every shard.
+
+The module contains the following functions:
+- count_rows: Count the rows of a JSONL file.
+- split_jsonl: Split a JSONL file in contiguous shards.
+- slice_jsonl: Write a range of rows of a JSONL file.
+- merge_shard_details: Merge the details of the shard runs in row order.
+- shard_tags: Run tags of a shard run.
+- get_shard_rows: Rows covered by a shard run, from its tags.
+"""
+
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from llmops.common.run_poller import COMPLETED_STATUSES
+
+LOGICAL_RUN_TAG = "llmops.logical_run"
+DATASET_TAG = "llmops.dataset"
+SHARD_TAG = "llmops.shard"
+SHARD_ROWS_TAG = "llmops.shard_rows"
+
+LINE_NUMBER_COLUMN = "inputs.line_number"
+
+
+class DatasetShard:
+    """
+    Contiguous rows of a dataset written to a shard file.
+
+    :param index: Position of the shard in the dataset.
+    :type index: int
+    :param path: Path of the shard file.
+    :type path: str
+    :param start: Index of the first row of the shard in the dataset.
+    :type start: int
+    :param end: Index after the last row of the shard in the dataset.
+    :type end: int
+    """
+
+    def __init__(self, index: int, path: str, start: int, end: int):
+        """Initialize DatasetShard object."""
+        self.index = index
+        self.path = path
+        self.start = start
+        self.end = end
+
+
+class ShardedRun:
+    """
+    Logical run made of the runs of every shard.
+
+    :param name: Name of the logical run.
+    :type name: str
+    :param shard_runs: Runs of the shards, in shard order.
+    :type shard_runs: List[Any]
+    """
+
+    def __init__(self, name: str, shard_runs: List[Any]):
+        """Initialize ShardedRun object."""
+        self.name = name
+        self.shard_runs = shard_runs
+
+    @property
+    def status(self) -> str:
+        """Completed if every shard run completed, else the first failure."""
+        for shard_run in self.shard_runs:
+            if shard_run.status not in COMPLETED_STATUSES:
+                return shard_run.status
+        return COMPLETED_STATUSES[0]
+
+    @property
+    def shard_run_names(self) -> List[str]:
+        """Names of the shard runs, in shard order."""
+        return [str(shard_run.name) for shard_run in self.shard_runs]
+
+
+def _is_row(line: str) -> bool:
+    return bool(line.strip())
+
+
+def count_rows(path: str) -> int:
+    """
+    Count the rows of a JSONL file, blank lines are skipped.
+
+    :param path: Path of the JSONL file.
+    :type path: str
+    :return: Number of rows.
+    :rtype: int
+    """
+    with open(path, "r", encoding="utf-8") as data_file:
+        return sum(1 for line in data_file if _is_row(line))
+
+
+def split_jsonl(
+    path: str, shards: int, output_dir: str
+) -> List[DatasetShard]:
+    """
+    Split a JSONL file in contiguous shards of similar size.
+
+    Rows are streamed, the file is never loaded in memory. Blank lines are
+    skipped. A dataset with fewer rows than shards gets one shard per row.
+
+    :param path: Path of the JSONL file.
+    :type path: str
+    :param shards: Number of shards.
+    :type shards: int
+    :param output_dir: Folder of the shard files.
+    :type output_dir: str
+    :return: Shards, in row order.
+    :rtype: List[DatasetShard]
+    """
+    if shards < 1:
+        raise ValueError(f"Number of shards must be positive, got {shards}")
+
+    row_count = count_rows(path)
+    shards = max(1, min(shards, row_count))
+    shard_size, remainder = divmod(row_count, shards)
+
+    os.makedirs(output_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(path))[0]
+    dataset_shards = []
+    start = 0
+    for index in range(shards):
+        end = start + shard_size + (1 if index < remainder else 0)
+        dataset_shards.append(
+            DatasetShard(
+                index,
+                os.path.join(output_dir, f"{name}_shard{index}.jsonl"),
+                start,
+                end,
+            )
+        )
+        start = end
+
+    shard_iter = iter(dataset_shards)
+    shard = next(shard_iter)
+    shard_file = open(shard.path, "w", encoding="utf-8")
+    try:
+        with open(path, "r", encoding="utf-8") as data_file:
+            row = 0
+            for line in data_file:
+                if not _is_row(line):
+                    continue
+                if row == shard.end:
+                    shard_file.close()
+                    shard = next(shard_iter)
+                    shard_file = open(shard.path, "w", encoding="utf-8")
+                shard_file.write(line if line.endswith("\n") else line + "\n")
+                row += 1
+    finally:
+        shard_file.close()
+    return dataset_shards
+
+
+def slice_jsonl(path: str, start: int, end: int, output_path: str) -> str:
+    """
+    Write a range of rows of a JSONL file.
+
+    :param path: Path of the JSONL file.
+    :type path: str
+    :param start: Index of the first row, blank lines are not counted.
+    :type start: int
+    :param end: Index after the last row.
+    :type end: int
+    :param output_path: Path of the written file.
+    :type output_path: str
+    :return: The output path.
+    :rtype: str
+    """
+    with open(path, "r", encoding="utf-8") as data_file, open(
+        output_path, "w", encoding="utf-8"
+    ) as slice_file:
+        row = 0
+        for line in data_file:
+            if not _is_row(line):
+                continue
+            if row >= end:
+                break
+            if row >= start:
+                slice_file.write(
+                    line if line.endswith("\n") else line + "\n"
+                )
+            row += 1
+    return output_path
+
+
+def merge_shard_details(
+    details: List[pd.DataFrame], dataset_shards: List[DatasetShard]
+) -> pd.DataFrame:
+    """
+    Merge the details of the shard runs in the original row order.
+
+    Line numbers, when present, are offset to the row of the dataset.
+
+    :param details: Details of the shard runs, in shard order.
+    :type details: List[pd.DataFrame]
+    :param dataset_shards: Shards of the runs.
+    :type dataset_shards: List[DatasetShard]
+    :return: Details of the logical run.
+    :rtype: pd.DataFrame
+    """
+    frames = []
+    for df_result, shard in zip(details, dataset_shards):
+        df_result = df_result.copy()
+        if LINE_NUMBER_COLUMN in df_result.columns:
+            df_result[LINE_NUMBER_COLUMN] = (
+                df_result[LINE_NUMBER_COLUMN] + shard.start
+            )
+        frames.append(df_result)
+    return pd.concat(frames, ignore_index=True)
+
+
+def shard_tags(
+    logical_run: str, dataset_name: str, shard: DatasetShard, shards: int
+) -> Dict[str, str]:
+    """
+    Get the run tags of a shard run.
+
+    :param logical_run: Name of the logical run.
+    :type logical_run: str
+    :param dataset_name: Name of the sharded dataset.
+    :type dataset_name: str
+    :param shard: Shard of the run.
+    :type shard: DatasetShard
+    :param shards: Number of shards of the dataset.
+    :type shards: int
+    :return: Tags of the shard run.
+    :rtype: Dict[str, str]
+    """
+    return {
+        LOGICAL_RUN_TAG: logical_run,
+        DATASET_TAG: dataset_name,
+        SHARD_TAG: f"{shard.index}/{shards}",
+        SHARD_ROWS_TAG: f"{shard.start}:{shard.end}",
+    }
+
+
+def get_shard_rows(
+    tags: Optional[Dict[str, str]]
+) -> Optional[Tuple[int, int]]:
+    """
+    Get the rows covered by a shard run.
+
+    :param tags: Tags of the run.
+    :type tags: Optional[Dict[str, str]]
+    :return: First row and row after the last one, None if the run isn't a
+    shard run.
+    :rtype: Optional[Tuple[int, int]]
+    """
+    if not isinstance(tags, dict) or SHARD_ROWS_TAG not in tags:
+        return None
+    start, end = tags[SHARD_ROWS_TAG].split(":")
+    return int(start), int(end)
@@ -1,137 +1,153 @@
 """
 This script reads flow file and extracts the 'init' element.
 
-The init element is extracted from the 'sample' element.
-It then generates a list of environment variables based on
-the contents of the 'init' element.
-The script expects the name of the YAML file as a command-line argument.
-The script also expects a second command-line argument that specifies whether
-the output should be formatted as environment variables or as a list of
-command-line arguments.
+The init element is extracted from the flow file, or from its 'sample'
+element. Placeholders (${...}) are resolved from the environment variables
+named after the init parameters, and the resolved init configuration is
+serialised in the PF_FLOW_INIT_CONFIG environment variable.
+
+Deployment stages call init_config_env_vars in their process. The command
+line prints the variable for the shell scripts:
+- First argument: the name of the flow YAML file.
+- Second argument: 'true' to format the output as docker run environment
+variables (-e PF_FLOW_INIT_CONFIG=...), anything else for a KEY=VALUE pair.
+
+The module contains the following functions:
+- resolve_init_config: Resolve the init configuration of flow file data.
+- load_init_config: Resolve the init configuration of a flow file.
+- init_config_env_vars: Environment variables of the init configuration.
+- format_init_config: Format the init configuration for the shell scripts.
 """
 # Import the required libraries
-import yaml
 import json
-import sys
 import os
+import sys
+from typing import Any, Dict, List, Optional
+
+import yaml
 from dotenv import load_dotenv
 
-# Get the file name from the command-line argument
-file_name = sys.argv[1]
+INIT_CONFIG_ENV_VAR = "PF_FLOW_INIT_CONFIG"
+
 
-is_env = sys.argv[2]
+def _resolve_placeholder(value: Any, env_var_name: str, default: Any) -> Any:
+    """Get the environment variable of a ${...} placeholder if it is set."""
+    if (
+        isinstance(value, str)
+        and value.startswith('${')
+        and value.endswith('}')
+    ):
+        return os.environ.get(env_var_name.upper()) or default
+    return value
 
-load_dotenv()
-# Read the YAML file
-with open(file_name, 'r') as file:
-    data = yaml.safe_load(file)
 
-output_list = []
-output = ""
-model_config_dict = {}
-if 'init' in data:
-    init_data = data['init']
+def resolve_init_config(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Resolve the init configuration of the data of a flow file.
 
-    # Create the output list
-    # output_list = []
-    # Iterate over the top-level elements under 'init'
-    for key, value in init_data.items():
-        if isinstance(value, dict):
+    :param data: Parsed content of the flow file.
+    :type data: Dict[str, Any]
+    :return: Init parameters of the flow, empty without init element.
+    :rtype: Dict[str, Any]
+    """
+    model_config_dict: Dict[str, Any] = {}
+    if 'init' in data:
+        for key, value in data['init'].items():
+            if not isinstance(value, dict):
+                continue
             for sub_key, sub_value in value.items():
-                inner_params = {}
                 if isinstance(sub_value, dict):
-                    for sub_sub_key, sub_sub_value in sub_value.items():
-                        if (
-                            isinstance(sub_sub_value, str)
-                            and sub_sub_value.startswith('${')
-                            and sub_sub_value.endswith('}')
-                        ):
-                            env_var_name = f"{key}_{sub_sub_key}"
-                            env_var_value = os.environ.get(
-                                env_var_name.upper()
-                                )
-                            if env_var_value:
-                                env_value = env_var_value
-                            else:
-                                env_value = sub_sub_value
-                        else:
-                            env_value = sub_sub_value
-                        inner_params[sub_sub_key] = env_value
-                    model_config_dict[key] = inner_params
+                    model_config_dict[key] = {
+                        sub_sub_key: _resolve_placeholder(
+                            sub_sub_value,
+                            f"{key}_{sub_sub_key}",
+                            sub_sub_value,
+                        )
+                        for sub_sub_key, sub_sub_value in sub_value.items()
+                    }
                 elif isinstance(sub_value, str) and sub_key == 'type':
                     pass
                 elif isinstance(sub_value, str):
-                    env_value = ""
-                    if sub_value.startswith('${') and sub_value.endswith('}'):
-                        env_var_value = os.environ.get(key.upper())
-                        if env_var_value:
-                            env_value = env_var_value
-                        else:
-                            env_value = value
-                    else:
-                        env_value = sub_value
-                    inner_params[key] = env_value
-                    model_config_dict[key] = inner_params[key]
+                    model_config_dict[key] = _resolve_placeholder(
+                        sub_value, key, value
+                    )
                 elif isinstance(sub_value, int):
-                    inner_params[key] = sub_value
-                    model_config_dict[key] = inner_params[key]
-
-
-# Extract the 'init' element from the YAML data
-elif 'sample' in data and 'init' in data['sample']:
-    init_data = data['sample']['init']
-
-    # Create the output list
-    # output_list = []
-    # Iterate over the top-level elements under 'init'
-    for key, value in init_data.items():
-        if isinstance(value, dict):
-            # Convert the sub-elements to a JSON string without spaces
-            # sub_elements_json = json.dumps(value, separators=(',', ':'))
-            inner_params = {}
-            for sub_key, sub_value in value.items():
-                if (
-                    isinstance(sub_value, str)
-                    and sub_value.startswith('${')
-                    and sub_value.endswith('}')
-                ):
-                    env_var_name = f"{key}_{sub_key}"
-                    env_var_value = os.environ.get(env_var_name.upper())
-                    if env_var_value:
-                        env_value = env_var_value
-                    else:
-                        env_value = sub_value
-                else:
-                    env_value = sub_value
-
-                inner_params[sub_key] = env_value
-            model_config_dict[key] = inner_params
-        elif isinstance(value, str):
-            if value.startswith('${') and value.endswith('}'):
-                env_var_value = os.environ.get(key.upper())
-                if env_var_value:
-                    env_value = env_var_value
-                else:
-                    env_value = value
-            model_config_dict[key.upper()] = value
-        elif isinstance(value, int):
-            model_config_dict[key.upper()] = value
-
-    # Join the output list with spaces
-else:
-    output = ''
-
-sub_elements_json = json.dumps(
-    model_config_dict, separators=(',', ':')
-)
-if is_env == 'true':
-    if sub_elements_json:
-        output_list.append(
-            f'-e PF_FLOW_INIT_CONFIG={sub_elements_json}'
+                    model_config_dict[key] = sub_value
+
+    elif 'sample' in data and 'init' in data['sample']:
+        for key, value in data['sample']['init'].items():
+            if isinstance(value, dict):
+                model_config_dict[key] = {
+                    sub_key: _resolve_placeholder(
+                        sub_value, f"{key}_{sub_key}", sub_value
+                    )
+                    for sub_key, sub_value in value.items()
+                }
+            elif isinstance(value, (str, int)):
+                # Top level sample values are passed as they are
+                model_config_dict[key.upper()] = value
+    return model_config_dict
+
+
+def load_init_config(flow_file_path: str) -> Dict[str, Any]:
+    """
+    Resolve the init configuration of a flow file.
+
+    :param flow_file_path: Path of the flow YAML file.
+    :type flow_file_path: str
+    :return: Init parameters of the flow.
+    :rtype: Dict[str, Any]
+    """
+    with open(flow_file_path, 'r') as file:
+        data = yaml.safe_load(file)
+    return resolve_init_config(data or {})
+
+
+def init_config_env_vars(flow_file_path: str) -> Dict[str, str]:
+    """
+    Get the environment variables of the init configuration of a flow.
+
+    :param flow_file_path: Path of the flow YAML file.
+    :type flow_file_path: str
+    :return: Dictionary from PF_FLOW_INIT_CONFIG to the JSON configuration.
+    :rtype: Dict[str, str]
+    """
+    return {
+        INIT_CONFIG_ENV_VAR: json.dumps(
+            load_init_config(flow_file_path), separators=(',', ':')
         )
-else:
-    if sub_elements_json:
-        output_list.append(f'PF_FLOW_INIT_CONFIG={sub_elements_json}')
-# Print the output
-output = ' '.join(output_list)
-print(output)
+    }
+
+
+def format_init_config(
+    model_config_dict: Dict[str, Any], is_env: bool
+) -> str:
+    """
+    Format the init configuration for the shell scripts.
+
+    :param model_config_dict: Init parameters of the flow.
+    :type model_config_dict: Dict[str, Any]
+    :param is_env: Flag to format a docker run environment variable.
+    :type is_env: bool
+    :return: The formatted configuration.
+    :rtype: str
+    """
+    sub_elements_json = json.dumps(model_config_dict, separators=(',', ':'))
+    if is_env:
+        return f'-e {INIT_CONFIG_ENV_VAR}={sub_elements_json}'
+    return f'{INIT_CONFIG_ENV_VAR}={sub_elements_json}'
+
+
+def main(argv: Optional[List[str]] = None):
+    """Print the init configuration of the flow file of the command line."""
+    args = sys.argv[1:] if argv is None else argv
+    # Get the file name from the command-line argument
+    file_name = args[0]
+    is_env = args[1]
+
+    load_dotenv()
+    print(format_init_config(load_init_config(file_name), is_env == 'true'))
+
+
+if __name__ == "__main__":
+    main()
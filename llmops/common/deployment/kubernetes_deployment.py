@@ -20,41 +20,21 @@ This argument is required to specify the version of the model for deployment.
 
 import json
 import argparse
-import subprocess
 import os
-from typing import Optional
-
-from azure.ai.ml import MLClient
-from azure.ai.ml.entities import (
-    KubernetesOnlineDeployment,
-    Environment,
-    OnlineRequestSettings,
-    BuildContext,
-    DataCollector,
-    DeploymentCollection,
-)
-from azure.identity import DefaultAzureCredential
-from azure.ai.ml.entities._deployment.resource_requirements_settings import (
-    ResourceRequirementsSettings,
-)
-from azure.ai.ml.entities._deployment.container_resource_settings import (
-    ResourceSettings,
-)
+from typing import List, Optional
+
 from llmops.common.common import REQUEST_TIMEOUT_MS
 from dotenv import load_dotenv
 
-
 from llmops.common.logger import llmops_logger
+from llmops.common.deployment.generate_config import init_config_env_vars
 from llmops.common.experiment_cloud_config import ExperimentCloudConfig
 from llmops.common.experiment import load_experiment
 from llmops.common.common import resolve_env_vars
-from llmops.common.common import FlowTypeOption
+from llmops.common.flow_manifest import get_flow_manifest
 
 logger = llmops_logger("provision_deployment")
 
-_FLOW_DAG_FILENAME = ("flow.dag.yml", "flow.dag.yaml")
-_FLOW_FLEX_FILENAME = ("flow.flex.yml", "flow.flex.yaml")
-
 
 def create_kubernetes_deployment(
     model_version: str,
@@ -65,6 +45,18 @@ def create_kubernetes_deployment(
     subscription_id: Optional[str] = None,
 ):
     """Create deployment for the model version."""
+    from azure.ai.ml.entities import (
+        KubernetesOnlineDeployment,
+        Environment,
+        OnlineRequestSettings,
+        BuildContext,
+        DataCollector,
+        DeploymentCollection,
+        ResourceRequirementsSettings,
+        ResourceSettings,
+    )
+    from llmops.common.clients import get_ml_client
+
     config = ExperimentCloudConfig(subscription_id=subscription_id, env_name=env_name)
     experiment = load_experiment(
         filename=exp_filename, base_path=base_path, env=config.environment_name
@@ -72,47 +64,14 @@ def create_kubernetes_deployment(
     experiment_name = experiment.name
     model_name = f"{experiment_name}_{env_name}"
 
-    found_flex = False
-    flow_type = FlowTypeOption.CLASS_FLOW
-    for root, dirs, files in os.walk(
+    manifest = get_flow_manifest(
         os.path.join(experiment.base_path, experiment.flow)
-    ):
-        for file in files:
-            if file in _FLOW_FLEX_FILENAME:
-                found_flex = True
-                flow_type = FlowTypeOption.CLASS_FLOW
-                flow_file_path = os.path.abspath(
-                    os.path.join(experiment.base_path, experiment.flow, file)
-                )
-            elif file in _FLOW_DAG_FILENAME:
-                flow_file_path = os.path.abspath(
-                    os.path.join(experiment.base_path, experiment.flow, file)
-                )
-                flow_type = FlowTypeOption.DAG_FLOW
+    )
+    flow_type = manifest.flow_type
 
     params_dict = {}
-    if found_flex:
-        result = subprocess.run(
-            [
-                "python",
-                "llmops/common/deployment/generate_config.py",
-                flow_file_path,
-                "false",
-            ],
-            stdout=subprocess.PIPE,
-        )
-        output = result.stdout.decode("utf-8")
-        substrings = output.split()
-
-        # Iterate over each substring
-        for substring in substrings:
-            # Split the substring by the "=" delimiter
-            key_value = substring.split("=")
-
-            # Check if the substring contains the "=" delimiter
-            if len(key_value) == 2:
-                key, value = key_value
-                params_dict[key] = value
+    if manifest.is_flex:
+        params_dict = init_config_env_vars(manifest.flow_file_path)
 
     env_vars = resolve_env_vars(experiment.base_path)
 
@@ -120,11 +79,10 @@ def create_kubernetes_deployment(
 
     logger.info(f"Model name: {model_name}")
 
-    ml_client = MLClient(
-        subscription_id=config.subscription_id,
-        resource_group_name=config.resource_group_name,
-        workspace_name=config.workspace_name,
-        credential=DefaultAzureCredential(),
+    ml_client = get_ml_client(
+        config.subscription_id,
+        config.resource_group_name,
+        config.workspace_name,
     )
 
     model = ml_client.models.get(model_name, model_version)
@@ -245,7 +203,7 @@ def create_kubernetes_deployment(
                 ml_client.begin_create_or_update(endpoint).result()
 
 
-def main():
+def main(argv: Optional[List[str]] = None):
     """Entry main function to create deployment."""
     parser = argparse.ArgumentParser("provision_kubernetes_deployment")
     parser.add_argument(
@@ -286,7 +244,7 @@ def main():
         required=True,
     )
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     create_kubernetes_deployment(
         args.model_version,
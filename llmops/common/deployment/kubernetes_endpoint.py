@@ -17,13 +17,9 @@ to the output file necessary for the endpoint principal.
 
 import json
 import argparse
-from typing import Optional
+from typing import List, Optional
 from dotenv import load_dotenv
 
-from azure.ai.ml import MLClient
-from azure.ai.ml.entities import KubernetesOnlineEndpoint
-from azure.identity import DefaultAzureCredential
-
 from llmops.common.logger import llmops_logger
 from llmops.common.experiment_cloud_config import ExperimentCloudConfig
 
@@ -38,17 +34,19 @@ def create_kubernetes_endpoint(
     output_file: Optional[str] = None,
 ):
     """Create endpoint for the model version."""
+    from azure.ai.ml.entities import KubernetesOnlineEndpoint
+    from llmops.common.clients import get_ml_client
+
     config = ExperimentCloudConfig(
         subscription_id=subscription_id, env_name=env_name
     )
 
     real_config = f"{base_path}/configs/deployment_config.json"
 
-    ml_client = MLClient(
-        subscription_id=config.subscription_id,
-        resource_group_name=config.resource_group_name,
-        workspace_name=config.workspace_name,
-        credential=DefaultAzureCredential(),
+    ml_client = get_ml_client(
+        config.subscription_id,
+        config.resource_group_name,
+        config.workspace_name,
     )
 
     config_file = open(real_config)
@@ -86,7 +84,7 @@ def create_kubernetes_endpoint(
                         out_file.write(str(principal_id))
 
 
-def main():
+def main(argv: Optional[List[str]] = None):
     """Entry main function to create endpoint."""
     parser = argparse.ArgumentParser("provision_kubernetes_endpoints")
     parser.add_argument(
@@ -119,7 +117,7 @@ def main():
         help="Outfile file needed for endpoint principal.",
         required=None,
     )
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     create_kubernetes_endpoint(
         args.env_name,
@@ -20,11 +20,9 @@ import os
 import yaml
 from dotenv import load_dotenv
 from pathlib import Path
-from promptflow.client import PFClient
-from typing import Optional
+from typing import List, Optional
 
 from llmops.common.common import FlowTypeOption
-from promptflow._sdk.operations._flow_operations import FlowOperations
 from llmops.common.common import resolve_flow_type
 from llmops.common.experiment_cloud_config import ExperimentCloudConfig
 from llmops.common.experiment import load_experiment
@@ -61,13 +59,16 @@ def prepare_and_execute(
     Returns:
         None
     """
+    from promptflow._sdk.operations._flow_operations import FlowOperations
+    from llmops.common.clients import get_local_pf_client
+
     config = ExperimentCloudConfig(subscription_id="None", env_name=env_name)
     experiment = load_experiment(
         filename=exp_filename, base_path=base_path, env=config.environment_name
     )
 
     print(config.workspace_name)
-    pf = PFClient()
+    pf = get_local_pf_client()
     flow_type, params_dict = resolve_flow_type(
         experiment.base_path, experiment.flow
     )
@@ -105,7 +106,7 @@ def prepare_and_execute(
             print("No connection element found within init element.")
 
 
-def main():
+def main(argv: Optional[List[str]] = None):
     """
     Run the main evaluation loop by executing evaluation flows.
 
@@ -134,7 +135,7 @@ def main():
         default=None,
     )
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     prepare_and_execute(
         args.file,
@@ -16,42 +16,20 @@ but will be used to save the model version to file if specified.
 """
 
 import argparse
-import os
-import hashlib
-from azure.ai.ml import MLClient
-from azure.ai.ml.entities import Model
-from azure.identity import DefaultAzureCredential
 from dotenv import load_dotenv
-from typing import Optional
+from typing import List, Optional
 
 from llmops.common.logger import llmops_logger
 from llmops.common.experiment_cloud_config import ExperimentCloudConfig
 from llmops.common.experiment import load_experiment
+from llmops.common.common import hash_folder  # noqa: F401
 from llmops.common.common import resolve_flow_type
+from llmops.common.flow_manifest import get_flow_manifest
 
 
 logger = llmops_logger("register_flow")
 
 
-def hash_folder(folder_path):
-    """
-    Generate hash for entire folder.
-
-    Returns:
-        hash as string
-    """
-    sha256 = hashlib.sha256()
-
-    for root, _, files in os.walk(folder_path):
-        for file in files:
-            file_path = os.path.join(root, file)
-            with open(file_path, "rb") as f:
-                file_content = f.read()
-                sha256.update(file_content)
-
-    return sha256.hexdigest()
-
-
 def register_model(
     exp_filename: Optional[str] = None,
     base_path: Optional[str] = None,
@@ -61,6 +39,9 @@ def register_model(
     output_file: Optional[str] = None,
 ):
     """Register model in Azure ML."""
+    from azure.ai.ml.entities import Model
+    from llmops.common.clients import get_ml_client
+
     config = ExperimentCloudConfig(
         subscription_id=subscription_id, env_name=env_name
     )
@@ -76,15 +57,14 @@ def register_model(
 
     logger.info(f"Model name: {model_name}")
 
-    ml_client = MLClient(
-        subscription_id=config.subscription_id,
-        resource_group_name=config.resource_group_name,
-        workspace_name=config.workspace_name,
-        credential=DefaultAzureCredential(),
+    ml_client = get_ml_client(
+        config.subscription_id,
+        config.resource_group_name,
+        config.workspace_name,
     )
 
     model_path = experiment.get_flow_detail(flow_type).flow_path
-    model_hash = hash_folder(model_path)
+    model_hash = get_flow_manifest(model_path).content_hash
     model_tags = {"model_hash": model_hash}
     if build_id:
         model_tags["build_id"] = build_id
@@ -119,7 +99,7 @@ def register_model(
             out_file.write(str(model_info.version))
 
 
-def main():
+def main(argv: Optional[List[str]] = None):
     """Entry main function to register model."""
     parser = argparse.ArgumentParser("register Flow")
     parser.add_argument(
@@ -157,7 +137,7 @@ def main():
         "--output_file", type=str, required=False, help="save model version"
     )
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     register_model(
         args.file,
@@ -13,11 +13,7 @@ is not required but will be used to read experiment overlay files if specified.
 import argparse
 import json
 from dotenv import load_dotenv
-from typing import Optional
-
-from azure.ai.ml import MLClient
-
-from azure.identity import DefaultAzureCredential
+from typing import List, Optional
 
 from llmops.common.logger import llmops_logger
 from llmops.common.experiment_cloud_config import ExperimentCloudConfig
@@ -31,16 +27,17 @@ def test_aml_model(
     subscription_id: Optional[str],
 ):
     """Test the model on managed compute."""
+    from llmops.common.clients import get_ml_client
+
     config = ExperimentCloudConfig(
         subscription_id=subscription_id, env_name=env_name
     )
     real_config = f"{base_path}/configs/deployment_config.json"
 
-    ml_client = MLClient(
-        subscription_id=config.subscription_id,
-        resource_group_name=config.resource_group_name,
-        workspace_name=config.workspace_name,
-        credential=DefaultAzureCredential(),
+    ml_client = get_ml_client(
+        config.subscription_id,
+        config.resource_group_name,
+        config.workspace_name,
     )
 
     config_file = open(real_config)
@@ -68,7 +65,7 @@ def test_aml_model(
                 logger.info(request_result)
 
 
-def main():
+def main(argv: Optional[List[str]] = None):
     """Entry main function to test the model on managed compute."""
     parser = argparse.ArgumentParser("test_flow")
     parser.add_argument(
@@ -89,7 +86,7 @@ def main():
         help="environment name(dev, test, prod) for execution and deployment",
         default=None,
     )
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     test_aml_model(
         args.base_path,
         args.env_name,
@@ -0,0 +1,251 @@
+"""
+Early stopping of the evaluation of clearly losing variants.
+
+In sequential mode, prompt_eval evaluates the variants of an experiment in
+batches of rows of the evaluation dataset. After every batch, the variants
+evaluated by the same evaluator on the same dataset are compared on the
+rows evaluated so far with a paired bootstrap (see llmops.common.leaderboard).
+A variant is stopped, and the remaining rows are not evaluated, once it is
+worse than the current best variant by more than a margin: the whole
+confidence interval of its difference with the best variant is below
+-margin.
+
+Evaluation runs of a batch are not linked to the standard run, the inputs
+and outputs of the standard run rows are copied in the batch data instead:
+- ${run.outputs.<name>} is mapped to the run_outputs_<name> column.
+- ${run.inputs.<name>} is mapped to the run_inputs_<name> column.
+
+The module contains the following classes:
+- EarlyStopping: Compares the variants after every batch and stops losers.
+
+The module contains the following functions:
+- write_batch_data: Write a batch of evaluation rows with the run columns.
+- map_run_columns: Map the standard run columns to the batch data columns.
+"""
+
+import json
+import re
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from llmops.common.dataset_shards import LINE_NUMBER_COLUMN
+from llmops.common.leaderboard import bootstrap_compare, to_score
+from llmops.common.logger import llmops_logger
+
+logger = llmops_logger("early_stopping")
+
+_RUN_COLUMN = re.compile(r"\$\{run\.(inputs|outputs)\.([^}]+)\}")
+
+
+class EarlyStopping:
+    """
+    Compares the variants after every batch and stops the losing ones.
+
+    :param metric: Line output of the evaluators compared between variants.
+    :type metric: str
+    :param batch_size: Number of rows evaluated per batch.
+    :type batch_size: int
+    :param margin: Difference of mean score with the best variant above
+    which a variant is stopped.
+    :type margin: float
+    :param confidence: Confidence level of the comparisons.
+    :type confidence: float
+    :param min_rows: Rows evaluated before any variant is stopped.
+    Default is batch_size.
+    :type min_rows: Optional[int]
+    :param n_resamples: Number of bootstrap resamples of the comparisons.
+    :type n_resamples: int
+    :param seed: Seed of the bootstrap resampling.
+    :type seed: Optional[int]
+    """
+
+    def __init__(
+        self,
+        metric: str,
+        batch_size: int,
+        margin: float = 0.0,
+        confidence: float = 0.95,
+        min_rows: Optional[int] = None,
+        n_resamples: int = 1000,
+        seed: Optional[int] = None,
+    ):
+        """Initialize EarlyStopping object."""
+        if batch_size < 1:
+            raise ValueError(f"Batch size must be positive, got {batch_size}")
+        if margin < 0:
+            raise ValueError(f"Margin must not be negative, got {margin}")
+        self.metric = metric
+        self.batch_size = batch_size
+        self.margin = margin
+        self.confidence = confidence
+        self.min_rows = batch_size if min_rows is None else min_rows
+        self.n_resamples = n_resamples
+        self.seed = seed
+        self._scores: Dict[Hashable, Dict[Hashable, pd.Series]] = {}
+        self._stopped: Dict[Hashable, set] = {}
+
+    def batches(self, rows: int) -> List[Tuple[int, int]]:
+        """Get the first row and the row after the last one of every batch."""
+        return [
+            (start, min(start + self.batch_size, rows))
+            for start in range(0, rows, self.batch_size)
+        ]
+
+    def update(
+        self, group: Hashable, variant: Hashable, details: pd.DataFrame
+    ):
+        """
+        Record the scores of a batch evaluated for a variant.
+
+        :param group: Variants compared together, for example the evaluator
+        and evaluation dataset.
+        :type group: Hashable
+        :param variant: The evaluated variant.
+        :type variant: Hashable
+        :param details: Details of the batch evaluation run, with dataset
+        line numbers.
+        :type details: pd.DataFrame
+        """
+        column = (
+            self.metric
+            if self.metric in details.columns
+            else f"outputs.{self.metric}"
+        )
+        if column not in details.columns:
+            logger.warning(
+                f"Metric {self.metric} not found, {variant} is not compared"
+            )
+            return
+        batch_scores = pd.Series(
+            details[column].map(to_score).to_numpy(),
+            index=details[LINE_NUMBER_COLUMN].to_numpy(),
+        )
+        variants = self._scores.setdefault(group, {})
+        scores = variants.get(variant)
+        variants[variant] = (
+            batch_scores if scores is None
+            else pd.concat([scores, batch_scores])
+        )
+
+    def is_stopped(self, group: Hashable, variant: Hashable) -> bool:
+        """Check if the evaluation of a variant is stopped."""
+        return variant in self._stopped.get(group, set())
+
+    def stop_losers(self, group: Hashable) -> List[Hashable]:
+        """
+        Stop the variants clearly worse than the best one.
+
+        Variants still evaluated are compared on the rows scored for all of
+        them.
+
+        :param group: Variants compared together.
+        :type group: Hashable
+        :return: Variants stopped by this comparison.
+        :rtype: List[Hashable]
+        """
+        stopped = self._stopped.setdefault(group, set())
+        active = {
+            variant: scores
+            for variant, scores in self._scores.get(group, {}).items()
+            if variant not in stopped
+        }
+        if len(active) < 2:
+            return []
+        matrix = pd.concat(active, axis=1).dropna()
+        if len(matrix) < max(self.min_rows, 2):
+            return []
+
+        scores = matrix.to_numpy()
+        best = int(np.argmax(scores.mean(axis=0)))
+        stats = bootstrap_compare(
+            scores, best, self.n_resamples, self.confidence, self.seed
+        )
+        losers = [
+            variant
+            for variant, diff_high in zip(matrix.columns, stats["diff_high"])
+            if diff_high < -self.margin
+        ]
+        for variant in losers:
+            logger.info(
+                f"Stopping evaluation of {variant} after {len(matrix)} rows, "
+                f"worse than {matrix.columns[best]} by more than "
+                f"{self.margin}"
+            )
+        stopped.update(losers)
+        return losers
+
+
+def map_run_columns(column_mapping: Dict[str, str]) -> Dict[str, str]:
+    """
+    Map the standard run columns to the columns of the batch data.
+
+    :param column_mapping: Column mapping of the evaluation.
+    :type column_mapping: Dict[str, str]
+    :return: Column mapping of a batch evaluation.
+    :rtype: Dict[str, str]
+    """
+    return {
+        name: _RUN_COLUMN.sub(r"${data.run_\1_\2}", str(value))
+        for name, value in column_mapping.items()
+    }
+
+
+def write_batch_data(
+    data_path: str,
+    run_details: pd.DataFrame,
+    start: int,
+    end: int,
+    output_path: str,
+) -> str:
+    """
+    Write a batch of evaluation rows with the standard run columns.
+
+    :param data_path: Path of the JSONL evaluation dataset.
+    :type data_path: str
+    :param run_details: Details of the standard run.
+    :type run_details: pd.DataFrame
+    :param start: Index of the first row of the batch.
+    :type start: int
+    :param end: Index after the last row of the batch.
+    :type end: int
+    :param output_path: Path of the written batch file.
+    :type output_path: str
+    :return: The output path.
+    :rtype: str
+    """
+    run_rows = run_details[
+        (run_details[LINE_NUMBER_COLUMN] >= start)
+        & (run_details[LINE_NUMBER_COLUMN] < end)
+    ]
+    columns = [
+        column
+        for column in run_details.columns
+        if column.startswith(("inputs.", "outputs."))
+        and column != LINE_NUMBER_COLUMN
+    ]
+    run_columns = dict(
+        zip(
+            run_rows[LINE_NUMBER_COLUMN].astype(int),
+            run_rows[columns]
+            .rename(columns=lambda name: f"run_{name.replace('.', '_', 1)}")
+            .to_dict("records"),
+        )
+    )
+
+    with open(data_path, "r", encoding="utf-8") as data_file, open(
+        output_path, "w", encoding="utf-8"
+    ) as batch_file:
+        row = 0
+        for line in data_file:
+            if not line.strip():
+                continue
+            if row >= end:
+                break
+            if row >= start:
+                record = json.loads(line)
+                record.update(run_columns.get(row, {}))
+                batch_file.write(json.dumps(record, default=str) + "\n")
+            row += 1
+    return output_path
@@ -0,0 +1,191 @@
+"""
+Content-addressed cache of evaluation results, one entry per line.
+
+Evaluators call an LLM for every line they score. A line is identified by
+the version of the evaluator (the content of its flow folder, prompty files
+included, and its settings) and the inputs of the line: the input, the
+prediction and the ground truth. Lines already scored by the same evaluator
+version are served from the cache and only new or changed lines are scored.
+
+The cache is stored in a local folder, one file per line key:
+- <key[:2]>/<key>.json: result of the evaluator for the line.
+
+prompt_eval passes the cache folder to the evaluators in the EVAL_CACHE_DIR
+environment variable (see prompt_eval --eval_cache_dir).
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from llmops.common.common import hash_folder
+
+EVAL_CACHE_DIR_ENV = "EVAL_CACHE_DIR"
+
+
+def compute_evaluator_hash(
+    evaluator_path: str, settings: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    Compute the version of an evaluator.
+
+    :param evaluator_path: Folder of the evaluator flow.
+    :type evaluator_path: str
+    :param settings: Settings changing the results of the evaluator,
+    for example the model deployment.
+    :type settings: Optional[Dict[str, Any]]
+    :return: Hex digest identifying the evaluator version.
+    :rtype: str
+    """
+    payload = json.dumps(
+        {"flow": hash_folder(evaluator_path), "settings": settings or {}},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def compute_line_key(evaluator_hash: str, inputs: Dict[str, Any]) -> str:
+    """
+    Compute the cache key of an evaluated line.
+
+    :param evaluator_hash: Version of the evaluator.
+    :type evaluator_hash: str
+    :param inputs: Inputs of the evaluator for the line.
+    :type inputs: Dict[str, Any]
+    :return: Hex digest identifying the line.
+    :rtype: str
+    """
+    payload = json.dumps(
+        {"evaluator": evaluator_hash, "inputs": inputs},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class EvalCache:
+    """
+    Persistent local cache of the results of an evaluator.
+
+    :param cache_dir: Folder where cache entries are stored.
+    It is created if it doesn't exist.
+    :type cache_dir: str
+    :param evaluator_hash: Version of the evaluator.
+    :type evaluator_hash: str
+    """
+
+    def __init__(self, cache_dir: str, evaluator_hash: str):
+        """Initialize EvalCache object."""
+        self.cache_dir = cache_dir
+        self.evaluator_hash = evaluator_hash
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Get the state to pickle, batch runs copy evaluators to workers."""
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]):
+        """Restore a pickled cache with a new lock."""
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _path(self, inputs: Dict[str, Any]) -> str:
+        key = compute_line_key(self.evaluator_hash, inputs)
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, inputs: Dict[str, Any]) -> Optional[Any]:
+        """Get the cached result of the line, None if not found."""
+        path = self._path(inputs)
+        result = None
+        if os.path.isfile(path):
+            try:
+                with open(path, "r") as entry_file:
+                    result = json.load(entry_file)["result"]
+            except (OSError, ValueError, KeyError):
+                # Corrupted entries are treated as cache misses
+                result = None
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return result
+
+    def put(self, inputs: Dict[str, Any], result: Any):
+        """Store the result of the line in the cache."""
+        path = self._path(inputs)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Writers of the same line don't share the temporary file
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w") as entry_file:
+            json.dump({"result": result}, entry_file, default=str)
+        os.replace(temp_path, path)
+
+
+def get_eval_cache(
+    evaluator_path: str, settings: Optional[Dict[str, Any]] = None
+) -> Optional[EvalCache]:
+    """
+    Get the cache of an evaluator, from the EVAL_CACHE_DIR variable.
+
+    :param evaluator_path: Folder of the evaluator flow.
+    :type evaluator_path: str
+    :param settings: Settings changing the results of the evaluator.
+    :type settings: Optional[Dict[str, Any]]
+    :return: The evaluator cache, None if EVAL_CACHE_DIR isn't set.
+    :rtype: Optional[EvalCache]
+    """
+    cache_dir = os.environ.get(EVAL_CACHE_DIR_ENV)
+    if not cache_dir:
+        return None
+    return EvalCache(
+        cache_dir, compute_evaluator_hash(evaluator_path, settings)
+    )
+
+
+class CachedEvaluator:
+    """
+    Serve the results of an evaluator scoring an answer against a context.
+
+    The wrapper is an instance of a module level class with the keyword
+    signature of the groundedness evaluators, so that promptflow resolves it
+    as a callable entry and maps the evaluated columns to its inputs.
+
+    :param evaluator: Evaluator called with the answer and the context.
+    :type evaluator: Callable[..., Any]
+    :param cache: Cache of the evaluator.
+    :type cache: EvalCache
+    """
+
+    # promptflow rejects complex types in the interface of a flow entry,
+    # the evaluator, the cache and the result are not annotated.
+    def __init__(self, evaluator, cache):
+        """Initialize the wrapper of an evaluator."""
+        self.evaluator = evaluator
+        self.cache = cache
+
+    def __call__(self, *, answer: str, context: str):
+        """
+        Score a line, calling the evaluator on cache misses only.
+
+        :param answer: Answer to score.
+        :type answer: str
+        :param context: Context the answer is grounded on.
+        :type context: str
+        :return: Result of the evaluator for the line.
+        :rtype: Dict[str, Any]
+        """
+        inputs = {"answer": answer, "context": context}
+        result = self.cache.get(inputs)
+        if result is None:
+            result = self.evaluator(**inputs)
+            self.cache.put(inputs, result)
+        return result
@@ -0,0 +1,224 @@
+"""
+Discovery and import of the evaluators without flow.
+
+Evaluators without flow (NO_FLOW) are folders of eval_*.py modules whose
+eval_* functions evaluate a dataset. The registry lists the folder, imports
+every module and resolves its functions once per process, and adds the
+folders the modules depend on to sys.path only once.
+
+Evaluator functions are referenced by EvaluatorFunction, a picklable
+description of the module and function, so that they can be called in
+worker processes. Every worker process resolves a function with its own
+registry, once, and reuses it for the following calls.
+
+The module contains the following classes:
+- EvaluatorFunction: Picklable reference to an evaluator function.
+- EvaluatorRegistry: Cache of the discovered and imported evaluators.
+
+The module contains the following functions:
+- get_registry: Get the registry of the current process.
+- call_evaluator: Call an evaluator function resolved by the registry.
+- run_evaluators: Call evaluator functions in threads or worker processes.
+"""
+
+import importlib
+import inspect
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Sequence,
+    Tuple,
+)
+
+from llmops.common.common import run_in_parallel
+from llmops.common.logger import llmops_logger
+
+logger = llmops_logger("evaluator_registry")
+
+EVALUATOR_PREFIX = "eval_"
+
+
+class EvaluatorFunction(NamedTuple):
+    """
+    Picklable reference to an evaluator function.
+
+    :param module_path: Dotted path of the evaluator module.
+    :type module_path: str
+    :param function_name: Name of the evaluator function in the module.
+    :type function_name: str
+    :param search_paths: Folders added to sys.path to import the module.
+    :type search_paths: Tuple[str, ...]
+    """
+
+    module_path: str
+    function_name: str
+    search_paths: Tuple[str, ...] = ()
+
+
+class EvaluatorRegistry:
+    """
+    Cache of the discovered and imported evaluators without flow.
+
+    Folders are listed and their modules imported on the first discovery
+    only, later discoveries of the same folder return the cached evaluator
+    functions.
+    """
+
+    def __init__(self):
+        """Initialize EvaluatorRegistry object."""
+        self._evaluators: Dict[str, List[EvaluatorFunction]] = {}
+        self._functions: Dict[EvaluatorFunction, Callable[..., Any]] = {}
+
+    def discover(
+        self, service_path: str, dependent_modules_dir: str
+    ) -> List[EvaluatorFunction]:
+        """
+        Get the evaluator functions of an evaluator folder.
+
+        :param service_path: Path of the evaluator folder, relative to the
+        working directory.
+        :type service_path: str
+        :param dependent_modules_dir: Folder of the modules the evaluators
+        depend on, added to sys.path.
+        :type dependent_modules_dir: str
+        :return: The eval_* functions of the eval_*.py modules of the folder.
+        :rtype: List[EvaluatorFunction]
+        """
+        key = os.path.abspath(service_path)
+        if key in self._evaluators:
+            return self._evaluators[key]
+
+        package = ".".join(
+            part
+            for part in os.path.normpath(service_path).split(os.sep)
+            if part
+        )
+        search_paths = (
+            os.path.abspath(os.curdir),
+            os.path.abspath(dependent_modules_dir),
+        )
+        evaluators = []
+        for file in sorted(os.listdir(service_path)):
+            if not (
+                file.endswith(".py")
+                and file.lower().startswith(EVALUATOR_PREFIX)
+            ):
+                continue
+            module_path = f"{package}.{file[:-3]}"
+            module = self._import(module_path, search_paths)
+            for name, function in inspect.getmembers(
+                module, inspect.isfunction
+            ):
+                if name.lower().startswith(EVALUATOR_PREFIX):
+                    evaluator = EvaluatorFunction(
+                        module_path, name, search_paths
+                    )
+                    self._functions[evaluator] = function
+                    evaluators.append(evaluator)
+
+        logger.info(
+            f"Discovered {len(evaluators)} evaluator functions in "
+            f"{service_path}"
+        )
+        self._evaluators[key] = evaluators
+        return evaluators
+
+    def resolve(self, evaluator: EvaluatorFunction) -> Callable[..., Any]:
+        """
+        Get the function of an evaluator, importing its module if needed.
+
+        :param evaluator: Reference to the evaluator function.
+        :type evaluator: EvaluatorFunction
+        :return: The evaluator function.
+        :rtype: Callable[..., Any]
+        """
+        function = self._functions.get(evaluator)
+        if function is None:
+            module = self._import(
+                evaluator.module_path, evaluator.search_paths
+            )
+            function = getattr(module, evaluator.function_name)
+            self._functions[evaluator] = function
+        return function
+
+    @staticmethod
+    def _import(module_path: str, search_paths: Sequence[str]):
+        for path in search_paths:
+            if path not in sys.path:
+                sys.path.append(path)
+        return importlib.import_module(module_path)
+
+
+_registry = EvaluatorRegistry()
+
+
+def get_registry() -> EvaluatorRegistry:
+    """Get the evaluator registry of the current process."""
+    return _registry
+
+
+def call_evaluator(
+    evaluator: EvaluatorFunction, args: Sequence[Any]
+) -> Any:
+    """
+    Call an evaluator function resolved by the registry of the process.
+
+    :param evaluator: Reference to the evaluator function.
+    :type evaluator: EvaluatorFunction
+    :param args: Positional arguments of the call.
+    :type args: Sequence[Any]
+    :return: The result of the evaluator function.
+    :rtype: Any
+    """
+    return get_registry().resolve(evaluator)(*args)
+
+
+def run_evaluators(
+    calls: Sequence[Tuple[EvaluatorFunction, Sequence[Any]]],
+    max_workers: int = 1,
+    processes: bool = False,
+) -> Iterator[Tuple[int, Any]]:
+    """
+    Call evaluator functions with bounded concurrency.
+
+    Results are yielded as soon as they are available, together with the
+    index of the call. Arguments and results of calls in worker processes
+    must be picklable.
+
+    :param calls: Evaluator functions and positional arguments to call
+    them with.
+    :type calls: Sequence[Tuple[EvaluatorFunction, Sequence[Any]]]
+    :param max_workers: Maximum number of calls executed at the same time.
+    :type max_workers: int
+    :param processes: Flag to call the evaluators in worker processes
+    instead of threads of this process.
+    :type processes: bool
+    :return: Iterator of (call index, result) tuples in completion order.
+    :rtype: Iterator[Tuple[int, Any]]
+    """
+    calls = list(calls)
+    if not processes or max_workers <= 1 or len(calls) <= 1:
+        yield from run_in_parallel(
+            lambda call: call_evaluator(*call), calls, max_workers
+        )
+        return
+
+    executor = ProcessPoolExecutor(max_workers=min(max_workers, len(calls)))
+    try:
+        futures = {
+            executor.submit(call_evaluator, evaluator, tuple(args)): index
+            for index, (evaluator, args) in enumerate(calls)
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    except BaseException:
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown(wait=True)
@@ -12,21 +12,40 @@ The module contains the following classes:
 
 The module contains the following functions:
 - load_experiment: Load an experiment from a YAML file.
+
+Loaded experiments are compiled into pickled snapshots, kept for the process
+and, when the EXPERIMENT_CACHE_DIR environment variable is set, in a local
+folder shared by the pipeline steps. Snapshots are keyed by the modification
+time, size and hash of the experiment file and its environment overlay, and
+are not used once a flow file they depend on is added or removed. Flow
+details are loaded on first use and memoised per process until the flow
+file changes.
 """
 
+import hashlib
+import json
 import os
-import yaml
-from typing import Any, List, Optional, Tuple, Dict
+import pickle
+from typing import TYPE_CHECKING, Any, List, Optional, Tuple, Dict
 
-from azure.ai.ml import MLClient
+from llmops.common.common import FlowTypeOption, file_signature, load_yaml
 
-from llmops.common.common import FlowTypeOption
+if TYPE_CHECKING:
+    from azure.ai.ml import MLClient
 
 _FLOW_DAG_FILENAME = "flow.dag.yaml"
 _FLOW_FLEX_FILENAME = "flow.flex.yaml"
 _DEFAULT_FLOWS_DIR = "flows"
 _DEFAULT_DATA_DIR = "data"
 
+EXPERIMENT_CACHE_DIR_ENV = "EXPERIMENT_CACHE_DIR"
+# Changed when the pickled experiment classes change
+_SNAPSHOT_VERSION = 1
+
+# Experiment snapshots and flow details of the process
+_snapshots: Dict[str, bytes] = {}
+_flow_details: Dict[Tuple, "FlowDetail"] = {}
+
 
 class Dataset:
     """
@@ -67,7 +86,7 @@ class Dataset:
         """Check if the dataset is an evaluation dataset."""
         return self.reference is not None
 
-    def get_remote_source(self, ml_client: MLClient):
+    def get_remote_source(self, ml_client: "MLClient"):
         """Get the remote source of the dataset."""
         if self._is_remote_source:
             parts = self.source.split(":")
@@ -332,20 +351,43 @@ class Experiment:
         return self._flow_detail
 
     def _load_flow_detail(self, flow_type: FlowTypeOption) -> FlowDetail:
-        """Load flow details from the flow yaml file."""
-        # Load flow data
-
+        """Load flow details from the flow yaml file, once per process."""
         if flow_type is FlowTypeOption.DAG_FLOW:
             flow_path = _resolve_flow_dir(self.base_path, self.flow)
             flow_file_path = os.path.join(flow_path, _FLOW_DAG_FILENAME)
+        elif (flow_type in
+              [FlowTypeOption.FUNCTION_FLOW, FlowTypeOption.CLASS_FLOW]):
+            flow_path = os.path.abspath(
+                os.path.join(self.base_path, self.flow)
+                )
+            flow_file_path = os.path.join(flow_path, _FLOW_FLEX_FILENAME)
+        else:
+            raise ValueError(f"Invalid flow type {flow_type}")
+
+        key = (
+            flow_type,
+            flow_path,
+            os.path.abspath(flow_file_path),
+            file_signature(flow_file_path),
+        )
+        if key not in _flow_details:
+            _flow_details[key] = self._parse_flow_detail(
+                flow_type, flow_path, flow_file_path
+            )
+        return _flow_details[key]
+
+    @staticmethod
+    def _parse_flow_detail(
+        flow_type: FlowTypeOption, flow_path: str, flow_file_path: str
+    ) -> FlowDetail:
+        """Parse flow details from the flow yaml file."""
+        if flow_type is FlowTypeOption.DAG_FLOW:
             if not os.path.exists(flow_file_path):
                 raise ValueError(
                     f"Could not open prompt flow file in path {flow_file_path}"
                 )
 
-            yaml_data: dict
-            with open(flow_file_path, "r") as yaml_file:
-                yaml_data = yaml.safe_load(yaml_file)
+            yaml_data: dict = load_yaml(flow_file_path)
 
             # Find prompt variants and nodes
             all_variants: list[dict[str, Any]] = []
@@ -367,26 +409,14 @@ class Experiment:
                 node_variant_mapping = {}
                 if nodes.get("type", {}) == "llm":
                     all_llm_nodes.add(nodes["name"])
-        elif (flow_type in
-              [FlowTypeOption.FUNCTION_FLOW, FlowTypeOption.CLASS_FLOW]):
-            flow_path = os.path.abspath(
-                os.path.join(self.base_path, self.flow)
-                )
-            flow_file_path = os.path.join(flow_path, _FLOW_FLEX_FILENAME)
+        else:
             if not os.path.exists(flow_file_path):
                 raise ValueError(
                     f"Could not open prompt flow file in path {flow_file_path}"
                 )
-            yaml_data: dict
-            with open(flow_file_path, "r") as yaml_file:
-                yaml_data = yaml.safe_load(yaml_file)
-                all_variants = []
-                default_variants = {}
-                all_llm_nodes = set()
-        else:
-            raise ValueError(
-                    f"Invalid flow type {flow_file_path}"
-                )
+            all_variants = []
+            default_variants = {}
+            all_llm_nodes = set()
         return FlowDetail(
             flow_path, all_variants, all_llm_nodes, default_variants
         )
@@ -588,9 +618,7 @@ def _load_base_experiment(
         exp_file_path: str,
         base_path: Optional[str]) -> Experiment:
     """Load base experiment from file."""
-    exp_config: dict
-    with open(exp_file_path, "r") as yaml_file:
-        exp_config = yaml.safe_load(yaml_file)
+    exp_config: dict = load_yaml(exp_file_path)
 
     # Read base raw datasets and create base datasets and mappings
     raw_datasets: list[dict] = exp_config.get("datasets")
@@ -691,9 +719,7 @@ def _apply_overlay(
     experiment: Experiment, overlay_file_path: str, base_path: Optional[str]
 ):
     """Apply overlay to experiment."""
-    overlay_config: dict
-    with open(overlay_file_path, "r") as yaml_file:
-        overlay_config = yaml.safe_load(yaml_file)
+    overlay_config: dict = load_yaml(overlay_file_path)
 
     if not overlay_config:
         return
@@ -756,6 +782,9 @@ def load_experiment(
     experiment file named
     <experiment_name>.<env>.yaml use it to override experiment dataset sources.
     :type env: Optional[str]
+    :return: A new experiment object, restored from a snapshot when the
+    experiment and overlay files didn't change.
+    :rtype: Experiment
     """
     safe_base_path = base_path or ""
     experiment_file_name = filename or "experiment.yaml"
@@ -766,15 +795,92 @@ def load_experiment(
         raise ValueError(f"Invalid experiment file '{experiment_file_name}'")
     env_experiment_file_name = f"{file_parts[0]}.{env}{file_parts[1]}"
 
-    # Create base experiment
     exp_file_path = os.path.join(safe_base_path, experiment_file_name)
     if not os.path.exists(exp_file_path):
         raise ValueError(f"Could not open experiment file {exp_file_path}")
+    env_exp_file_path = os.path.join(safe_base_path, env_experiment_file_name)
+
+    key = _snapshot_key(
+        [base_path, experiment_file_name, env, os.getcwd()],
+        [exp_file_path, env_exp_file_path],
+    )
+    experiment = _load_snapshot(key)
+    if experiment is not None:
+        return experiment
+
+    # Create base experiment
     experiment = _load_base_experiment(exp_file_path, safe_base_path)
 
     # Apply environment overlay
-    env_exp_file_path = os.path.join(safe_base_path, env_experiment_file_name)
     if os.path.exists(env_exp_file_path):
         _apply_overlay(experiment, env_exp_file_path, base_path)
 
+    _save_snapshot(key, experiment)
     return experiment
+
+
+def _snapshot_key(arguments: list, file_paths: List[str]) -> str:
+    """Get the snapshot key of the arguments and input files of a load."""
+    files = []
+    for file_path in file_paths:
+        signature = file_signature(file_path)
+        content_hash = None
+        if signature is not None:
+            with open(file_path, "rb") as file:
+                content_hash = hashlib.sha256(file.read()).hexdigest()
+        files.append([os.path.abspath(file_path), signature, content_hash])
+    payload = json.dumps(
+        [_SNAPSHOT_VERSION, arguments, files], sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _flow_files(experiment: Experiment) -> Dict[str, bool]:
+    """Get the flow files whose presence the experiment depends on."""
+    flow_dirs = [os.path.join(experiment.base_path or "", experiment.flow)]
+    flow_dirs.extend(evaluator.path for evaluator in experiment.evaluators)
+    return {
+        os.path.abspath(os.path.join(flow_dir, file_name)): os.path.isfile(
+            os.path.join(flow_dir, file_name)
+        )
+        for flow_dir in flow_dirs
+        for file_name in (_FLOW_DAG_FILENAME, _FLOW_FLEX_FILENAME)
+    }
+
+
+def _snapshot_path(key: str) -> Optional[str]:
+    cache_dir = os.environ.get(EXPERIMENT_CACHE_DIR_ENV)
+    return os.path.join(cache_dir, f"{key}.pkl") if cache_dir else None
+
+
+def _load_snapshot(key: str) -> Optional[Experiment]:
+    """Restore the experiment of a snapshot, None if missing or outdated."""
+    snapshot = _snapshots.get(key)
+    snapshot_path = _snapshot_path(key)
+    if snapshot is None and snapshot_path and os.path.isfile(snapshot_path):
+        with open(snapshot_path, "rb") as snapshot_file:
+            snapshot = snapshot_file.read()
+    if snapshot is None:
+        return None
+    try:
+        flow_files, experiment = pickle.loads(snapshot)
+    except Exception:
+        # Snapshots of other versions of the classes are parsed again
+        return None
+    if _flow_files(experiment) != flow_files:
+        return None
+    _snapshots[key] = snapshot
+    return experiment
+
+
+def _save_snapshot(key: str, experiment: Experiment):
+    """Save a snapshot of a loaded experiment, before any flow detail."""
+    snapshot = pickle.dumps((_flow_files(experiment), experiment))
+    _snapshots[key] = snapshot
+    snapshot_path = _snapshot_path(key)
+    if snapshot_path:
+        os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+        temp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as snapshot_file:
+            snapshot_file.write(snapshot)
+        os.replace(temp_path, snapshot_path)
@@ -0,0 +1,241 @@
+"""
+Single scan of the files of a flow folder.
+
+Resolving the flow type, finding the flow file and hashing the folder used
+to walk the flow folder once each. A flow manifest is built from a single
+walk of the folder and keeps everything these steps need:
+- The flow type and the flow file (flow.dag.yaml or flow.flex.yaml).
+- The init parameters of class based flows (init.json).
+- The files of the folder with their sizes, sorted by path and without the
+files of the ignore file of the folder (see llmops.common.folder_hash).
+- The content hash of the folder, computed on first use.
+
+Manifests are cached for the process, which runs one or several steps of a
+build (see the llmops driver, python -m llmops). Call clear_flow_manifests
+after changing the files of a flow folder.
+
+The module contains the following classes:
+- FlowManifest: Flow type, flow file, init parameters and files of a flow.
+
+The module contains the following functions:
+- build_flow_manifest: Scan a flow folder.
+- get_flow_manifest: Get the cached manifest of a flow folder.
+- clear_flow_manifests: Forget the cached manifests.
+"""
+
+import ast
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from llmops.common.common import FlowTypeOption, load_yaml
+from llmops.common.folder_hash import hash_files, list_folder_files
+from llmops.common.logger import llmops_logger
+
+FLOW_DAG_FILENAMES = ("flow.dag.yml", "flow.dag.yaml")
+FLOW_FLEX_FILENAMES = ("flow.flex.yml", "flow.flex.yaml")
+INIT_FILENAME = "init.json"
+
+logger = llmops_logger("flow_manifest")
+
+_lock = threading.Lock()
+_manifests: Dict[str, "FlowManifest"] = {}
+
+
+class FlowManifest:
+    """
+    Flow type, flow file, init parameters and files of a flow folder.
+
+    :param flow_path: Path of the flow folder.
+    :type flow_path: str
+    :param flow_type: Type of the flow, NO_FLOW without flow file.
+    :type flow_type: FlowTypeOption
+    :param flow_file_path: Absolute path of the flow file, None without
+    flow file.
+    :type flow_file_path: Optional[str]
+    :param files: Paths relative to the flow folder and sizes of the files
+    of the folder, sorted by path.
+    :type files: List[Tuple[str, int]]
+    """
+
+    def __init__(
+        self,
+        flow_path: str,
+        flow_type: FlowTypeOption,
+        flow_file_path: Optional[str],
+        files: List[Tuple[str, int]],
+    ):
+        """Initialize FlowManifest object."""
+        self.flow_path = flow_path
+        self.flow_type = flow_type
+        self.flow_file_path = flow_file_path
+        self.files = files
+        self._content_hash: Optional[str] = None
+
+    @property
+    def is_flex(self) -> bool:
+        """Check if the flow is a flex (class or function) flow."""
+        return self.flow_type in (
+            FlowTypeOption.CLASS_FLOW,
+            FlowTypeOption.FUNCTION_FLOW,
+        )
+
+    @property
+    def size(self) -> int:
+        """Total size of the files of the flow folder, in bytes."""
+        return sum(size for _, size in self.files)
+
+    @property
+    def init_params(self) -> Dict[str, Any]:
+        """
+        Init parameters of a class based flow, empty for other flows.
+
+        Placeholders (${...}) are resolved from the current environment
+        variables on every access.
+        """
+        if self.flow_type is not FlowTypeOption.CLASS_FLOW:
+            return {}
+        return _resolve_init_params(
+            os.path.join(self.flow_path, INIT_FILENAME)
+        )
+
+    @property
+    def content_hash(self) -> str:
+        """
+        Hash of the content of the files of the flow folder.
+
+        The hash is the one of llmops.common.common.hash_folder.
+        """
+        if self._content_hash is None:
+            self._content_hash = hash_files(
+                self.flow_path, [file for file, _ in self.files]
+            )
+        return self._content_hash
+
+
+def build_flow_manifest(flow_path: str) -> FlowManifest:
+    """
+    Scan a flow folder.
+
+    Flow files are looked for in the whole folder, like prompt flow does,
+    and resolved in the flow folder. A flex flow file wins over a dag flow
+    file found in the same folder.
+
+    :param flow_path: Path of the flow folder.
+    :type flow_path: str
+    :return: The manifest of the flow folder.
+    :rtype: FlowManifest
+    """
+    found_flex = found_dag = None
+    files = list_folder_files(flow_path)
+    for file_path, _ in files:
+        file = os.path.basename(file_path)
+        if file in FLOW_FLEX_FILENAMES:
+            found_flex = file
+        elif file in FLOW_DAG_FILENAMES:
+            found_dag = file
+
+    flow_file_path = None
+    if found_flex or found_dag:
+        flow_file_path = os.path.abspath(
+            os.path.join(flow_path, found_flex or found_dag)
+        )
+    if not found_flex and not found_dag:
+        flow_type = FlowTypeOption.NO_FLOW
+    elif found_flex:
+        if found_dag:
+            logger.warning(
+                f"Flow folder {flow_path} has both {found_flex} and "
+                f"{found_dag}, using {found_flex}"
+            )
+        flow_type = _resolve_flex_flow_type(flow_path, flow_file_path)
+    else:
+        flow_type = FlowTypeOption.DAG_FLOW
+    return FlowManifest(flow_path, flow_type, flow_file_path, files)
+
+
+def get_flow_manifest(flow_path: str) -> FlowManifest:
+    """
+    Get the manifest of a flow folder, scanned once per process.
+
+    :param flow_path: Path of the flow folder.
+    :type flow_path: str
+    :return: The cached manifest of the flow folder.
+    :rtype: FlowManifest
+    """
+    key = os.path.abspath(flow_path)
+    with _lock:
+        manifest = _manifests.get(key)
+    if manifest is None:
+        manifest = build_flow_manifest(flow_path)
+        with _lock:
+            manifest = _manifests.setdefault(key, manifest)
+    return manifest
+
+
+def clear_flow_manifests():
+    """Forget the cached manifests of the flow folders."""
+    with _lock:
+        _manifests.clear()
+
+
+def _resolve_flex_flow_type(
+    flow_path: str, flow_file_path: str
+) -> FlowTypeOption:
+    """Get the type of a flex flow from its entry, a class or a function."""
+    config = load_yaml(flow_file_path)
+
+    entry_value = config["entry"]
+    file_name, entry_name = entry_value.split(":")
+    entry_file_path = os.path.join(flow_path, file_name + ".py")
+    with open(os.path.abspath(entry_file_path)) as file:
+        source_code = file.read()
+    tree = ast.parse(source_code)
+
+    entry_object = None
+    for node in ast.walk(tree):
+        if (
+            isinstance(node, (ast.FunctionDef, ast.ClassDef))
+            and node.name == entry_name
+        ):
+            entry_object = node
+            break
+    if entry_object is None:
+        raise ValueError(f"Entry '{entry_name}' not found in the module.")
+
+    if isinstance(entry_object, ast.ClassDef):
+        return FlowTypeOption.CLASS_FLOW
+    return FlowTypeOption.FUNCTION_FLOW
+
+
+def _resolve_env_placeholder(value: str, env_var_name: str) -> str:
+    """Get the environment variable of a ${...} placeholder if it is set."""
+    if value.startswith('${') and value.endswith('}'):
+        return os.environ.get(env_var_name.upper()) or value
+    return value
+
+
+def _resolve_init_params(init_file_path: str) -> Dict[str, Any]:
+    """Read the init parameters of a class based flow."""
+    params_dict: Dict[str, Any] = {}
+    if not os.path.isfile(init_file_path):
+        return params_dict
+    with open(init_file_path) as file:
+        init_data = json.load(file)
+
+    for key, value in init_data.items():
+        if isinstance(value, dict):
+            params_dict[key] = {
+                sub_key: (
+                    _resolve_env_placeholder(sub_value, f"{key}_{sub_key}")
+                    if isinstance(sub_value, str)
+                    else sub_value
+                )
+                for sub_key, sub_value in value.items()
+            }
+        elif isinstance(value, str):
+            params_dict[key] = _resolve_env_placeholder(value, key)
+        elif isinstance(value, int):
+            params_dict[key] = value
+    return params_dict
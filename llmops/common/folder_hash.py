@@ -0,0 +1,388 @@
+"""
+Hashing of the content of folders, for model registration and caches.
+
+The hash of a folder identifies its content on any machine:
+- Files are sorted by their path relative to the folder, with '/'
+separators, so the hash doesn't depend on the order of os.walk.
+- Files matching the ignore file of the folder (.amlignore, or .gitignore
+without .amlignore) are skipped, like Azure ML does when it uploads the
+folder. Files generated by local runs (.promptflow, __pycache__ and *.pyc)
+are always skipped, unless the ignore file includes them again with '!'.
+- Files are read in fixed-size chunks, on a thread pool.
+- The digest of a file is cached by path, size and modification time, and
+unchanged files are not read again. The cache lives in the process and,
+when the HASH_CACHE_DIR environment variable is set, in a local JSON file
+shared by the steps of a build.
+
+The hash of the folder is the sha256 of the relative path and the sha256 of
+the content of every file.
+
+The module contains the following classes:
+- IgnoreRules: Patterns of an ignore file.
+- FileDigestCache: Digests of files by path, size and modification time.
+
+The module contains the following functions:
+- load_ignore_rules: Read the ignore file of a folder.
+- list_folder_files: List the files of a folder, sorted and ignore-aware.
+- hash_file: Hash a file in fixed-size chunks.
+- get_file_digest_cache: Get the file digest cache of the process.
+- clear_file_digests: Forget the cached file digests.
+- hash_files: Hash files of a folder.
+- hash_folder_contents: Hash a folder.
+"""
+
+import fnmatch
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+HASH_CACHE_DIR_ENV = "HASH_CACHE_DIR"
+HASH_CACHE_FILENAME = "file_digests.json"
+# Ignore files by priority, the first one found in the folder is used
+IGNORE_FILENAMES = (".amlignore", ".gitignore")
+# Files generated by local runs, ignored before the ignore file patterns
+DEFAULT_IGNORE_PATTERNS = (".promptflow/", "__pycache__/", "*.pyc")
+CHUNK_SIZE = 1024 * 1024
+
+_lock = threading.Lock()
+_caches: Dict[Optional[str], "FileDigestCache"] = {}
+
+
+class IgnoreRules:
+    """
+    Patterns of an ignore file, in the .gitignore format.
+
+    Patterns are matched with fnmatch. A pattern without '/' matches the
+    name of a file or folder at any depth, a pattern with '/' matches its
+    path relative to the folder. '!' negates a pattern, a trailing '/'
+    only matches folders and the last matching pattern wins.
+
+    :param lines: Lines of the ignore file.
+    :type lines: Iterable[str]
+    """
+
+    def __init__(self, lines: Iterable[str]):
+        """Initialize IgnoreRules object."""
+        self._patterns: List[Tuple[str, bool, bool, bool]] = []
+        for line in lines:
+            pattern = line.strip()
+            if not pattern or pattern.startswith("#"):
+                continue
+            negate = pattern.startswith("!")
+            if negate:
+                pattern = pattern[1:]
+            dir_only = pattern.endswith("/")
+            pattern = pattern.rstrip("/")
+            while pattern.startswith("**/"):
+                pattern = pattern[3:]
+            anchored = "/" in pattern
+            pattern = pattern.lstrip("/")
+            if pattern:
+                self._patterns.append((pattern, negate, dir_only, anchored))
+
+    def __bool__(self) -> bool:
+        """Check if the rules have patterns."""
+        return bool(self._patterns)
+
+    def is_ignored(self, relative_path: str, is_dir: bool = False) -> bool:
+        """
+        Check if a file or folder is ignored.
+
+        :param relative_path: Path relative to the folder, '/' separated.
+        :type relative_path: str
+        :param is_dir: Flag for folders.
+        :type is_dir: bool
+        :return: True if the last matching pattern ignores the path.
+        :rtype: bool
+        """
+        name = relative_path.rsplit("/", 1)[-1]
+        ignored = False
+        for pattern, negate, dir_only, anchored in self._patterns:
+            if dir_only and not is_dir:
+                continue
+            if fnmatch.fnmatchcase(
+                relative_path if anchored else name, pattern
+            ):
+                ignored = not negate
+        return ignored
+
+
+def load_ignore_rules(
+    folder_path: str, ignore_filenames: Iterable[str] = IGNORE_FILENAMES
+) -> IgnoreRules:
+    """
+    Read the ignore file of a folder.
+
+    :param folder_path: Path of the folder.
+    :type folder_path: str
+    :param ignore_filenames: Names of the ignore files, by priority.
+    :type ignore_filenames: Iterable[str]
+    :return: Default rules followed by the rules of the first ignore file
+    found.
+    :rtype: IgnoreRules
+    """
+    lines = list(DEFAULT_IGNORE_PATTERNS)
+    for ignore_filename in ignore_filenames:
+        ignore_file_path = os.path.join(folder_path, ignore_filename)
+        if os.path.isfile(ignore_file_path):
+            with open(ignore_file_path, encoding="utf-8") as file:
+                lines.extend(file.read().splitlines())
+            break
+    return IgnoreRules(lines)
+
+
+def list_folder_files(
+    folder_path: str, ignore_filenames: Iterable[str] = IGNORE_FILENAMES
+) -> List[Tuple[str, int]]:
+    """
+    List the files of a folder, without the ignored ones.
+
+    Ignored folders are not walked.
+
+    :param folder_path: Path of the folder.
+    :type folder_path: str
+    :param ignore_filenames: Names of the ignore files, by priority.
+    :type ignore_filenames: Iterable[str]
+    :return: Paths relative to the folder and sizes of the files, sorted by
+    path.
+    :rtype: List[Tuple[str, int]]
+    """
+    rules = load_ignore_rules(folder_path, ignore_filenames)
+    files: List[Tuple[str, int]] = []
+    for root, dir_names, file_names in os.walk(folder_path):
+        relative_root = os.path.relpath(root, folder_path)
+        prefix = "" if relative_root == "." else f"{_posix(relative_root)}/"
+        dir_names[:] = [
+            dir_name
+            for dir_name in dir_names
+            if not rules.is_ignored(f"{prefix}{dir_name}", is_dir=True)
+        ]
+        for file_name in file_names:
+            if rules.is_ignored(f"{prefix}{file_name}"):
+                continue
+            file_path = os.path.join(root, file_name)
+            files.append(
+                (
+                    os.path.relpath(file_path, folder_path),
+                    os.path.getsize(file_path),
+                )
+            )
+    files.sort(key=lambda file: _posix(file[0]))
+    return files
+
+
+def hash_file(file_path: str, chunk_size: int = CHUNK_SIZE) -> str:
+    """
+    Hash the content of a file, read in fixed-size chunks.
+
+    :param file_path: Path of the file.
+    :type file_path: str
+    :param chunk_size: Size of the chunks, in bytes.
+    :type chunk_size: int
+    :return: sha256 hex digest of the content of the file.
+    :rtype: str
+    """
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class FileDigestCache:
+    """
+    Digests of files by absolute path, size and modification time.
+
+    :param cache_file: JSON file where the digests are persisted,
+    None to only keep them in memory.
+    :type cache_file: Optional[str]
+    """
+
+    def __init__(self, cache_file: Optional[str] = None):
+        """Initialize FileDigestCache object."""
+        self.cache_file = cache_file
+        self._lock = threading.Lock()
+        self._digests: Dict[str, Tuple[int, int, str]] = {}
+        self._changed = False
+        if cache_file and os.path.isfile(cache_file):
+            try:
+                with open(cache_file, encoding="utf-8") as file:
+                    self._digests = {
+                        path: tuple(entry)
+                        for path, entry in json.load(file).items()
+                    }
+            except (OSError, ValueError, TypeError):
+                # A corrupted cache is rebuilt
+                self._digests = {}
+
+    def get(self, file_path: str, size: int, mtime_ns: int) -> Optional[str]:
+        """
+        Get the digest of a file if it didn't change.
+
+        :param file_path: Absolute path of the file.
+        :type file_path: str
+        :param size: Size of the file, in bytes.
+        :type size: int
+        :param mtime_ns: Modification time of the file, in nanoseconds.
+        :type mtime_ns: int
+        :return: The cached digest, None if unknown or stale.
+        :rtype: Optional[str]
+        """
+        with self._lock:
+            entry = self._digests.get(file_path)
+        if entry is None or entry[0] != size or entry[1] != mtime_ns:
+            return None
+        return entry[2]
+
+    def put(self, file_path: str, size: int, mtime_ns: int, digest: str):
+        """
+        Cache the digest of a file.
+
+        :param file_path: Absolute path of the file.
+        :type file_path: str
+        :param size: Size of the file, in bytes.
+        :type size: int
+        :param mtime_ns: Modification time of the file, in nanoseconds.
+        :type mtime_ns: int
+        :param digest: Digest of the content of the file.
+        :type digest: str
+        """
+        with self._lock:
+            self._digests[file_path] = (size, mtime_ns, digest)
+            self._changed = True
+
+    def save(self):
+        """Persist the digests to the cache file, if they changed."""
+        if not self.cache_file:
+            return
+        with self._lock:
+            if not self._changed:
+                return
+            digests = dict(self._digests)
+            self._changed = False
+        cache_dir = os.path.dirname(self.cache_file)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        temp_file = f"{self.cache_file}.{os.getpid()}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as file:
+            json.dump(digests, file)
+        os.replace(temp_file, self.cache_file)
+
+
+def get_file_digest_cache() -> FileDigestCache:
+    """
+    Get the file digest cache of the process.
+
+    The cache is persisted in the HASH_CACHE_DIR folder when the
+    environment variable is set.
+
+    :return: The file digest cache.
+    :rtype: FileDigestCache
+    """
+    cache_dir = os.environ.get(HASH_CACHE_DIR_ENV)
+    cache_file = (
+        os.path.abspath(os.path.join(cache_dir, HASH_CACHE_FILENAME))
+        if cache_dir
+        else None
+    )
+    with _lock:
+        cache = _caches.get(cache_file)
+        if cache is None:
+            cache = _caches[cache_file] = FileDigestCache(cache_file)
+    return cache
+
+
+def clear_file_digests():
+    """Forget the cached file digests of the process."""
+    with _lock:
+        _caches.clear()
+
+
+def hash_files(
+    folder_path: str,
+    relative_paths: Iterable[str],
+    max_workers: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+    cache: Optional[FileDigestCache] = None,
+) -> str:
+    """
+    Hash files of a folder.
+
+    :param folder_path: Path of the folder.
+    :type folder_path: str
+    :param relative_paths: Paths of the files relative to the folder.
+    :type relative_paths: Iterable[str]
+    :param max_workers: Number of files hashed in parallel, default of
+    ThreadPoolExecutor if None.
+    :type max_workers: Optional[int]
+    :param chunk_size: Size of the chunks the files are read in, in bytes.
+    :type chunk_size: int
+    :param cache: Cache of the file digests, the one of the process if None.
+    :type cache: Optional[FileDigestCache]
+    :return: sha256 hex digest of the paths and contents of the files.
+    :rtype: str
+    """
+    if cache is None:
+        cache = get_file_digest_cache()
+    paths = sorted(relative_paths, key=_posix)
+
+    def digest(relative_path: str) -> str:
+        file_path = os.path.abspath(os.path.join(folder_path, relative_path))
+        stat = os.stat(file_path)
+        file_digest = cache.get(file_path, stat.st_size, stat.st_mtime_ns)
+        if file_digest is None:
+            file_digest = hash_file(file_path, chunk_size)
+            cache.put(file_path, stat.st_size, stat.st_mtime_ns, file_digest)
+        return file_digest
+
+    if len(paths) > 1 and max_workers != 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            digests = list(executor.map(digest, paths))
+    else:
+        digests = [digest(path) for path in paths]
+    cache.save()
+
+    sha256 = hashlib.sha256()
+    for path, file_digest in zip(paths, digests):
+        sha256.update(_posix(path).encode("utf-8"))
+        sha256.update(b"\0")
+        sha256.update(bytes.fromhex(file_digest))
+    return sha256.hexdigest()
+
+
+def hash_folder_contents(
+    folder_path: str,
+    max_workers: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+    ignore_filenames: Iterable[str] = IGNORE_FILENAMES,
+) -> str:
+    """
+    Hash a folder, without its ignored files.
+
+    :param folder_path: Path of the folder.
+    :type folder_path: str
+    :param max_workers: Number of files hashed in parallel, default of
+    ThreadPoolExecutor if None.
+    :type max_workers: Optional[int]
+    :param chunk_size: Size of the chunks the files are read in, in bytes.
+    :type chunk_size: int
+    :param ignore_filenames: Names of the ignore files, by priority.
+    :type ignore_filenames: Iterable[str]
+    :return: sha256 hex digest of the paths and contents of the files.
+    :rtype: str
+    """
+    files = list_folder_files(folder_path, ignore_filenames)
+    return hash_files(
+        folder_path,
+        [path for path, _ in files],
+        max_workers=max_workers,
+        chunk_size=chunk_size,
+    )
+
+
+def _posix(path: str) -> str:
+    """Get a relative path with '/' separators."""
+    return path.replace(os.sep, "/")
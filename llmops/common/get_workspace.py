@@ -11,10 +11,7 @@ workspace or project.
 
 import argparse
 from dotenv import load_dotenv
-from typing import Optional
-
-from azure.ai.ml import MLClient
-from azure.identity import DefaultAzureCredential
+from typing import List, Optional
 
 from llmops.common.logger import llmops_logger
 from llmops.common.experiment_cloud_config import ExperimentCloudConfig
@@ -43,16 +40,17 @@ def get_workspace(
     Returns:
         object: The generated workspace object
     """
+    from llmops.common.clients import get_ml_client
+
     try:
         config = ExperimentCloudConfig(
             subscription_id, resource_group_name, workspace_name
         )
         logger.info(f"Getting access to {config.workspace_name} workspace.")
-        client = MLClient(
-            DefaultAzureCredential(),
-            subscription_id=config.subscription_id,
-            resource_group_name=config.resource_group_name,
-            workspace_name=config.workspace_name,
+        client = get_ml_client(
+            config.subscription_id,
+            config.resource_group_name,
+            config.workspace_name,
         )
 
         workspace = client.workspaces.get(workspace_name)
@@ -64,7 +62,7 @@ def get_workspace(
         raise
 
 
-def main():
+def main(argv: Optional[List[str]] = None):
     """
     Run the main function to get the workspace object.
 
@@ -92,7 +90,7 @@ def main():
         default=None,
     )
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     get_workspace(args.subscription_id,
                   args.resource_group_name,
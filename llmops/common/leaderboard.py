@@ -0,0 +1,518 @@
+"""
+This module ranks the variants of an experiment from their evaluation results.
+
+The line scores of every variant are read from the result report written by
+prompt_eval, paired by evaluation dataset line, and compared to the default
+variant with a paired bootstrap. The leaderboard reports for every variant
+its mean score, the confidence interval of the mean, the difference with the
+default variant and its confidence interval, the probability of being better
+than the default variant and the rate of lines won, tied and lost against it.
+A variant is a significant improvement when the whole confidence interval of
+the difference is above zero.
+
+Resampling is vectorised: the bootstrap weights of a batch of resamples are
+multiplied with the line x variant score matrix, so thousands of lines and
+dozens of variants are compared in seconds.
+
+Args:
+--file: The name of the experiment file. Default is 'experiment.yaml'.
+--base_path: Base path of the use case. Where flows, data,
+and experiment.yaml are expected to be found.
+--env_name: The environment name for execution and deployment. This argument
+is not required but will be used to read experiment overlay files if specified.
+--report_dir: The directory where prompt_eval stored the outputs and metrics.
+--metric: Line output compared between the variants, for example correctness.
+--n_resamples: Number of bootstrap resamples. Default is 1000.
+--confidence: Confidence level of the intervals. Default is 0.95.
+--seed: Seed of the bootstrap resampling.
+--output_file: File where the selected variant is written in JSON format.
+The leaderboard is saved in <report_dir>/<experiment>_leaderboard.csv.
+"""
+
+import argparse
+import ast
+import json
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from llmops.common.common import resolve_flow_type
+from llmops.common.dataset_shards import LINE_NUMBER_COLUMN
+from llmops.common.experiment import load_experiment
+from llmops.common.logger import llmops_logger
+
+logger = llmops_logger("leaderboard")
+
+DEFAULT_VARIANT = "defaults"
+VARIANT_COLUMN = "variant"
+LINE_COLUMNS = (LINE_NUMBER_COLUMN,)
+GROUP_COLUMNS = ("eval_dataset", "flow_name")
+
+# Line outputs of evaluators grading lines with labels
+_LABEL_SCORES = {"correct": 1.0, "incorrect": 0.0, "true": 1.0, "false": 0.0}
+# Upper bound of the bootstrap weights kept in memory at once
+_BATCH_ELEMENTS = 1 << 22
+
+
+def to_score(value: Any) -> float:
+    """
+    Convert a line output of an evaluator to a numeric score.
+
+    Numbers and booleans are kept, outputs with a score (for example
+    {"score": "4", "explanation": "..."}) are reduced to it, grade labels
+    such as Correct and Incorrect are mapped to 1 and 0.
+
+    :param value: Line output of an evaluator, as found in the details.
+    :type value: Any
+    :return: The score, nan if the output has none.
+    :rtype: float
+    """
+    if isinstance(value, dict):
+        value = value.get("score")
+    if isinstance(value, str):
+        text = value.strip()
+        if text.lower() in _LABEL_SCORES:
+            return _LABEL_SCORES[text.lower()]
+        if text.startswith("{"):
+            # Outputs saved in csv reports are the repr of the dictionary
+            try:
+                return to_score(ast.literal_eval(text))
+            except (ValueError, SyntaxError):
+                return np.nan
+        value = text
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def label_variants(
+    details: pd.DataFrame, default_variants: Dict[str, str]
+) -> pd.Series:
+    """
+    Get the variant label of every line of the evaluation details.
+
+    prompt_eval reports the variant of every llm node in a column named
+    after the node. Runs of the default variants have no node columns.
+    The label of the default variants is "defaults", the label of the
+    others lists the node variants that differ from the default ones,
+    for example "summarize=variant_1".
+
+    :param details: Evaluation details of several runs.
+    :type details: pd.DataFrame
+    :param default_variants: Dictionary from llm node name to
+    default node variant.
+    :type default_variants: Dict[str, str]
+    :return: Variant label of every line.
+    :rtype: pd.Series
+    """
+    changes = []
+    for node, default_variant in default_variants.items():
+        if node not in details.columns:
+            continue
+        variant = details[node].fillna(default_variant).astype(str)
+        changes.append(
+            (f"{node}=" + variant).where(variant != default_variant, "")
+        )
+    if not changes:
+        return pd.Series(DEFAULT_VARIANT, index=details.index, dtype=object)
+    labels = pd.concat(changes, axis=1).agg(
+        lambda row: ",".join(change for change in row if change), axis=1
+    )
+    return labels.where(labels != "", DEFAULT_VARIANT)
+
+
+def pivot_scores(
+    details: pd.DataFrame,
+    metric: str,
+    variant_column: str = VARIANT_COLUMN,
+    line_columns: Sequence[str] = LINE_COLUMNS,
+) -> pd.DataFrame:
+    """
+    Get the line x variant matrix of the scores of a metric.
+
+    Only the lines scored for every variant are kept, so the variants are
+    compared on the same lines.
+
+    :param details: Evaluation details with a variant column.
+    :type details: pd.DataFrame
+    :param metric: Name of the compared line output, with or without the
+    outputs. prefix.
+    :type metric: str
+    :param variant_column: Column with the variant of every line.
+    :type variant_column: str
+    :param line_columns: Columns identifying a line of the evaluation
+    dataset.
+    :type line_columns: Sequence[str]
+    :return: Scores with a row per line and a column per variant.
+    :rtype: pd.DataFrame
+    """
+    column = metric if metric in details.columns else f"outputs.{metric}"
+    if column not in details.columns:
+        raise ValueError(f"Metric {metric} not found in the details")
+    missing = [name for name in line_columns if name not in details.columns]
+    if missing:
+        raise ValueError(f"Line columns {missing} not found in the details")
+
+    scores = details[[*line_columns, variant_column]].copy()
+    scores["score"] = details[column].map(to_score)
+    matrix = scores.pivot_table(
+        index=list(line_columns),
+        columns=variant_column,
+        values="score",
+        aggfunc="mean",
+        dropna=False,
+    )
+    paired = matrix.dropna()
+    if len(paired) < len(matrix):
+        logger.warning(
+            f"{len(matrix) - len(paired)} of {len(matrix)} lines are not "
+            f"scored for every variant and are not compared"
+        )
+    return paired
+
+
+def bootstrap_compare(
+    scores: np.ndarray,
+    baseline: int = 0,
+    n_resamples: int = 1000,
+    confidence: float = 0.95,
+    seed: Optional[int] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Compare variants to a baseline with a paired bootstrap.
+
+    Every resample draws the lines with replacement and applies the same
+    draw to every variant, so the differences with the baseline keep the
+    pairing of the lines.
+
+    :param scores: Scores with a row per line and a column per variant.
+    :type scores: np.ndarray
+    :param baseline: Column of the baseline variant.
+    :type baseline: int
+    :param n_resamples: Number of bootstrap resamples.
+    :type n_resamples: int
+    :param confidence: Confidence level of the intervals.
+    :type confidence: float
+    :param seed: Seed of the resampling.
+    :type seed: Optional[int]
+    :return: Dictionary of arrays with a value per variant: mean, ci_low,
+    ci_high, diff, diff_low, diff_high, p_better, win_rate, tie_rate,
+    loss_rate.
+    :rtype: Dict[str, np.ndarray]
+    """
+    scores = np.asarray(scores, dtype=float)
+    if scores.ndim != 2 or scores.shape[0] == 0:
+        raise ValueError("Scores must be a non empty line x variant matrix")
+    if not 0 < confidence < 1:
+        raise ValueError(f"Confidence must be in (0, 1), got {confidence}")
+    if n_resamples < 1:
+        raise ValueError("Number of resamples must be positive")
+
+    lines = scores.shape[0]
+    rng = np.random.default_rng(seed)
+    uniform = np.full(lines, 1.0 / lines)
+    batch_size = max(1, _BATCH_ELEMENTS // lines)
+    means = np.empty((n_resamples, scores.shape[1]))
+    for start in range(0, n_resamples, batch_size):
+        end = min(start + batch_size, n_resamples)
+        # Number of times every line is drawn in every resample
+        weights = rng.multinomial(lines, uniform, size=end - start)
+        means[start:end] = weights @ scores / lines
+    diffs = means - means[:, [baseline]]
+
+    tail = (1 - confidence) / 2 * 100
+    mean_low, mean_high = np.percentile(means, [tail, 100 - tail], axis=0)
+    diff_low, diff_high = np.percentile(diffs, [tail, 100 - tail], axis=0)
+    line_diffs = scores - scores[:, [baseline]]
+    return {
+        "mean": scores.mean(axis=0),
+        "ci_low": mean_low,
+        "ci_high": mean_high,
+        "diff": line_diffs.mean(axis=0),
+        "diff_low": diff_low,
+        "diff_high": diff_high,
+        "p_better": (diffs > 0).mean(axis=0),
+        "win_rate": (line_diffs > 0).mean(axis=0),
+        "tie_rate": (line_diffs == 0).mean(axis=0),
+        "loss_rate": (line_diffs < 0).mean(axis=0),
+    }
+
+
+def build_leaderboard(
+    scores: pd.DataFrame,
+    baseline: str = DEFAULT_VARIANT,
+    n_resamples: int = 1000,
+    confidence: float = 0.95,
+    seed: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Rank the variants of a line x variant score matrix.
+
+    :param scores: Scores with a row per line and a column per variant.
+    :type scores: pd.DataFrame
+    :param baseline: Variant the others are compared to.
+    :type baseline: str
+    :param n_resamples: Number of bootstrap resamples.
+    :type n_resamples: int
+    :param confidence: Confidence level of the intervals.
+    :type confidence: float
+    :param seed: Seed of the resampling.
+    :type seed: Optional[int]
+    :return: A row per variant, best mean first, with the statistics of
+    bootstrap_compare, the number of compared lines, a significant column
+    (1 better, -1 worse, 0 not significant) and the rank.
+    :rtype: pd.DataFrame
+    """
+    variants = [str(variant) for variant in scores.columns]
+    if baseline not in variants:
+        raise ValueError(
+            f"Baseline variant {baseline} not found in {', '.join(variants)}"
+        )
+    stats = bootstrap_compare(
+        scores.to_numpy(),
+        variants.index(baseline),
+        n_resamples,
+        confidence,
+        seed,
+    )
+    leaderboard = pd.DataFrame({VARIANT_COLUMN: variants, **stats})
+    leaderboard.insert(1, "lines", len(scores))
+    leaderboard["significant"] = np.select(
+        [leaderboard["diff_low"] > 0, leaderboard["diff_high"] < 0], [1, -1], 0
+    )
+    leaderboard = leaderboard.sort_values(
+        ["mean", "p_better"], ascending=False, kind="stable"
+    ).reset_index(drop=True)
+    leaderboard.insert(0, "rank", range(1, len(leaderboard) + 1))
+    return leaderboard
+
+
+def select_winner(
+    leaderboard: pd.DataFrame, baseline: str = DEFAULT_VARIANT
+) -> str:
+    """
+    Select the best variant significantly better than the baseline.
+
+    :param leaderboard: Leaderboard of build_leaderboard.
+    :type leaderboard: pd.DataFrame
+    :param baseline: Variant kept when none is significantly better.
+    :type baseline: str
+    :return: Label of the selected variant.
+    :rtype: str
+    """
+    better = leaderboard[leaderboard["significant"] > 0]
+    if better.empty:
+        return baseline
+    return str(better.sort_values("mean", ascending=False).iloc[0][
+        VARIANT_COLUMN
+    ])
+
+
+def compare_variants(
+    details: pd.DataFrame,
+    metric: str,
+    default_variants: Dict[str, str],
+    n_resamples: int = 1000,
+    confidence: float = 0.95,
+    seed: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Build the leaderboards of the evaluation details of prompt_eval.
+
+    Variants are compared separately for every evaluation dataset and
+    evaluator found in the details.
+
+    :param details: Evaluation details, the result report of prompt_eval.
+    :type details: pd.DataFrame
+    :param metric: Name of the compared line output.
+    :type metric: str
+    :param default_variants: Dictionary from llm node name to
+    default node variant.
+    :type default_variants: Dict[str, str]
+    :param n_resamples: Number of bootstrap resamples.
+    :type n_resamples: int
+    :param confidence: Confidence level of the intervals.
+    :type confidence: float
+    :param seed: Seed of the resampling.
+    :type seed: Optional[int]
+    :return: Leaderboards, with the dataset and evaluator columns.
+    :rtype: pd.DataFrame
+    """
+    details = details.copy()
+    details[VARIANT_COLUMN] = label_variants(details, default_variants)
+    group_columns = [name for name in GROUP_COLUMNS if name in details]
+
+    leaderboards = []
+    groups = details.groupby(group_columns) if group_columns else [
+        ((), details)
+    ]
+    for key, group in groups:
+        key = key if isinstance(key, tuple) else (key,)
+        scores = pivot_scores(group, metric)
+        if scores.empty or DEFAULT_VARIANT not in scores.columns:
+            logger.warning(
+                f"No lines of the default variants to compare for {key}"
+            )
+            continue
+        leaderboard = build_leaderboard(
+            scores, DEFAULT_VARIANT, n_resamples, confidence, seed
+        )
+        for name, value in zip(group_columns, key):
+            leaderboard.insert(0, name, value)
+        leaderboards.append(leaderboard)
+
+    if not leaderboards:
+        raise ValueError(f"No variants to compare on {metric}")
+    return pd.concat(leaderboards, ignore_index=True)
+
+
+def _read_report(report_dir: str, report_name: str) -> pd.DataFrame:
+    parquet_path = os.path.join(report_dir, f"{report_name}.parquet")
+    if os.path.exists(parquet_path):
+        return pd.read_parquet(parquet_path)
+    return pd.read_csv(
+        os.path.join(report_dir, f"{report_name}.csv"), index_col=0
+    )
+
+
+def prepare_and_execute(
+    exp_filename: Optional[str],
+    base_path: Optional[str],
+    env_name: Optional[str],
+    report_dir: str,
+    metric: str,
+    n_resamples: int = 1000,
+    confidence: float = 0.95,
+    seed: Optional[int] = None,
+    output_file: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Rank the evaluated variants of an experiment.
+
+    reads the result report of prompt_eval
+    compares the variants to the default variants on the metric
+    saves the leaderboard in <report_dir>/<experiment>_leaderboard.csv
+    writes the selected variant of every dataset and evaluator in
+    output_file
+
+    Returns:
+        The leaderboard.
+    """
+    experiment = load_experiment(
+        filename=exp_filename, base_path=base_path, env=env_name
+    )
+    flow_type, _ = resolve_flow_type(experiment.base_path, experiment.flow)
+    default_variants = experiment.get_flow_detail(flow_type).default_variants
+
+    details = _read_report(report_dir, f"{experiment.name}_result")
+    leaderboard = compare_variants(
+        details, metric, default_variants, n_resamples, confidence, seed
+    )
+    leaderboard_path = os.path.join(
+        report_dir, f"{experiment.name}_leaderboard.csv"
+    )
+    leaderboard.to_csv(leaderboard_path, index=False)
+    logger.info(f"Leaderboard saved in {leaderboard_path}")
+
+    group_columns = [name for name in GROUP_COLUMNS if name in leaderboard]
+    winners: List[Dict[str, Any]] = []
+    groups = leaderboard.groupby(group_columns, sort=False) if (
+        group_columns
+    ) else [((), leaderboard)]
+    for key, group in groups:
+        key = key if isinstance(key, tuple) else (key,)
+        winner = {name: value for name, value in zip(group_columns, key)}
+        winner["metric"] = metric
+        winner[VARIANT_COLUMN] = select_winner(group)
+        logger.info(json.dumps(winner, default=str))
+        winners.append(winner)
+
+    if output_file:
+        with open(output_file, "w") as out_file:
+            json.dump(winners, out_file, indent=4, default=str)
+    return leaderboard
+
+
+def main(argv: Optional[List[str]] = None):
+    """Rank the evaluated variants of an experiment."""
+    parser = argparse.ArgumentParser("leaderboard")
+    parser.add_argument(
+        "--file",
+        type=str,
+        help="The experiment file. Default is 'experiment.yaml'",
+        required=False,
+        default="experiment.yaml",
+    )
+    parser.add_argument(
+        "--base_path",
+        type=str,
+        help="Base path of the use case",
+        required=True,
+    )
+    parser.add_argument(
+        "--env_name",
+        type=str,
+        help="environment name(dev, test, prod) for execution and deployment",
+        default=None,
+    )
+    parser.add_argument(
+        "--report_dir",
+        type=str,
+        default="./reports",
+        help="The folder of the evaluation results and metrics",
+    )
+    parser.add_argument(
+        "--metric",
+        type=str,
+        required=True,
+        help="Line output compared between the variants",
+    )
+    parser.add_argument(
+        "--n_resamples",
+        type=int,
+        help="Number of bootstrap resamples",
+        default=1000,
+    )
+    parser.add_argument(
+        "--confidence",
+        type=float,
+        help="Confidence level of the intervals",
+        default=0.95,
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        help="Seed of the bootstrap resampling",
+        default=None,
+    )
+    parser.add_argument(
+        "--output_file",
+        type=str,
+        help="File where the selected variants are written",
+        default=None,
+    )
+
+    args = parser.parse_args(argv)
+
+    prepare_and_execute(
+        args.file,
+        args.base_path,
+        args.env_name,
+        args.report_dir,
+        args.metric,
+        args.n_resamples,
+        args.confidence,
+        args.seed,
+        args.output_file,
+    )
+
+
+if __name__ == "__main__":
+    # Load variables from .env file into the environment
+    load_dotenv(override=True)
+
+    main()
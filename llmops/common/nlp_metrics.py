@@ -0,0 +1,380 @@
+"""
+LLM-free metrics comparing predictions to references, a column at a time.
+
+Metrics are computed over whole columns at once: texts are normalized with
+pandas string operations, tokens and n-grams are mapped to integer ids, and
+the clipped token and n-gram overlaps of every pair are counted with NumPy.
+They are cheap enough to score every run before any LLM judge.
+
+Metrics (one score per line, between 0 and 1):
+- exact_match: prediction equal to the reference, surrounding spaces ignored.
+- normalized_match: equality of the normalized texts (lowercase, without
+punctuation, articles and extra spaces).
+- token_f1: F1 score of the normalized tokens.
+- bleu: sentence BLEU with up to 4-grams, add-one smoothing of the
+n-gram precisions above unigrams.
+- rouge_l: F1 score of the longest common subsequence of tokens.
+- embedding_cosine: cosine similarity of the embeddings of a local model.
+It requires the sentence-transformers package.
+
+The module contains the following functions:
+- normalize_text: Normalize a column of texts.
+- exact_match, normalized_match, token_f1, bleu, rouge_l,
+embedding_cosine: Score a column of predictions.
+- compute_metrics: Compute several metrics of a column of predictions.
+- load_local_encoder: Load a local embedding model.
+- select_mapped_column: Get an evaluator input column from a run and data.
+"""
+
+import re
+import string
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from llmops.common.dataset_shards import LINE_NUMBER_COLUMN
+
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+MAX_NGRAM = 4
+
+_PUNCTUATION = f"[{re.escape(string.punctuation)}]"
+_ARTICLES = r"\b(a|an|the)\b"
+_MAPPED_COLUMN = re.compile(r"^\$\{(run\.inputs|run\.outputs|data)\.(.+)\}$")
+
+Encoder = Callable[[List[str]], np.ndarray]
+
+
+def _as_text(values: Sequence) -> pd.Series:
+    return pd.Series(values, dtype=object).fillna("").astype(str)
+
+
+def normalize_text(texts: Sequence[str]) -> pd.Series:
+    """
+    Normalize a column of texts.
+
+    Texts are lowercased, punctuation and articles are removed and spaces
+    are collapsed.
+
+    :param texts: Texts to normalize.
+    :type texts: Sequence[str]
+    :return: Normalized texts.
+    :rtype: pd.Series
+    """
+    return (
+        _as_text(texts)
+        .str.lower()
+        .str.replace(_PUNCTUATION, " ", regex=True)
+        .str.replace(_ARTICLES, " ", regex=True)
+        .str.split()
+        .str.join(" ")
+    )
+
+
+def _tokenize(
+    predictions: Sequence[str], references: Sequence[str]
+) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+    """Get the token ids of every prediction and reference."""
+    tokens = [
+        normalize_text(predictions).str.split(),
+        normalize_text(references).str.split(),
+    ]
+    lengths = [column.str.len().to_numpy() for column in tokens]
+    # Predictions and references share the token ids
+    flat = pd.concat([column.explode() for column in tokens]).dropna()
+    codes = pd.factorize(flat)[0].astype(np.int64)
+    pred_codes = codes[: lengths[0].sum()]
+    ref_codes = codes[lengths[0].sum():]
+    return (
+        np.split(pred_codes, np.cumsum(lengths[0])[:-1]),
+        np.split(ref_codes, np.cumsum(lengths[1])[:-1]),
+    )
+
+
+def _flatten(rows: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """Concatenate the token ids of the rows, with the row of every token."""
+    lengths = np.array([len(row) for row in rows], dtype=np.int64)
+    ids = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+    return np.repeat(np.arange(len(rows)), lengths), ids.astype(np.int64)
+
+
+def _ngrams(
+    row_ids: np.ndarray, ids: np.ndarray, n: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Get the n-grams of the flattened rows as integer keys and rows."""
+    starts = np.arange(max(len(ids) - n + 1, 0))
+    # An n-gram doesn't span two rows
+    starts = starts[row_ids[starts] == row_ids[starts + n - 1]]
+    keys = ids[starts]
+    token_count = int(ids.max(initial=0)) + 1
+    for offset in range(1, n):
+        # Keys stay dense, (n-1)-gram keys are combined with the next token
+        keys = pd.factorize(keys * token_count + ids[starts + offset])[0]
+    return row_ids[starts], keys.astype(np.int64)
+
+
+def _clipped_overlap(
+    rows_a: np.ndarray,
+    keys_a: np.ndarray,
+    rows_b: np.ndarray,
+    keys_b: np.ndarray,
+    row_count: int,
+) -> np.ndarray:
+    """Count the keys of every row found on both sides, with multiplicity."""
+    key_count = int(max(keys_a.max(initial=-1), keys_b.max(initial=-1))) + 1
+    pairs_a, counts_a = np.unique(
+        rows_a * key_count + keys_a, return_counts=True
+    )
+    pairs_b, counts_b = np.unique(
+        rows_b * key_count + keys_b, return_counts=True
+    )
+    common, index_a, index_b = np.intersect1d(
+        pairs_a, pairs_b, assume_unique=True, return_indices=True
+    )
+    return np.bincount(
+        common // max(key_count, 1),
+        weights=np.minimum(counts_a[index_a], counts_b[index_b]),
+        minlength=row_count,
+    )
+
+
+def _ngram_overlaps(
+    predictions: List[np.ndarray], references: List[np.ndarray], n: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Count the clipped n-gram matches and the n-grams of predictions."""
+    rows = len(predictions)
+    # References are rows after the predictions, so they share n-gram keys
+    row_ids, keys = _ngrams(*_flatten(predictions + references), n)
+    is_prediction = row_ids < rows
+    totals = np.bincount(row_ids[is_prediction], minlength=rows)
+    matches = _clipped_overlap(
+        row_ids[is_prediction],
+        keys[is_prediction],
+        row_ids[~is_prediction] - rows,
+        keys[~is_prediction],
+        rows,
+    )
+    return matches, totals.astype(float)
+
+
+def _f1(matches: np.ndarray, pred_lengths, ref_lengths) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = matches / pred_lengths
+        recall = matches / ref_lengths
+        f1 = 2 * precision * recall / (precision + recall)
+    return np.nan_to_num(f1)
+
+
+def _lengths(rows: List[np.ndarray]) -> np.ndarray:
+    return np.array([len(row) for row in rows], dtype=float)
+
+
+def exact_match(
+    predictions: Sequence[str], references: Sequence[str]
+) -> np.ndarray:
+    """Score 1 when the prediction equals the reference, else 0."""
+    return (
+        _as_text(predictions).str.strip().to_numpy()
+        == _as_text(references).str.strip().to_numpy()
+    ).astype(float)
+
+
+def normalized_match(
+    predictions: Sequence[str], references: Sequence[str]
+) -> np.ndarray:
+    """Score 1 when the normalized texts are equal, else 0."""
+    return (
+        normalize_text(predictions).to_numpy()
+        == normalize_text(references).to_numpy()
+    ).astype(float)
+
+
+def token_f1(
+    predictions: Sequence[str], references: Sequence[str]
+) -> np.ndarray:
+    """Score the F1 of the normalized tokens of every pair."""
+    pred_tokens, ref_tokens = _tokenize(predictions, references)
+    matches, _ = _ngram_overlaps(pred_tokens, ref_tokens, 1)
+    return _f1(matches, _lengths(pred_tokens), _lengths(ref_tokens))
+
+
+def bleu(
+    predictions: Sequence[str],
+    references: Sequence[str],
+    max_ngram: int = MAX_NGRAM,
+) -> np.ndarray:
+    """Score the sentence BLEU of every pair."""
+    pred_tokens, ref_tokens = _tokenize(predictions, references)
+    pred_lengths = _lengths(pred_tokens)
+    ref_lengths = _lengths(ref_tokens)
+
+    log_precision = np.zeros(len(pred_tokens))
+    for n in range(1, max_ngram + 1):
+        matches, totals = _ngram_overlaps(pred_tokens, ref_tokens, n)
+        smoothing = 0.0 if n == 1 else 1.0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            log_precision += np.log(
+                (matches + smoothing) / (totals + smoothing)
+            )
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        brevity = np.minimum(0.0, 1 - ref_lengths / pred_lengths)
+        scores = np.exp(brevity + log_precision / max_ngram)
+    return np.where(pred_lengths > 0, np.nan_to_num(scores), 0.0)
+
+
+def _lcs_length(a: np.ndarray, b: np.ndarray) -> int:
+    """Length of the longest common subsequence, bit-parallel on b."""
+    if not len(a) or not len(b):
+        return 0
+    masks: Dict[int, int] = {}
+    for position, token in enumerate(b.tolist()):
+        masks[token] = masks.get(token, 0) | (1 << position)
+    full = (1 << len(b)) - 1
+    row = full
+    for token in a.tolist():
+        match = row & masks.get(token, 0)
+        row = ((row + match) | (row - match)) & full
+    return len(b) - bin(row).count("1")
+
+
+def rouge_l(
+    predictions: Sequence[str], references: Sequence[str]
+) -> np.ndarray:
+    """Score the ROUGE-L F1 of every pair."""
+    pred_tokens, ref_tokens = _tokenize(predictions, references)
+    lcs = np.array(
+        [
+            _lcs_length(pred, ref)
+            for pred, ref in zip(pred_tokens, ref_tokens)
+        ],
+        dtype=float,
+    )
+    return _f1(lcs, _lengths(pred_tokens), _lengths(ref_tokens))
+
+
+def load_local_encoder(model_name: str = DEFAULT_EMBEDDING_MODEL) -> Encoder:
+    """
+    Load a local embedding model, only required by embedding_cosine.
+
+    :param model_name: Name or path of a sentence-transformers model.
+    :type model_name: str
+    :return: Function returning the embeddings of a list of texts.
+    :rtype: Encoder
+    """
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError as error:
+        raise ValueError(
+            "The embedding_cosine metric requires the sentence-transformers "
+            "package (pip install sentence-transformers)"
+        ) from error
+    model = SentenceTransformer(model_name)
+    return lambda texts: np.asarray(model.encode(texts))
+
+
+def embedding_cosine(
+    predictions: Sequence[str],
+    references: Sequence[str],
+    encoder: Optional[Encoder] = None,
+) -> np.ndarray:
+    """Score the cosine similarity of the embeddings of every pair."""
+    encoder = encoder or load_local_encoder()
+    texts = _as_text(predictions).tolist() + _as_text(references).tolist()
+    embeddings = np.asarray(encoder(texts), dtype=float)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    embeddings = embeddings / np.where(norms == 0, 1, norms)
+    pred_embeddings = embeddings[: len(texts) // 2]
+    ref_embeddings = embeddings[len(texts) // 2:]
+    return np.einsum("ij,ij->i", pred_embeddings, ref_embeddings)
+
+
+METRICS = {
+    "exact_match": exact_match,
+    "normalized_match": normalized_match,
+    "token_f1": token_f1,
+    "bleu": bleu,
+    "rouge_l": rouge_l,
+    "embedding_cosine": embedding_cosine,
+}
+# Metrics computed without any model
+DEFAULT_METRICS = tuple(name for name in METRICS if name != "embedding_cosine")
+
+
+def compute_metrics(
+    predictions: Sequence[str],
+    references: Sequence[str],
+    metrics: Sequence[str] = DEFAULT_METRICS,
+    encoder: Optional[Encoder] = None,
+) -> pd.DataFrame:
+    """
+    Compute several metrics of a column of predictions.
+
+    :param predictions: Predictions to score.
+    :type predictions: Sequence[str]
+    :param references: References of the predictions.
+    :type references: Sequence[str]
+    :param metrics: Names of the metrics. Default is every metric that
+    doesn't need an embedding model.
+    :type metrics: Sequence[str]
+    :param encoder: Embedding model of embedding_cosine. Default is the
+    local DEFAULT_EMBEDDING_MODEL.
+    :type encoder: Optional[Encoder]
+    :return: A column per metric, a row per prediction.
+    :rtype: pd.DataFrame
+    """
+    if len(predictions) != len(references):
+        raise ValueError(
+            f"Got {len(predictions)} predictions "
+            f"and {len(references)} references"
+        )
+    unknown = [name for name in metrics if name not in METRICS]
+    if unknown:
+        raise ValueError(
+            f"Unknown metrics {', '.join(unknown)}, "
+            f"expected some of {', '.join(METRICS)}"
+        )
+    scores = {}
+    for name in metrics:
+        if name == "embedding_cosine":
+            scores[name] = embedding_cosine(predictions, references, encoder)
+        else:
+            scores[name] = METRICS[name](predictions, references)
+    return pd.DataFrame(scores, index=range(len(predictions)))
+
+
+def select_mapped_column(
+    mapping: str, run_details: pd.DataFrame, data: pd.DataFrame
+) -> pd.Series:
+    """
+    Get an evaluator input column, from its mapping.
+
+    :param mapping: Column mapping of the input, for example
+    ${run.outputs.answer} or ${data.ground_truth}.
+    :type mapping: str
+    :param run_details: Details of the evaluated run.
+    :type run_details: pd.DataFrame
+    :param data: Evaluation dataset.
+    :type data: pd.DataFrame
+    :return: Input of every row of the dataset, missing for the rows
+    without a run line.
+    :rtype: pd.Series
+    """
+    match = _MAPPED_COLUMN.match(str(mapping).strip())
+    if not match:
+        raise ValueError(f"Unsupported column mapping {mapping}")
+    source, name = match.groups()
+    if source == "data":
+        if name not in data.columns:
+            raise ValueError(f"Column {name} not found in the dataset")
+        return data[name].reset_index(drop=True)
+
+    column = f"{source.split('.')[1]}.{name}"
+    if column not in run_details.columns:
+        raise ValueError(f"Column {column} not found in the run details")
+    # Run lines are aligned with the dataset rows by line number
+    values = pd.Series(
+        run_details[column].to_numpy(),
+        index=run_details[LINE_NUMBER_COLUMN].to_numpy(),
+    )
+    return values.reindex(range(len(data))).reset_index(drop=True)
@@ -13,35 +13,259 @@ This argument is not required but will be added as a run tag if specified.
 is not required but will be used to read experiment overlay files if specified.
 --run_id: Run ids of runs to be evaluated (File or comma separated string)
 --report_dir: The directory where the outputs and metrics will be stored.
+--report_format: Format of the saved outputs and metrics, csv (default) or
+parquet. Parquet reports are written once per experiment, partitioned by
+experiment, dataset, variant and build_id. Parquet requires pyarrow.
+--skip_html: Flag to not render the reports in html format.
+--html_page_size: Number of rows per html page. Default is a single page.
+--max_parallel_runs: Maximum number of evaluation runs executed at the same
+time. Every (evaluator, run, dataset) evaluation is planned before any of them
+starts, default is 1 (sequential execution).
+--eval_cache_dir: Folder of the local evaluation cache. If provided, it is
+passed to the local evaluators in the EVAL_CACHE_DIR environment variable, and
+lines already scored by the same evaluator version are not scored again.
+--early_stop_metric: Line output of the evaluators compared between the
+variants in sequential mode, for example correctness.
+--early_stop_batch_size: Number of rows evaluated per batch in sequential
+mode. Sequential mode is enabled when the metric and batch size are provided.
+--early_stop_margin: Difference of mean score with the best variant above which
+the evaluation of a variant is stopped. Default is 0.
+--early_stop_confidence: Confidence level of the comparisons. Default is 0.95.
+--nlp_metrics: Comma separated LLM-free metrics computed for every evaluated
+run before the evaluation flows run: exact_match, normalized_match, token_f1,
+bleu, rouge_l and embedding_cosine (see llmops.common.nlp_metrics).
+--nlp_prediction: Evaluator input holding the prediction. Default is
+'prediction'.
+--nlp_reference: Evaluator input holding the reference. Default is
+'groundtruth'.
+--nlp_embedding_model: Local sentence-transformers model of embedding_cosine.
+--evaluator_processes: Number of worker processes calling the evaluators
+without flow. Default is 1, the evaluators are called in this process.
+
+In sequential mode (local execution only), the variants are evaluated in
+batches of rows and the remaining rows of the variants clearly worse than the
+best one are not evaluated (see llmops.common.early_stopping).
+
+LLM-free metrics are computed from the column mapping of every evaluation
+dataset mapping both the prediction and the reference inputs, on local
+evaluation datasets. They are reported like an evaluator named nlp_metrics.
+
+Shard runs of prompt_pipeline --shards are evaluated on the matching rows of
+the evaluation datasets, and reported under their logical run. Their metrics
+are merged into the metrics of the logical run (see llmops.common.aggregation).
 """
 
 import argparse
 import datetime
 import json
 import os
-import pandas as pd
+import shutil
+import tempfile
 from dotenv import load_dotenv
-from typing import Optional
-import inspect
-import importlib
-
-from azure.identity import DefaultAzureCredential
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
 
-from llmops.common.common import FlowTypeOption, ClientObjectWrapper as ObjectWrapper
-from llmops.common.common import resolve_run_ids, resolve_flow_type, resolve_env_vars
+import pandas as pd
+from llmops.common.common import FlowTypeOption
+from llmops.common.common import (
+    resolve_run_ids,
+    resolve_flow_type,
+    resolve_env_vars,
+)
+from llmops.common.common import run_in_parallel
 from llmops.common.experiment_cloud_config import ExperimentCloudConfig
-from llmops.common.experiment import load_experiment
+from llmops.common.experiment import (
+    Dataset,
+    Evaluator,
+    Experiment,
+    MappedDataset,
+    load_experiment,
+)
 from llmops.common.logger import llmops_logger
-from llmops.common.create_connections import create_pf_connections
+from llmops.common.report_writer import StreamingReportWriter
+from llmops.common.eval_cache import EVAL_CACHE_DIR_ENV
+from llmops.common.evaluator_registry import get_registry, run_evaluators
+from llmops.common.aggregation import StreamingStats, merge_metrics
+from llmops.common.early_stopping import (
+    EarlyStopping,
+    map_run_columns,
+    write_batch_data,
+)
+from llmops.common.nlp_metrics import (
+    DEFAULT_EMBEDDING_MODEL,
+    METRICS,
+    compute_metrics,
+    load_local_encoder,
+    select_mapped_column,
+)
+from llmops.common.dataset_shards import (
+    DATASET_TAG,
+    LINE_NUMBER_COLUMN,
+    LOGICAL_RUN_TAG,
+    count_rows,
+    get_shard_rows,
+    slice_jsonl,
+)
 from llmops.config import EXECUTION_TYPE
-from promptflow.client import PFClient as PFClientLocal
-from promptflow.azure import PFClient as PFClientAzure
-from promptflow._sdk.entities import Run
-from azure.ai.ml import MLClient
+
+if TYPE_CHECKING:
+    from promptflow._sdk.entities import Run
 
 logger = llmops_logger("prompt_eval")
 
-files_to_check = ["flow.flex.yaml", "flow.flex.yml", "flow.dag.yaml", "flow.dag.yml"]
+files_to_check = [
+    "flow.flex.yaml",
+    "flow.flex.yml",
+    "flow.dag.yaml",
+    "flow.dag.yml",
+]
+
+# Maximum number of standard runs fetched at the same time
+_RUN_PREFETCH_WORKERS = 16
+
+# Evaluator name of the LLM-free metrics in the reports
+NLP_METRICS_FLOW_NAME = "nlp_metrics"
+
+
+def fetch_runs(
+    get_run: Callable[[str], "Run"],
+    run_ids: List[str],
+    max_workers: int = _RUN_PREFETCH_WORKERS,
+) -> Dict[str, "Run"]:
+    """
+    Fetch the standard runs concurrently.
+
+    :param get_run: Function returning the run of a run name,
+    for example PFClient.runs.get.
+    :type get_run: Callable[[str], Run]
+    :param run_ids: Names of the runs, duplicates are fetched once.
+    :type run_ids: List[str]
+    :param max_workers: Maximum number of runs fetched at the same time.
+    :type max_workers: int
+    :return: Dictionary from run name to run, in the order of run_ids.
+    :rtype: Dict[str, Run]
+    """
+    run_names = list(dict.fromkeys(run_ids))
+    runs = [None] * len(run_names)
+    for index, run in run_in_parallel(get_run, run_names, max_workers):
+        runs[index] = run
+    return dict(zip(run_names, runs))
+
+
+class RunDatasetIndex:
+    """
+    Index of the experiment datasets, to find the dataset of a run.
+
+    Datasets are indexed once by name and by source, so finding the
+    dataset of a run doesn't scan the experiment datasets.
+
+    :param experiment: The experiment.
+    :type experiment: Experiment
+    :param base_path: Base path of the local dataset sources.
+    :type base_path: Optional[str]
+    """
+
+    def __init__(self, experiment: Experiment, base_path: Optional[str]):
+        """Initialize RunDatasetIndex object."""
+        self._by_name: Dict[str, Dataset] = {}
+        self._by_source: Dict[str, Dataset] = {}
+        # The first dataset wins, like Experiment.get_dataset
+        for mapped_dataset in experiment.datasets:
+            dataset = mapped_dataset.dataset
+            self._by_name.setdefault(dataset.name, dataset)
+            self._by_source.setdefault(dataset.source, dataset)
+            local_source = dataset.get_local_source(base_path)
+            if local_source:
+                self._by_source.setdefault(
+                    os.path.abspath(local_source), dataset
+                )
+
+    def find(self, run: "Run") -> Tuple[str, Optional[Dataset]]:
+        """
+        Find the dataset used by a standard run.
+
+        :param run: The standard run.
+        :type run: Run
+        :return: Name or source of the run data, and its dataset if found.
+        :rtype: Tuple[str, Optional[Dataset]]
+        """
+        run_tags = run.tags if isinstance(run.tags, dict) else {}
+        if DATASET_TAG in run_tags:
+            # Shard runs use a copy of part of the dataset
+            run_data_name = run_tags[DATASET_TAG]
+            return run_data_name, self._by_name.get(run_data_name)
+        if EXECUTION_TYPE == "AZURE":
+            run_data_name = run.data.split(":")[1]
+            return run_data_name, self._by_name.get(run_data_name)
+
+        dataset = self._by_source.get(os.path.abspath(run.data))
+        run_data_name = os.path.sep.join(run.data.split(os.path.sep)[-2:])
+        return run_data_name, dataset or self._by_source.get(run_data_name)
+
+
+class EvaluationJob:
+    """
+    Evaluation of a standard run with an evaluator and a dataset.
+
+    :param evaluator: The evaluator.
+    :type evaluator: Evaluator
+    :param flow_type: Flow type of the evaluator.
+    :type flow_type: FlowTypeOption
+    :param params_dict: Init parameters of class flow evaluators.
+    :type params_dict: dict
+    :param env_vars: Environment variables of the evaluation run.
+    :type env_vars: dict
+    :param flow_run: Name of the evaluated standard run.
+    :type flow_run: str
+    :param standard_run: The evaluated standard run.
+    :type standard_run: Run
+    :param run_dataset: Dataset used by the standard run.
+    :type run_dataset: Dataset
+    :param dataset_mapping: Evaluation dataset and column mapping.
+    :type dataset_mapping: MappedDataset
+    :param data_id: Local path or data asset of the evaluation dataset.
+    :type data_id: str
+    """
+
+    def __init__(
+        self,
+        evaluator: Evaluator,
+        flow_type: FlowTypeOption,
+        params_dict: dict,
+        env_vars: dict,
+        flow_run: str,
+        standard_run: "Run",
+        run_dataset: Dataset,
+        dataset_mapping: MappedDataset,
+        data_id: str,
+    ):
+        """Initialize EvaluationJob object."""
+        self.evaluator = evaluator
+        self.flow_type = flow_type
+        self.params_dict = params_dict
+        self.env_vars = env_vars
+        self.flow_run = flow_run
+        self.standard_run = standard_run
+        self.run_dataset = run_dataset
+        self.dataset_mapping = dataset_mapping
+        self.data_id = data_id
+
+    @property
+    def exp_run(self) -> str:
+        """Reported standard run, the logical run of shard runs."""
+        tags = self.standard_run.tags
+        if isinstance(tags, dict):
+            return tags.get(LOGICAL_RUN_TAG, self.flow_run)
+        return self.flow_run
+
+    @property
+    def comparison_group(self) -> Tuple[str, str]:
+        """Evaluator and dataset, the variants are compared on both."""
+        return self.evaluator.name, self.dataset_mapping.dataset.name
+
+    @property
+    def is_shard(self) -> bool:
+        """Check if the standard run is a shard of a logical run."""
+        return self.exp_run != self.flow_run
 
 
 def prepare_and_execute(
@@ -52,6 +276,20 @@ def prepare_and_execute(
     build_id: Optional[str] = None,
     env_name: Optional[str] = None,
     report_dir: Optional[str] = None,
+    report_format: str = "csv",
+    skip_html: Optional[bool] = None,
+    html_page_size: Optional[int] = None,
+    max_parallel_runs: int = 1,
+    eval_cache_dir: Optional[str] = None,
+    early_stop_metric: Optional[str] = None,
+    early_stop_batch_size: Optional[int] = None,
+    early_stop_margin: float = 0.0,
+    early_stop_confidence: float = 0.95,
+    nlp_metrics: Optional[List[str]] = None,
+    nlp_prediction: str = "prediction",
+    nlp_reference: str = "groundtruth",
+    nlp_embedding_model: str = DEFAULT_EMBEDDING_MODEL,
+    evaluator_processes: int = 1,
 ):
     """
     Run the evaluation loop by executing evaluation flows.
@@ -59,12 +297,24 @@ def prepare_and_execute(
     reads latest evaluation data assets
     executes evaluation flow against each provided bulk-run
     executes the flow creating a new evaluation job
-    saves the results in both csv and html format
+    plans every evaluation first and executes up to max_parallel_runs
+    of them at the same time, downloading details and metrics together
+    serves the lines already scored from eval_cache_dir
+    evaluates in batches of early_stop_batch_size rows and stops the
+    variants worse than the best one on early_stop_metric
+    scores every run with the LLM-free nlp_metrics before the
+    evaluation flows
+    calls the evaluators without flow, imported once, in up to
+    evaluator_processes worker processes
+    saves the results in csv or parquet format, and optionally in html
+    format split in pages of html_page_size rows
 
     Returns:
         None
     """
-    config = ExperimentCloudConfig(subscription_id=subscription_id, env_name=env_name)
+    config = ExperimentCloudConfig(
+        subscription_id=subscription_id, env_name=env_name
+    )
     experiment = load_experiment(
         filename=exp_filename, base_path=base_path, env=config.environment_name
     )
@@ -72,63 +322,101 @@ def prepare_and_execute(
 
     run_ids = resolve_run_ids(run_id)
 
+    early_stopping = None
+    if early_stop_metric or early_stop_batch_size:
+        if not (early_stop_metric and early_stop_batch_size):
+            raise ValueError(
+                "Sequential mode requires an early stopping metric "
+                "and batch size"
+            )
+        if EXECUTION_TYPE != "LOCAL":
+            logger.warning(
+                "Sequential mode is only supported for local evaluations, "
+                "every row is evaluated"
+            )
+        else:
+            early_stopping = EarlyStopping(
+                early_stop_metric,
+                early_stop_batch_size,
+                early_stop_margin,
+                early_stop_confidence,
+            )
+
+    unknown_metrics = [
+        name for name in nlp_metrics or [] if name not in METRICS
+    ]
+    if unknown_metrics:
+        raise ValueError(
+            f"Unknown NLP metrics {', '.join(unknown_metrics)}, "
+            f"expected some of {', '.join(METRICS)}"
+        )
+
     eval_flows = experiment.evaluators
 
-    flow_type, params_dict = resolve_flow_type(experiment.base_path, experiment.flow)
+    flow_type, params_dict = resolve_flow_type(
+        experiment.base_path, experiment.flow
+    )
 
-    wrapper = None
-    ml_client = None
+    # Prompt flow and Azure SDKs are only imported to execute runs
     if EXECUTION_TYPE == "LOCAL":
-        pf = PFClientLocal()
+        from llmops.common.clients import get_local_pf_client
+        from llmops.common.create_connections import create_pf_connections
+
+        pf = get_local_pf_client()
         create_pf_connections(exp_filename, base_path, env_name)
-        wrapper = ObjectWrapper(pf=pf)
     else:
+        from llmops.common.clients import get_azure_pf_client
 
-        ml_client = MLClient(
-            subscription_id=config.subscription_id,
-            resource_group_name=config.resource_group_name,
-            workspace_name=config.workspace_name,
-            credential=DefaultAzureCredential(),
-        )
-        pf = PFClientAzure(
-            credential=DefaultAzureCredential(),
-            subscription_id=config.subscription_id,
-            workspace_name=config.workspace_name,
-            resource_group_name=config.resource_group_name,
+        # Credential and clients are shared with the other stages
+        pf = get_azure_pf_client(
+            config.subscription_id,
+            config.resource_group_name,
+            config.workspace_name,
         )
 
-        wrapper = ObjectWrapper(pf=pf, ml_client=ml_client)
-        print(wrapper)
-
     standard_flow_detail = experiment.get_flow_detail(flow_type)
     default_variants = standard_flow_detail.default_variants
 
     eval_run_ids = []
 
-    runs: dict[str, Run] = {}
-    for run in run_ids:
-        runs[run] = pf.runs.get(run)
+    # Runs are fetched together and their datasets found in an index
+    runs = fetch_runs(pf.runs.get, run_ids)
+    dataset_index = RunDatasetIndex(experiment, base_path)
 
+    # Reports are appended as evaluation runs complete
+    report_writer = None
     if report_dir:
-        if not os.path.exists(report_dir):
-            os.makedirs(report_dir)
-
-    all_eval_df = []
-    all_eval_metrics = []
+        report_writer = StreamingReportWriter(
+            report_dir,
+            report_format=report_format,
+            write_html=not skip_html,
+            html_page_size=html_page_size,
+        )
+    dataset_names = []
+    shard_dir = None
 
+    # Plan every (evaluator, standard run, dataset mapping) evaluation
+    # before executing any of them
+    eval_jobs: List[EvaluationJob] = []
+    evaluator_flow_types = {}
     for evaluator in eval_flows:
-        logger.info(f"Starting evaluation of '{evaluator.name}'")
+        logger.info(f"Planning evaluation of '{evaluator.name}'")
 
         flow_type, params_dict = resolve_flow_type(evaluator.path, "")
+        evaluator_flow_types[evaluator.name] = flow_type
 
         env_vars = resolve_env_vars(experiment.base_path)
-
-        dataframes = []
-        metrics = []
-
-        flow_name = evaluator.name
-
-        evaluator_executed = False
+        if eval_cache_dir and EXECUTION_TYPE == "LOCAL":
+            env_vars[EVAL_CACHE_DIR_ENV] = os.path.abspath(eval_cache_dir)
+
+        # Check if any of the files exist in the directory
+        files_found = [
+            file
+            for file in files_to_check
+            if os.path.isfile(os.path.join(evaluator.path, file))
+        ]
+        if not files_found:
+            continue
 
         # Iterate over standard flow runs
         for flow_run in run_ids:
@@ -139,25 +427,15 @@ def prepare_and_execute(
             # Skip the evaluation of this run if not found
             current_standard_run = runs[flow_run]
             run_data_id = current_standard_run.data
-            print(run_data_id)
             if not run_data_id:
                 raise ValueError(f"Run {flow_run}has no data reference.")
 
             # Get evaluation datasets by getting the datasets
             # that reference the standard run
-            if EXECUTION_TYPE == "AZURE":
-                run_data_name = run_data_id.split(":")[1]
-                run_dataset = experiment.get_dataset(run_data_name)
-            else:
-                run_data_name = os.path.sep.join(run_data_id.split(os.path.sep)[-2:])
-                print(run_data_name)
-                for ds in experiment.datasets:
-                    print(ds.dataset.source)
-                    if ds.dataset.source == run_data_name:
-                        run_dataset = experiment.get_dataset(ds.dataset.name)
-                        break
-                    else:
-                        run_dataset = None
+            shard_rows = get_shard_rows(current_standard_run.tags)
+            run_data_name, run_dataset = dataset_index.find(
+                current_standard_run
+            )
 
             if not run_dataset:
                 raise ValueError(
@@ -167,233 +445,441 @@ def prepare_and_execute(
             dataset_mapping_list = evaluator.find_dataset_with_reference(
                 run_dataset.name
             )
-            if len(dataset_mapping_list) == 0:
-                continue
 
             for dataset_mapping in dataset_mapping_list:
                 logger.info(
                     f"Preparing evaluation of run {flow_run} "
                     f"using dataset {dataset_mapping.dataset.name}"
                 )
-                column_mapping = dataset_mapping.mappings
                 dataset = dataset_mapping.dataset
                 data_id = (
                     dataset.get_local_source(base_path)
                     if EXECUTION_TYPE == "LOCAL"
                     else dataset.get_remote_source(pf.ml_client)
                 )
+                if shard_rows is not None and EXECUTION_TYPE == "LOCAL":
+                    # Evaluate the shard on the same rows of the dataset
+                    shard_dir = shard_dir or tempfile.mkdtemp()
+                    data_id = slice_jsonl(
+                        data_id,
+                        shard_rows[0],
+                        shard_rows[1],
+                        os.path.join(
+                            shard_dir, f"{flow_run}_{dataset.name}.jsonl"
+                        ),
+                    )
 
-                evaluator_executed = True
-                # Create run object
-                if not experiment.runtime:
-                    logger.info("Using automatic runtime and serverless compute")
-                else:
-                    logger.info(f"Using runtime '{experiment.runtime}' for runn")
-
-                timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-                run_name = f"{experiment_name}_eval_{timestamp}"
-                runtime_resources = (
-                    None
-                    if experiment.runtime
-                    else {"instance_type": "Standard_E4ds_v4"}
+                eval_jobs.append(
+                    EvaluationJob(
+                        evaluator,
+                        flow_type,
+                        params_dict,
+                        env_vars,
+                        flow_run,
+                        current_standard_run,
+                        run_dataset,
+                        dataset_mapping,
+                        data_id,
+                    )
                 )
-                # Check if any of the files exist in the directory
-                files_found = [
-                    file
-                    for file in files_to_check
-                    if os.path.isfile(os.path.join(evaluator.path, file))
-                ]
-
-                if files_found:
-                    if (
-                        flow_type == FlowTypeOption.DAG_FLOW
-                        or flow_type == FlowTypeOption.FUNCTION_FLOW
-                    ):
-                        run = pf.run(
-                            flow=evaluator.path,
-                            data=data_id,
-                            run=current_standard_run,
-                            name=run_name,
-                            display_name=run_name,
-                            environment_variables=env_vars,
-                            column_mapping=column_mapping,
-                            tags={} if not build_id else {"build_id": build_id},
-                            runtime=experiment.runtime,
-                            resources=runtime_resources,
-                            stream=True,
-                        )
-                    elif flow_type == FlowTypeOption.CLASS_FLOW:
-                        run = pf.run(
-                            flow=evaluator.path,
-                            data=data_id,
-                            run=current_standard_run,
-                            name=run_name,
-                            display_name=run_name,
-                            environment_variables=env_vars,
-                            column_mapping=column_mapping,
-                            tags={} if not build_id else {"build_id": build_id},
-                            runtime=experiment.runtime,
-                            resources=runtime_resources,
-                            init=params_dict,
-                            stream=True,
-                        )
-                    else:
-                        raise ValueError("Invalid flow type")
 
-                run._experiment_name = experiment_name
+    if not experiment.runtime:
+        logger.info("Using automatic runtime and serverless compute")
+    else:
+        logger.info(f"Using runtime '{experiment.runtime}' for runs")
+    runtime_resources = (
+        None
+        if experiment.runtime
+        else {"instance_type": "Standard_E4ds_v4"}
+    )
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    def _execute_job(index: int, batch: Optional[Tuple[int, int]] = None):
+        """Run an evaluation, then get its details and metrics."""
+        job = eval_jobs[index]
+        # Jobs start in the same second, the index keeps names unique
+        run_name = f"{experiment_name}_eval_{index}_{timestamp}"
+        run_args = {
+            "flow": job.evaluator.path,
+            "data": job.data_id,
+            "run": job.standard_run,
+            "environment_variables": job.env_vars,
+            "column_mapping": job.dataset_mapping.mappings,
+            "tags": {} if not build_id else {"build_id": build_id},
+            "runtime": experiment.runtime,
+            "resources": runtime_resources,
+            "stream": True,
+        }
+        if batch is not None:
+            # Batches are evaluated with a copy of the standard run rows
+            run_name = f"{run_name}_rows{batch[0]}"
+            run_args["data"] = write_batch_data(
+                job.data_id,
+                standard_details[job.flow_run],
+                batch[0],
+                batch[1],
+                os.path.join(batch_dir, f"{run_name}.jsonl"),
+            )
+            run_args["column_mapping"] = map_run_columns(
+                job.dataset_mapping.mappings
+            )
+            del run_args["run"]
+        run_args["name"] = run_name
+        run_args["display_name"] = run_name
+        logger.info(
+            f"Starting run '{run_name}'. This can take a long time.",
+        )
+        if (
+            job.flow_type == FlowTypeOption.DAG_FLOW
+            or job.flow_type == FlowTypeOption.FUNCTION_FLOW
+        ):
+            run = pf.run(**run_args)
+        elif job.flow_type == FlowTypeOption.CLASS_FLOW:
+            run = pf.run(init=job.params_dict, **run_args)
+        else:
+            raise ValueError("Invalid flow type")
+
+        run._experiment_name = experiment_name
+
+        # Details and metrics are downloaded at the same time
+        results = dict(
+            run_in_parallel(
+                lambda get_results: get_results(run=run),
+                [
+                    pf.get_details
+                    if batch is None
+                    else lambda run: pf.get_details(run=run, all_results=True),
+                    pf.get_metrics,
+                ],
+                2,
+            )
+        )
+        df_result = results[0]
+        if batch is not None and LINE_NUMBER_COLUMN in df_result:
+            df_result[LINE_NUMBER_COLUMN] += batch[0]
+        return run, df_result, results[1]
+
+    def _fetch_standard_details(flow_runs):
+        """Download the details of the standard runs not downloaded yet."""
+        flow_runs = [
+            flow_run
+            for flow_run in dict.fromkeys(flow_runs)
+            if flow_run not in standard_details
+        ]
+        for position, run_details in run_in_parallel(
+            lambda flow_run: pf.get_details(
+                run=runs[flow_run], all_results=True
+            ),
+            flow_runs,
+            max_parallel_runs,
+        ):
+            standard_details[flow_runs[position]] = run_details
+
+    def _compute_nlp_metrics(job: EvaluationJob):
+        """Score the predictions of a standard run without any LLM."""
+        data = pd.read_json(job.data_id, lines=True)
+        run_details = standard_details[job.flow_run]
+        mappings = job.dataset_mapping.mappings
+        scores = compute_metrics(
+            select_mapped_column(mappings[nlp_prediction], run_details, data),
+            select_mapped_column(mappings[nlp_reference], run_details, data),
+            nlp_metrics,
+            nlp_encoder,
+        )
+        df_result = scores.add_prefix("outputs.")
+        df_result.insert(0, LINE_NUMBER_COLUMN, range(len(scores)))
+        metric_variant = {"total": len(scores)}
+        for name in scores.columns:
+            metric_variant.update(
+                StreamingStats(reservoir_size=0)
+                .update(scores[name])
+                .to_metrics(name)
+            )
+        return df_result, metric_variant
+
+    def _execute_sequential():
+        """Evaluate the jobs in batches of rows, stopping losing variants."""
+        # Shard runs cover part of the rows and are evaluated at once
+        batched = [
+            index
+            for index, job in enumerate(eval_jobs)
+            if not job.is_shard and os.path.isfile(job.data_id)
+        ]
+        yield from run_in_parallel(
+            _execute_job,
+            [index for index in range(len(eval_jobs)) if index not in batched],
+            max_parallel_runs,
+        )
 
-                # Execute the run
-                logger.info(
-                    f"Starting run '{run.name}'. This can take a long time.",
+        # Inputs and outputs of the standard runs are copied in the batches
+        _fetch_standard_details(eval_jobs[index].flow_run for index in batched)
+
+        batches = {
+            index: early_stopping.batches(count_rows(eval_jobs[index].data_id))
+            for index in batched
+        }
+        batch_results: Dict[int, list] = {index: [] for index in batched}
+        batch_count = max(map(len, batches.values()), default=0)
+        for number in range(batch_count):
+            pending = [
+                (index, batches[index][number])
+                for index in batched
+                if number < len(batches[index])
+                and not early_stopping.is_stopped(
+                    eval_jobs[index].comparison_group,
+                    eval_jobs[index].flow_run,
+                )
+            ]
+            for position, result in run_in_parallel(
+                lambda item: _execute_job(*item), pending, max_parallel_runs
+            ):
+                index = pending[position][0]
+                batch_results[index].append(result)
+                early_stopping.update(
+                    eval_jobs[index].comparison_group,
+                    eval_jobs[index].flow_run,
+                    result[1],
                 )
+            for group in dict.fromkeys(
+                eval_jobs[index].comparison_group for index, _ in pending
+            ):
+                early_stopping.stop_losers(group)
+
+        for index in batched:
+            results = batch_results[index]
+            rows = [len(df_result) for _, df_result, _ in results]
+            metric_variant = merge_metrics(
+                [metrics for _, _, metrics in results], weights=rows
+            )
+            metric_variant["rows_evaluated"] = sum(rows)
+            metric_variant["early_stopped"] = early_stopping.is_stopped(
+                eval_jobs[index].comparison_group, eval_jobs[index].flow_run
+            )
+            yield index, (
+                results[-1][0],
+                pd.concat(
+                    [df_result for _, df_result, _ in results],
+                    ignore_index=True,
+                ),
+                metric_variant,
+            )
 
-                eval_run_ids.append(run.name)
+    logger.info(
+        f"Executing {len(eval_jobs)} evaluation runs, "
+        f"up to {max_parallel_runs} in parallel"
+    )
+    eval_run_ids = [None] * len(eval_jobs)
+    shard_metrics: Dict[tuple, list] = {}
+    standard_details = {}
+    batch_dir = tempfile.mkdtemp() if early_stopping else None
+
+    def _report_results(
+        job: EvaluationJob,
+        df_result: pd.DataFrame,
+        metric_variant: dict,
+        flow_name: str,
+    ):
+        """Report the details and metrics of an evaluation of a job."""
+        current_standard_run = job.standard_run
+        data_id = job.data_id
+
+        if (
+            current_standard_run.properties.get(
+                "azureml.promptflow.node_variant", None
+            )
+            is not None
+        ):
+            variant_id = current_standard_run.properties[
+                "azureml.promptflow.node_variant"
+            ]
+            start_index = variant_id.find("{") + 1
+            end_index = variant_id.find("}")
+            variant_value = variant_id[start_index:end_index].split(".")
+            df_result[variant_value[0]] = variant_value[1]
+            metric_variant[variant_value[0]] = variant_value[1]
+            df_result["dataset"] = data_id
+            metric_variant["dataset"] = data_id
+
+            for key, val in default_variants.items():
+                if key == variant_value[0]:
+                    pass
+                else:
+                    df_result[key] = val
+                    metric_variant[key] = val
+
+        logger.info(json.dumps(metric_variant, indent=4))
+        logger.info(df_result.head(10))
+
+        if report_writer is not None:
+            run_dataset = job.run_dataset
+            partition = {
+                "experiment": experiment_name,
+                "dataset": run_dataset.name,
+                "variant": current_standard_run.properties.get(
+                    "azureml.promptflow.node_variant", "defaults"
+                ),
+                "build_id": build_id,
+            }
+            df_result["flow_name"] = flow_name
+            metric_variant["flow_name"] = flow_name
+            # Lines of every variant are paired by dataset and line number
+            df_result["eval_dataset"] = job.dataset_mapping.dataset.name
+            shard_rows = get_shard_rows(current_standard_run.tags)
+            if shard_rows is not None and LINE_NUMBER_COLUMN in df_result:
+                df_result[LINE_NUMBER_COLUMN] += shard_rows[0]
+            exp_run = job.exp_run
+            df_result["exp_run"] = exp_run
+            metric_variant["exp_run"] = exp_run
+            report_writer.append(
+                f"{run_dataset.name}_result", df_result, partition
+            )
+            if job.is_shard:
+                # Shard metrics are merged once every shard is evaluated
+                shard_metrics.setdefault(
+                    (
+                        flow_name,
+                        exp_run,
+                        job.dataset_mapping.dataset.name,
+                    ),
+                    [],
+                ).append((metric_variant, partition))
+            else:
+                report_writer.append(
+                    f"{run_dataset.name}_metrics",
+                    metric_variant,
+                    partition,
+                )
+            if run_dataset.name not in dataset_names:
+                dataset_names.append(run_dataset.name)
+
+    if nlp_metrics:
+        # Every run is scored once per evaluation dataset
+        nlp_jobs = {}
+        for job in eval_jobs:
+            if not {nlp_prediction, nlp_reference}.issubset(
+                job.dataset_mapping.mappings
+            ):
+                continue
+            if not os.path.isfile(job.data_id):
+                logger.warning(
+                    f"Dataset {job.dataset_mapping.dataset.name} isn't local,"
+                    " the NLP metrics are not computed"
+                )
+                continue
+            nlp_jobs.setdefault(
+                (job.flow_run, job.dataset_mapping.dataset.name), job
+            )
+        nlp_encoder = (
+            load_local_encoder(nlp_embedding_model)
+            if "embedding_cosine" in nlp_metrics and nlp_jobs
+            else None
+        )
+        _fetch_standard_details(job.flow_run for job in nlp_jobs.values())
+        for job in nlp_jobs.values():
+            logger.info(
+                f"Computing {', '.join(nlp_metrics)} of run '{job.flow_run}' "
+                f"on dataset {job.dataset_mapping.dataset.name}"
+            )
+            _report_results(
+                job, *_compute_nlp_metrics(job), NLP_METRICS_FLOW_NAME
+            )
 
-                df_result = pf.get_details(run=run)
-                metric_variant = pf.get_metrics(run)
+    if early_stopping is None:
+        eval_results = run_in_parallel(
+            _execute_job, range(len(eval_jobs)), max_parallel_runs
+        )
+    else:
+        eval_results = _execute_sequential()
+    for index, (run, df_result, metric_variant) in eval_results:
+        job = eval_jobs[index]
+        eval_run_ids[index] = run.name
+        logger.info(
+            f"Evaluation run '{run.name}' of '{job.evaluator.name}' "
+            f"completed with status {run.status}"
+        )
+        _report_results(job, df_result, metric_variant, job.evaluator.name)
 
-                if (
-                    current_standard_run.properties.get(
-                        "azureml.promptflow.node_variant", None
-                    )
-                    is not None
-                ):
-                    variant_id = current_standard_run.properties[
-                        "azureml.promptflow.node_variant"
-                    ]
-                    start_index = variant_id.find("{") + 1
-                    end_index = variant_id.find("}")
-                    variant_value = variant_id[start_index:end_index].split(".")
-                    print(data_id)
-                    df_result[variant_value[0]] = variant_value[1]
-                    metric_variant[variant_value[0]] = variant_value[1]
-                    df_result["dataset"] = data_id
-                    metric_variant["dataset"] = data_id
-
-                    for key, val in default_variants.items():
-                        if key == variant_value[0]:
-                            pass
-                        else:
-                            df_result[key] = val
-                            metric_variant[key] = val
-
-                dataframes.append(df_result)
-                metrics.append(metric_variant)
-
-                logger.info(json.dumps(metrics, indent=4))
-                logger.info(df_result.head(10))
-
-        if evaluator_executed and report_dir:
-            if not os.path.exists(report_dir):
-                os.makedirs(report_dir)
-
-            combined_results_df = pd.concat(dataframes, ignore_index=True)
-            combined_metrics_df = pd.DataFrame(metrics)
-            combined_results_df["flow_name"] = flow_name
-            combined_metrics_df["flow_name"] = flow_name
-            combined_results_df["exp_run"] = flow_run
-            combined_metrics_df["exp_run"] = flow_run
-
-            combined_results_df.to_csv(f"{report_dir}/{run_dataset.name}_result.csv")
-            combined_metrics_df.to_csv(f"{report_dir}/{run_dataset.name}_metrics.csv")
-
-            styled_df = combined_results_df.to_html(index=False)
-
-            with open(f"{report_dir}/{run_dataset.name}_result.html", "w") as c_results:
-                c_results.write(styled_df)
-
-            html_table_metrics = combined_metrics_df.to_html(index=False)
-            with open(
-                f"{report_dir}/{run_dataset.name}_metrics.html", "w"
-            ) as c_metrics:
-                c_metrics.write(html_table_metrics)
-
-            all_eval_df.append(combined_results_df)
-            all_eval_metrics.append(combined_metrics_df)
+    for metrics_parts in shard_metrics.values():
+        merged_metrics = merge_metrics(
+            [metrics for metrics, _ in metrics_parts]
+        )
+        merged_metrics["shards"] = len(metrics_parts)
+        partition = metrics_parts[0][1]
+        logger.info(json.dumps(merged_metrics, indent=4, default=str))
+        report_writer.append(
+            f"{partition['dataset']}_metrics", merged_metrics, partition
+        )
 
+    if eval_cache_dir:
+        # Evaluators without flow run in this process
+        os.environ[EVAL_CACHE_DIR_ENV] = os.path.abspath(eval_cache_dir)
+
+    registry = get_registry()
+    evaluator_calls = []
+    for evaluator in eval_flows:
+        flow_type = evaluator_flow_types[evaluator.name]
         if flow_type == FlowTypeOption.NO_FLOW:
-            service_path = evaluator.path
-
-            service_module = None
-            for file in os.listdir(service_path):
-                if file.endswith(".py") and file.lower().startswith("eval_"):
-                    module_name = file[:-3]
-                    flow_components = service_path.split("/")
-                    flow_formatted = ".".join(flow_components)
-                    module_path = f"{flow_formatted}." f"{module_name}"
-                    import sys
-
-                    dependent_modules_dir = os.path.join(
-                        experiment.base_path, experiment.flow
+            service_functions = registry.discover(
+                evaluator.path,
+                os.path.join(experiment.base_path, experiment.flow),
+            )
+            for service_function in service_functions:
+                for ds in evaluator.datasets:
+                    timestamp = datetime.datetime.now().strftime(
+                        "%Y%m%d_%H%M%S"
                     )
-                    sys.path.append(dependent_modules_dir)
-
-                    service_module = importlib.import_module(module_path)
+                    args = [
+                        f"{experiment_name}_eval_{timestamp}",
+                        os.path.join(experiment.base_path, ds.dataset.source),
+                        ds.mappings,
+                        f"{report_dir}/",
+                    ]
+                    if EXECUTION_TYPE != "LOCAL":
+                        args.append(
+                            {
+                                "subscription_id": config.subscription_id,
+                                "resource_group_name": (
+                                    config.resource_group_name
+                                ),
+                                "project_name": config.workspace_name,
+                            }
+                        )
+                    evaluator_calls.append((service_function, args))
+
+    for index, result in run_evaluators(
+        evaluator_calls, evaluator_processes, processes=True
+    ):
+        service_function = evaluator_calls[index][0]
+        logger.info(
+            f"Evaluator '{service_function.function_name}' returned {result}"
+        )
 
-                    module_names = dir(service_module)
+    for temp_dir in (shard_dir, batch_dir):
+        if temp_dir is not None:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    if len(dataset_names) > 0:
+        # Parquet reports are partitioned by dataset, a single one is written
+        for dataset_name in dataset_names if report_format == "csv" else []:
+            report_writer.write_report(f"{dataset_name}_result")
+            report_writer.write_report(f"{dataset_name}_metrics")
+
+        report_writer.write_report(
+            f"{experiment_name}_result",
+            [f"{dataset_name}_result" for dataset_name in dataset_names],
+            {
+                "stage": env_name,
+                "experiment_name": experiment_name,
+                "build": build_id,
+            },
+        )
+        report_writer.write_report(
+            f"{experiment_name}_metrics",
+            [f"{dataset_name}_metrics" for dataset_name in dataset_names],
+        )
 
-                    # Filter names to get functions defined in module
-                    function_names = [
-                        name
-                        for name in module_names
-                        if inspect.isfunction(getattr(service_module, name))
-                    ]
 
-                    for function_name in function_names:
-                        if function_name.lower().startswith("eval_"):
-                            service_function = getattr(service_module, function_name)
-                            for ds in evaluator.datasets:
-                                timestamp = datetime.datetime.now().strftime(
-                                    "%Y%m%d_%H%M%S"
-                                )
-                                if EXECUTION_TYPE == "LOCAL":
-                                    result = service_function(
-                                        f"{experiment_name}_eval_{timestamp}",
-                                        os.path.join(
-                                            experiment.base_path, ds.dataset.source
-                                        ),
-                                        ds.mappings,
-                                        f"{report_dir}/",
-                                    )
-                                else:
-                                    result = service_function(
-                                        f"{experiment_name}_eval_{timestamp}",
-                                        os.path.join(
-                                            experiment.base_path, ds.dataset.source
-                                        ),
-                                        ds.mappings,
-                                        f"{report_dir}/",
-                                        {
-                                            "subscription_id": (config.subscription_id),
-                                            "resource_group_name": (
-                                                config.resource_group_name
-                                            ),
-                                            "project_name": (config.workspace_name),
-                                        },
-                                    )
-
-                                print(result)
-
-    if len(all_eval_df) > 0:
-        final_results_df = pd.concat(all_eval_df, ignore_index=True)
-        final_metrics_df = pd.concat(all_eval_metrics, ignore_index=True)
-        final_results_df["stage"] = env_name
-        final_results_df["experiment_name"] = experiment_name
-        final_results_df["build"] = build_id
-
-        final_results_df.to_csv(f"{report_dir}/{experiment_name}_result.csv")
-        final_metrics_df.to_csv(f"{report_dir}/{experiment_name}_metrics.csv")
-
-        styled_df = final_results_df.to_html(index=False)
-        with open(f"{report_dir}/{experiment_name}_result.html", "w") as f_results:
-            f_results.write(styled_df)
-
-        html_table_metrics = final_metrics_df.to_html(index=False)
-        with open(f"{report_dir}/{experiment_name}_metrics.html", "w") as f_metrics:
-            f_metrics.write(html_table_metrics)
-
-
-def main():
+def main(argv: Optional[List[str]] = None):
     """
     Run the main evaluation loop by executing evaluation flows.
 
@@ -444,8 +930,93 @@ def main():
         default="./reports",
         help="A folder to save evaluation results and metrics",
     )
+    parser.add_argument(
+        "--report_format",
+        type=str,
+        choices=["csv", "parquet"],
+        help="Format of the saved outputs and metrics",
+        default="csv",
+    )
+    parser.add_argument(
+        "--skip_html",
+        help="Don't render the reports in html format",
+        required=False,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--html_page_size",
+        type=int,
+        help="Number of rows per html report page",
+        default=None,
+    )
+    parser.add_argument(
+        "--max_parallel_runs",
+        type=int,
+        help="Maximum number of evaluation runs executed in parallel",
+        default=1,
+    )
+    parser.add_argument(
+        "--eval_cache_dir",
+        type=str,
+        help="Folder of the evaluation cache, scored lines are not re-scored",
+        default=None,
+    )
+    parser.add_argument(
+        "--early_stop_metric",
+        type=str,
+        help="Line output compared between the variants in sequential mode",
+        default=None,
+    )
+    parser.add_argument(
+        "--early_stop_batch_size",
+        type=int,
+        help="Number of rows evaluated per batch in sequential mode",
+        default=None,
+    )
+    parser.add_argument(
+        "--early_stop_margin",
+        type=float,
+        help="Margin below the best variant above which a variant is stopped",
+        default=0.0,
+    )
+    parser.add_argument(
+        "--early_stop_confidence",
+        type=float,
+        help="Confidence level of the sequential comparisons",
+        default=0.95,
+    )
+    parser.add_argument(
+        "--nlp_metrics",
+        type=str,
+        help="Comma separated LLM-free metrics computed for every run",
+        default=None,
+    )
+    parser.add_argument(
+        "--nlp_prediction",
+        type=str,
+        help="Evaluator input holding the prediction",
+        default="prediction",
+    )
+    parser.add_argument(
+        "--nlp_reference",
+        type=str,
+        help="Evaluator input holding the reference",
+        default="groundtruth",
+    )
+    parser.add_argument(
+        "--nlp_embedding_model",
+        type=str,
+        help="Local embedding model of the embedding_cosine metric",
+        default=DEFAULT_EMBEDDING_MODEL,
+    )
+    parser.add_argument(
+        "--evaluator_processes",
+        type=int,
+        help="Number of worker processes calling the evaluators without flow",
+        default=1,
+    )
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     prepare_and_execute(
         args.run_id,
@@ -455,6 +1026,20 @@ def main():
         args.build_id,
         args.env_name,
         args.report_dir,
+        args.report_format,
+        args.skip_html,
+        args.html_page_size,
+        args.max_parallel_runs,
+        args.eval_cache_dir,
+        args.early_stop_metric,
+        args.early_stop_batch_size,
+        args.early_stop_margin,
+        args.early_stop_confidence,
+        args.nlp_metrics.split(",") if args.nlp_metrics else None,
+        args.nlp_prediction,
+        args.nlp_reference,
+        args.nlp_embedding_model,
+        args.evaluator_processes,
     )
 
 
@@ -17,7 +17,6 @@ from llmops.common.common import resolve_flow_type
 
 from llmops.common.experiment import load_experiment
 from llmops.common.logger import llmops_logger
-from llmops.common.create_connections import create_pf_connections
 
 
 logger = llmops_logger("prompt_aoai_connection")
@@ -38,6 +37,8 @@ def prepare_and_execute(
     Returns:
         None
     """
+    from llmops.common.create_connections import create_pf_connections
+
     logger.info(f"Using environment '{env_name}'")
 
     experiment = load_experiment(
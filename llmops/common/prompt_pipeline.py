@@ -6,7 +6,8 @@ predefined standard flows.
 
 Args:
 --file: The name of the experiment file. Default is 'experiment.yaml'.
---variants: Variants to run. (* for all, defaults, or comma separated list)
+--variants: Variants to run. (* for all, defaults, grid for every
+combination of node variants, or comma separated list)
 --base_path: Base path of the use case. Where flows, data,
 and experiment.yaml are expected to be found.
 --subscription_id: The Azure subscription ID. If this argument is not
@@ -22,6 +23,44 @@ but will be used to save the run IDs to file if specified.
 If provided, the outputs will be saved in files.
 --save_metric: Flag to save the metrics in files.
 If provided, the metrics will be saved in files.
+--max_parallel_runs: Maximum number of variant/dataset runs executed at the
+same time, shard runs included. Runs are independent, default is 1
+(sequential execution).
+--run_cache_dir: Folder of the local run cache. If provided, runs whose flow
+folder, variant, dataset, column mapping and environment variables did not
+change since a previous execution are reused instead of being executed again.
+--report_format: Format of the saved outputs and metrics, csv (default) or
+parquet. Parquet reports are written once per experiment, partitioned by
+experiment, dataset, variant and build_id. Parquet requires pyarrow.
+--skip_html: Flag to not render the reports in html format.
+--html_page_size: Number of rows per html page. Default is a single page.
+--checkpoint_file: Path of the checkpoint manifest, updated after every run.
+Default is <report_dir>/<experiment name>_checkpoint.json.
+--resume: Flag to resume an interrupted execution from its checkpoint
+manifest. Completed runs are reused and runs still in progress in Azure are
+attached to instead of being submitted again.
+--submit_async: Flag to submit all runs without streaming their logs.
+A single poller then waits for them with exponential backoff, which lets one
+process drive many Azure runs at the same time.
+--poll_timeout: Maximum number of seconds to wait for runs submitted with
+--submit_async. Default is no limit.
+--shards: Number of row shards of every local dataset. The same variant runs
+on all the shards in parallel and the details are merged back in the original
+row order under a single logical run. The shard run IDs are saved in the
+output file and shards are checkpointed one by one. Default is 1 (no
+sharding).
+--dry_run: Flag to only list the planned variant/dataset runs.
+If provided, the run plan is logged and nothing is executed.
+--grid_sample: Number of variant combinations randomly sampled in grid mode.
+--seed: Seed of the grid sampling, for reproducible samples.
+--halving_rows: Number of rows used in the first round of successive halving
+in grid mode. If provided, combinations are scored on growing slices of the
+first local dataset and only the best are run on the full datasets.
+--halving_metric: Run metric (or numeric details column) maximised by
+successive halving.
+--halving_eta: Successive halving reduction factor. Default is 2.
+--halving_keep: Number of combinations promoted to the full datasets.
+Default is 1.
 
 Example for running the script with variants
 (using web_classification experiment):
@@ -45,95 +84,125 @@ python -m llmops.common.prompt_pipeline
     --base_path ./web_classification
     --variants summarize_text_content.variant_0
 
+# Run every combination of node variants, pruned by successive halving
+python -m llmops.common.prompt_pipeline
+    --base_path ./web_classification --variants grid
+    --halving_rows 20 --halving_metric accuracy
+
+# Run all variants, four runs at a time
+python -m llmops.common.prompt_pipeline
+    --base_path ./web_classification --variants all --max_parallel_runs 4
+
+# Run the default variants on eight shards of the datasets
+python -m llmops.common.prompt_pipeline
+    --base_path ./web_classification --variants defaults --shards 8
+
 """
 
 import argparse
 import datetime
+import hashlib
+import json
 import os
+import shutil
+import tempfile
+import threading
 import pandas as pd
+import yaml
 from dotenv import load_dotenv
-from enum import Enum
-from typing import Optional
+from typing import Dict, List, Optional
 
 from llmops.common.common import (
+    generate_file_hash,
+    hash_folder,
     resolve_flow_type,
     resolve_env_vars,
+    run_in_parallel,
     ClientObjectWrapper as ObjectWrapper,
 )
 from llmops.common.experiment_cloud_config import ExperimentCloudConfig
-from llmops.common.experiment import load_experiment
+from llmops.common.experiment import Dataset, load_experiment
 from llmops.common.logger import llmops_logger
-from llmops.common.create_connections import create_pf_connections
+from llmops.common.dataset_shards import (
+    ShardedRun,
+    merge_shard_details,
+    shard_tags,
+    split_jsonl,
+)
+from llmops.common.report_writer import StreamingReportWriter
+from llmops.common.run_cache import CachedRun, RunCache, compute_run_key
+from llmops.common.run_manifest import SUBMITTED, RunManifest, checkpoint_key
+from llmops.common.run_poller import COMPLETED_STATUSES, RunPoller
+from llmops.common.run_planner import (
+    PlannedRun,
+    VariantsSelector,
+    format_run_plan,
+    grid_combinations,
+    plan_runs,
+    sample_combinations,
+    successive_halving,
+    variant_combination_key,
+)
 from llmops.common.common import FlowTypeOption
+from llmops.common.flow_manifest import FLOW_DAG_FILENAMES
 from llmops.config import EXECUTION_TYPE
-from promptflow.client import PFClient as PFClientLocal
-from promptflow.azure import PFClient as PFClientAzure
-from azure.ai.ml import MLClient
-from azure.identity import DefaultAzureCredential
 
 logger = llmops_logger("prompt_pipeline")
 
 
-def check_dictionary_contained(ref_dict, dict_list):
-    """Check if a dictionary is contained in a list of dictionaries."""
-    for candidate_dict in dict_list:
-        set1 = {frozenset(dict(candidate_dict).items())}
-        set2 = {frozenset(ref_dict.items())}
-        if set1 == set2:
-            return True
-    return False
+def _link_or_copy(source: str, destination: str):
+    """Hard link a file, copy it when links aren't supported."""
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
 
 
-class VariantsSelector:
-    """Selects the variants to run. Options are default, all or custom."""
+def _write_combination_flow(
+    flow_path: str, combination: Dict[str, str], target_dir: str
+) -> str:
+    """
+    Write a copy of the flow using the combination as default variants.
 
-    class VariantSelectionOption(Enum):
-        """provide enum options for variant selection."""
+    Prompt flow selects at most one node variant per run, the copy lets a
+    run use the variants of several nodes. The flow folder is copied to
+    target_dir so code references keep resolving and the flow folder of
+    the use case is never modified. Files are hard linked when possible.
 
-        DEFAULTS_ONLY = 1
-        ALL = 2
-        CUSTOM = 3
+    :return: Path to the copied flow folder.
+    :rtype: str
+    """
+    for file_name in FLOW_DAG_FILENAMES:
+        flow_file_path = os.path.join(flow_path, file_name)
+        if os.path.isfile(flow_file_path):
+            break
+    else:
+        raise ValueError(f"Could not find prompt flow file in {flow_path}")
 
-    def __init__(
-        self,
-        selector: VariantSelectionOption,
-        selected_variants: Optional[list[str]] = None,
-    ):
-        """Store for variants and option."""
-        self._selector = selector
-        self._selected_variants = selected_variants or []
-
-    @property
-    def defaults_only(self) -> bool:
-        """Compare if default variant is selected."""
-        return self._selector == self.VariantSelectionOption.DEFAULTS_ONLY
-
-    def is_variant_enabled(self, node: str, variant: str) -> bool:
-        """Check if the variant is enabled."""
-        if self._selector in [
-            VariantsSelector.VariantSelectionOption.DEFAULTS_ONLY,
-            VariantsSelector.VariantSelectionOption.ALL,
-        ]:
-            return True
-
-        for selected_variant in self._selected_variants:
-            if selected_variant in (variant, f"{node}.{variant}"):
-                return True
-        return False
-
-    @classmethod
-    def from_args(cls, variants: str):
-        """Parse the variants from the command line arguments."""
-        variants = variants.strip().lower()
-        if variants in ["*", "all"]:
-            return cls(cls.VariantSelectionOption.ALL)
-        if variants in ["defaults", "default"]:
-            return cls(cls.VariantSelectionOption.DEFAULTS_ONLY)
-        return cls(
-            cls.VariantSelectionOption.CUSTOM,
-            [v.strip() for v in variants.split(",")]
+    with open(flow_file_path, "r") as flow_file:
+        yaml_data = yaml.safe_load(flow_file)
+    for node_name, variant_id in combination.items():
+        yaml_data["node_variants"][node_name]["default_variant_id"] = (
+            variant_id
         )
 
+    digest = hashlib.sha256(
+        json.dumps(variant_combination_key(combination)).encode("utf-8")
+    ).hexdigest()[:12]
+    combination_path = os.path.join(target_dir, f"grid_{digest}")
+    shutil.copytree(
+        flow_path,
+        combination_path,
+        ignore=shutil.ignore_patterns(".promptflow", "__pycache__", "*.pyc"),
+        copy_function=_link_or_copy,
+    )
+    combination_file_path = os.path.join(combination_path, file_name)
+    # Don't write through a hard link to the original flow file
+    os.remove(combination_file_path)
+    with open(combination_file_path, "w") as combination_file:
+        yaml.safe_dump(yaml_data, combination_file, sort_keys=False)
+    return combination_path
+
 
 def prepare_and_execute(
     variants_selector: VariantsSelector,
@@ -146,6 +215,23 @@ def prepare_and_execute(
     output_file: Optional[str] = None,
     save_output: Optional[bool] = None,
     save_metric: Optional[bool] = None,
+    max_parallel_runs: int = 1,
+    run_cache_dir: Optional[str] = None,
+    dry_run: Optional[bool] = None,
+    grid_sample: Optional[int] = None,
+    seed: Optional[int] = None,
+    halving_rows: Optional[int] = None,
+    halving_metric: Optional[str] = None,
+    halving_eta: int = 2,
+    halving_keep: int = 1,
+    report_format: str = "csv",
+    skip_html: Optional[bool] = None,
+    html_page_size: Optional[int] = None,
+    checkpoint_file: Optional[str] = None,
+    resume: Optional[bool] = None,
+    submit_async: Optional[bool] = None,
+    poll_timeout: Optional[float] = None,
+    shards: int = 1,
 ):
     """
     Run the experimentation loop by executing standard flows.
@@ -154,7 +240,22 @@ def prepare_and_execute(
     identifies all variants across all nodes.
     executes the flow creating a new job using
     unique variant combination across nodes.
-    saves the results in both csv and html format.
+    runs are independent of each other and up to max_parallel_runs
+    of them, shard runs included, are executed at the same time.
+    reuses runs found in run_cache_dir when the flow folder, variant,
+    dataset, column mapping and environment variables are unchanged.
+    only lists the planned runs if dry_run is set.
+    records every run in a checkpoint manifest, and skips the runs that
+    completed in a previous execution if resume is set.
+    with submit_async, submits all runs without streaming their logs and
+    waits for them with a single poller, up to poll_timeout seconds.
+    splits local datasets in shards rows shards, runs them in parallel and
+    merges their details under the name of the planned run.
+    in grid mode, runs every combination of node variants, optionally
+    limited to a random sample of grid_sample combinations and pruned by
+    successive halving when halving_rows is set.
+    saves the results in csv or parquet format, and optionally in html
+    format split in pages of html_page_size rows.
     saves the job ids in text file for later use.
 
     Returns:
@@ -169,10 +270,58 @@ def prepare_and_execute(
     flow_type, params_dict = resolve_flow_type(
         experiment.base_path, experiment.flow)
 
+    flow_detail = experiment.get_flow_detail(flow_type)
+    print(flow_detail.flow_path)
+
+    env_vars = {}
+    env_vars = resolve_env_vars(experiment.base_path)
+
+    if not experiment.runtime:
+        logger.info("Using automatic runtime and compute for run")
+    else:
+        logger.info(f"Using runtime '{experiment.runtime}'")
+    runtime_resources = (
+        None if experiment.runtime else {"instance_type": "Standard_E4ds_v4"}
+    )
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    if halving_rows and not halving_metric:
+        raise ValueError("Successive halving requires a halving metric")
+    if shards < 1:
+        raise ValueError(f"Number of shards must be positive, got {shards}")
+    if shards > 1 and EXECUTION_TYPE != "LOCAL":
+        logger.warning("Sharding requires local datasets, running unsharded")
+        shards = 1
+
+    combinations = None
+    if variants_selector.grid:
+        combinations = grid_combinations(flow_detail)
+        logger.info(f"Variant grid has {len(combinations)} combinations")
+        if grid_sample:
+            combinations = sample_combinations(combinations, grid_sample, seed)
+            logger.info(f"Sampled {len(combinations)} combinations")
+
+    logger.info(f"Running experiment {experiment.name}")
+    planned_runs = plan_runs(
+        experiment.name,
+        experiment.datasets,
+        flow_detail,
+        variants_selector,
+        timestamp,
+        combinations,
+    )
+    logger.info(format_run_plan(planned_runs))
+    if dry_run:
+        return
+
     ml_client = None
     wrapper = None
+    # Prompt flow and Azure SDKs are only imported to execute runs
     if EXECUTION_TYPE == "LOCAL":
-        pf = PFClientLocal()
+        from llmops.common.clients import get_local_pf_client
+        from llmops.common.create_connections import create_pf_connections
+
+        pf = get_local_pf_client()
         create_pf_connections(
             exp_filename,
             base_path,
@@ -180,320 +329,539 @@ def prepare_and_execute(
         )
         wrapper = ObjectWrapper(pf=pf)
     else:
+        from llmops.common.clients import get_azure_pf_client, get_ml_client
 
-        ml_client = MLClient(
-            subscription_id=config.subscription_id,
-            resource_group_name=config.resource_group_name,
-            workspace_name=config.workspace_name,
-            credential=DefaultAzureCredential(),
+        # Credential and clients are shared with the other stages
+        ml_client = get_ml_client(
+            config.subscription_id,
+            config.resource_group_name,
+            config.workspace_name,
         )
-
-        pf = PFClientAzure(
-            credential=DefaultAzureCredential(),
-            subscription_id=config.subscription_id,
-            workspace_name=config.workspace_name,
-            resource_group_name=config.resource_group_name
+        pf = get_azure_pf_client(
+            config.subscription_id,
+            config.resource_group_name,
+            config.workspace_name,
         )
-        if ml_client is not None:
-            wrapper = ObjectWrapper(pf=pf, ml_client=ml_client)
+        wrapper = ObjectWrapper(pf=pf, ml_client=ml_client)
+
+    run_cache = None
+    flow_hash = None
+    data_hashes = {}
+    if run_cache_dir:
+        run_cache = RunCache(run_cache_dir)
+        flow_hash = hash_folder(flow_detail.flow_path)
+        logger.info(f"Using run cache '{run_cache_dir}'")
+
+    def _get_run_key(planned_run: PlannedRun, data: str) -> Optional[str]:
+        if EXECUTION_TYPE == "LOCAL":
+            if not os.path.isfile(data):
+                return None
+            if data not in data_hashes:
+                data_hashes[data] = generate_file_hash(data)
+            data_hash = data_hashes[data]
         else:
-            wrapper = ObjectWrapper(pf=pf)
+            # Remote sources are versioned data asset references
+            data_hash = data
+        return compute_run_key(
+            flow_hash,
+            planned_run.variant_label,
+            data_hash,
+            planned_run.mapped_dataset.mappings,
+            env_vars,
+            params_dict if flow_type == FlowTypeOption.CLASS_FLOW else None,
+            EXECUTION_TYPE,
+        )
 
-    flow_detail = experiment.get_flow_detail(flow_type)
-    print(flow_detail.flow_path)
-    run_ids = []
-    past_runs = []
-    all_df = []
-    all_metrics = []
+    if checkpoint_file is None and report_dir:
+        checkpoint_file = os.path.join(
+            report_dir, f"{experiment.name}_checkpoint.json"
+        )
+    manifest = None
+    if checkpoint_file:
+        manifest = RunManifest(checkpoint_file, experiment.name, resume)
+        logger.info(f"Recording runs in checkpoint '{checkpoint_file}'")
+    elif resume:
+        raise ValueError("Resuming requires a checkpoint file or report dir")
 
-    env_vars = {}
-    env_vars = resolve_env_vars(experiment.base_path)
+    def _resume_run(key: str):
+        entry = manifest.get(key)
+        if entry is None:
+            return None
+        try:
+            run = pf.runs.get(entry["run_name"])
+        except Exception as error:
+            logger.info(
+                f"Run '{entry['run_name']}' can't be resumed: {error}"
+            )
+            return None
 
-    logger.info(f"Running experiment {experiment.name}")
-    for mapped_dataset in experiment.datasets:
-        logger.info(f"Using dataset {mapped_dataset.dataset.source}")
-        dataset = mapped_dataset.dataset
-        column_mapping = mapped_dataset.mappings
+        if run.status not in COMPLETED_STATUSES:
+            # Local runs don't survive the process that started them
+            if (
+                entry["status"] != SUBMITTED
+                or run.status in ("Failed", "Canceled")
+                or EXECUTION_TYPE == "LOCAL"
+            ):
+                return None
+            logger.info(f"Attaching to run '{run.name}' ({run.status})")
+            if submit_async:
+                # Tracked by the run poller with the submitted runs
+                return run, None
+            run = pf.stream(run)
+        else:
+            logger.info(f"Reusing completed run '{run.name}'")
+        manifest.mark_finished(key, str(run.name), run.status)
+        return run, pf.get_details(run=run)
 
-        dataframes = []
-        metrics = []
+    combination_flows: Dict[tuple, str] = {}
+    combination_flows_lock = threading.Lock()
+    # Submitted runs, shard runs included, are bounded by max_parallel_runs
+    run_slots = threading.BoundedSemaphore(max(1, max_parallel_runs))
 
-        if (len(flow_detail.all_variants) != 0 and
-                not variants_selector.defaults_only):
-            logger.info(
-                f"Start processing {len(flow_detail.all_variants)} variants"
+    def _get_flow(planned_run: PlannedRun) -> str:
+        if not planned_run.grid:
+            return flow_detail.flow_path
+        key = variant_combination_key(planned_run.combination)
+        with combination_flows_lock:
+            if key not in combination_flows:
+                combination_flows[key] = _write_combination_flow(
+                    flow_detail.flow_path,
+                    planned_run.combination,
+                    combination_dir,
                 )
-            for variant in flow_detail.all_variants:
-                for variant_id, node_id in variant.items():
-                    if not variants_selector.is_variant_enabled(
-                        node_id, variant_id
-                    ):
-                        continue
-                    logger.info(
-                        f"Creating run for node '{node_id}' '{variant_id}'"
-                    )
-                    variant_string = f"${{{node_id}.{variant_id}}}"
-                    get_current_defaults = {
-                        key: value
-                        for key, value in flow_detail.default_variants.items()
-                        if key != node_id or value != variant_id
-                    }
-                    get_current_defaults[node_id] = variant_id
-                    get_current_defaults["dataset"] = dataset.name
-
-                    # This validates that we are not running the same
-                    # combination of variants more than once
-                    if not check_dictionary_contained(
-                        get_current_defaults, past_runs
-                    ):
-                        past_runs.append(get_current_defaults)
-
-                        # Create run object
-                        if not experiment.runtime:
-                            logger.info(
-                                "Using automatic runtime and compute for run"
-                            )
-                        else:
-                            logger.info(
-                                f"Using runtime '{experiment.runtime}'"
-                            )
-
-                        timestamp = datetime.datetime.now().strftime(
-                            "%Y%m%d_%H%M%S"
-                        )
-                        run_name = (
-                            f"{experiment.name}_"
-                            f"{variant_id}_"
-                            f"{timestamp}_"
-                            f"{dataset.name}"
-                        )
-                        runtime_resources = (
-                            None
-                            if experiment.runtime
-                            else {"instance_type": "Standard_E4ds_v4"}
-                        )
-
-                        if (flow_type == FlowTypeOption.DAG_FLOW or
-                                flow_type == FlowTypeOption.FUNCTION_FLOW):
-                            run = pf.run(
-                                flow=flow_detail.flow_path,
-                                data=(
-                                    dataset.get_local_source(base_path)
-                                    if EXECUTION_TYPE == "LOCAL"
-                                    else dataset.get_remote_source(
-                                        wrapper.get_property_value()
-                                    )
-                                ),
-                                variant=variant_string,
-                                name=run_name,
-                                display_name=run_name,
-                                environment_variables=env_vars,
-                                column_mapping=column_mapping,
-                                tags={} if not build_id else {
-                                    "build_id": build_id
-                                },
-                                resources=runtime_resources,
-                                runtime=experiment.runtime,
-                                stream=True,
-                            )
-                        elif flow_type == FlowTypeOption.CLASS_FLOW:
-                            run = pf.run(
-                                flow=flow_detail.flow_path,
-                                data=(
-                                    dataset.get_local_source(base_path)
-                                    if EXECUTION_TYPE == "LOCAL"
-                                    else dataset.get_remote_source(
-                                        wrapper.get_property_value()
-                                    )
-                                ),
-                                variant=variant_string,
-                                name=run_name,
-                                display_name=run_name,
-                                environment_variables=env_vars,
-                                column_mapping=column_mapping,
-                                tags={} if not build_id else {
-                                    "build_id": build_id
-                                },
-                                resources=runtime_resources,
-                                runtime=experiment.runtime,
-                                init=params_dict,
-                                stream=True,
-                            )
-                        else:
-                            raise ValueError("Invalid flow type")
-                        run._experiment_name = experiment.name
-
-                        # Execute the run
-                        logger.info(
-                            f"Starting run '{run.name}'. This can take time.",
-                        )
-                        df_result = pf.get_details(run=run)
-                        run_ids.append(str(run.name))
-                        # wait_job_finish(job, logger)
-
-                        # df_result = pf.get_details(job)
-                        logger.info(
-                            f"Run {run.name} status {run.status}",
-                        )
-                        logger.info(f"Results:\n{df_result.head(10)}")
-                        logger.info("Finished processing default variant\n")
-
-                        if save_output:
-                            dataframes.append(df_result)
-                        if save_metric:
-                            metric_variant = df_result
-                            metric_variant[variant_id] = variant_string
-                            metric_variant["dataset"] = dataset.name
-                            metrics.append(metric_variant)
-            logger.info("Finished processing all variants")
-        else:
-            logger.info("Start processing default variant")
+            return combination_flows[key]
+
+    def _get_data(planned_run: PlannedRun) -> str:
+        dataset = planned_run.mapped_dataset.dataset
+        return (
+            dataset.get_local_source(base_path)
+            if EXECUTION_TYPE == "LOCAL"
+            else dataset.get_remote_source(wrapper.get_property_value())
+        )
+
+    def _execute_sharded_run(
+        planned_run: PlannedRun, data: str, key: Optional[str]
+    ):
+        """Run the shards of the dataset and merge their details."""
+        dataset_name = planned_run.mapped_dataset.dataset.name
+        dataset_shards = split_jsonl(
+            data, shards, os.path.join(shard_dir, planned_run.run_name)
+        )
+        shard_runs = [
+            PlannedRun(
+                f"{planned_run.run_name}_shard{shard.index}",
+                Dataset(dataset_name, shard.path, None, None).with_mappings(
+                    planned_run.mapped_dataset.mappings
+                ),
+                planned_run.combination,
+                planned_run.node_id,
+                planned_run.variant_id,
+                planned_run.grid,
+                shard_tags(
+                    planned_run.run_name,
+                    dataset_name,
+                    shard,
+                    len(dataset_shards),
+                ),
+            )
+            for shard in dataset_shards
+        ]
+        logger.info(
+            f"Running '{planned_run.run_name}' on {len(shard_runs)} shards"
+        )
+
+        results = [None] * len(shard_runs)
+        # Shards are checkpointed and resumed one by one, the logical run
+        # has no run of its own
+        for index, result in run_in_parallel(
+            lambda shard: _execute_run(shard[1], shard_index=shard[0]),
+            list(enumerate(shard_runs)),
+            min(len(shard_runs), max_parallel_runs),
+        ):
+            results[index] = result
+        run = ShardedRun(
+            planned_run.run_name, [shard_run for shard_run, _ in results]
+        )
+        df_result = merge_shard_details(
+            [shard_details for _, shard_details in results], dataset_shards
+        )
+        return run, df_result
+
+    def _submit_run(
+        planned_run: PlannedRun,
+        checkpoint: bool = True,
+        stream: bool = True,
+        shard_index: Optional[int] = None,
+    ):
+        """Submit a run, return its details if they are already known."""
+        key = None
+        if manifest is not None and checkpoint:
+            key = checkpoint_key(planned_run, shard_index)
+            resumed_run = _resume_run(key) if resume else None
+            if resumed_run is not None:
+                return resumed_run
 
-            # Create run object
-            if not experiment.runtime:
+        data = _get_data(planned_run)
+        # Only the planned runs are sharded, not halving slices and shards
+        if (
+            shards > 1
+            and checkpoint
+            and shard_index is None
+            and os.path.isfile(data)
+        ):
+            return _execute_sharded_run(planned_run, data, key)
+        if run_cache is not None:
+            run_key = _get_run_key(planned_run, data)
+            cached_run = run_cache.get(run_key) if run_key else None
+            if cached_run is not None:
                 logger.info(
-                    "Using automatic runtime and compute for run"
+                    f"Reusing cached run '{cached_run.name}' "
+                    f"for '{planned_run.run_name}'"
                 )
+                if key is not None:
+                    manifest.mark_finished(
+                        key, cached_run.name, cached_run.status
+                    )
+                return cached_run, cached_run.details
+
+        run_args = {
+            "flow": _get_flow(planned_run),
+            "data": data,
+            "name": planned_run.run_name,
+            "display_name": planned_run.run_name,
+            "environment_variables": env_vars,
+            "column_mapping": planned_run.mapped_dataset.mappings,
+            "tags": {
+                **({} if not build_id else {"build_id": build_id}),
+                **planned_run.tags,
+            },
+            "resources": runtime_resources,
+            "runtime": experiment.runtime,
+            "stream": stream,
+        }
+        if planned_run.variant_string:
+            run_args["variant"] = planned_run.variant_string
+
+        if flow_type == FlowTypeOption.CLASS_FLOW:
+            run_args["init"] = params_dict
+        elif flow_type not in (
+            FlowTypeOption.DAG_FLOW, FlowTypeOption.FUNCTION_FLOW
+        ):
+            raise ValueError("Invalid flow type")
+        # Runs of planned runs and of shards share the same budget
+        with run_slots:
+            if key is not None:
+                manifest.mark_submitted(key, planned_run.run_name)
+            run = pf.run(**run_args)
+        run._experiment_name = experiment.name
+
+        # Execute the run
+        logger.info(
+            f"Starting run '{run.name}'. This can take time.",
+        )
+        return run, None
+
+    def _finish_run(
+        planned_run: PlannedRun,
+        run,
+        checkpoint: bool = True,
+        shard_index: Optional[int] = None,
+    ):
+        """Get the details of a finished run and record it."""
+        df_result = pf.get_details(run=run)
+        if run_cache is not None:
+            run_key = _get_run_key(planned_run, _get_data(planned_run))
+            if run_key is not None:
+                run_cache.put(run_key, str(run.name), run.status, df_result)
+        if manifest is not None and checkpoint:
+            manifest.mark_finished(
+                checkpoint_key(planned_run, shard_index),
+                str(run.name),
+                run.status,
+            )
+        return run, df_result
+
+    def _execute_run(
+        planned_run: PlannedRun,
+        checkpoint: bool = True,
+        shard_index: Optional[int] = None,
+    ):
+        run, df_result = _submit_run(
+            planned_run, checkpoint, shard_index=shard_index
+        )
+        if df_result is None:
+            run, df_result = _finish_run(
+                planned_run, run, checkpoint, shard_index
+            )
+        return run, df_result
+
+    def _execute_runs_async(runs_to_execute: List[PlannedRun]):
+        """Submit all runs without streaming and poll them together."""
+        pending: Dict[str, int] = {}
+        for index, (run, df_result) in run_in_parallel(
+            lambda planned_run: _submit_run(planned_run, stream=False),
+            runs_to_execute,
+            max_parallel_runs,
+        ):
+            if df_result is not None:
+                yield index, (run, df_result)
             else:
-                logger.info(
-                    f"Using runtime '{experiment.runtime}'"
+                pending[str(run.name)] = index
+
+        logger.info(f"Waiting for {len(pending)} submitted runs")
+        failed_runs = []
+        poller = RunPoller(pf.runs.get, logger, timeout=poll_timeout)
+        for run in poller.wait(list(pending.keys())):
+            planned_run = runs_to_execute[pending[str(run.name)]]
+            if run.status in COMPLETED_STATUSES:
+                yield pending[str(run.name)], _finish_run(planned_run, run)
+                continue
+            failed_runs.append(f"{run.name} ({run.status})")
+            if manifest is not None:
+                manifest.mark_finished(
+                    checkpoint_key(planned_run), str(run.name), run.status
                 )
+        if failed_runs:
+            raise ValueError(f"Runs not completed: {', '.join(failed_runs)}")
 
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            run_name = f"{experiment.name}_{timestamp}_{dataset.name}"
-            runtime_resources = (
-                None if experiment.runtime else {
-                    "instance_type": "Standard_E4ds_v4"
-                }
+    def _get_score(run, df_result: pd.DataFrame) -> float:
+        metrics = {}
+        if not isinstance(run, CachedRun):
+            metrics = pf.get_metrics(run) or {}
+        if halving_metric in metrics:
+            return float(metrics[halving_metric])
+        if halving_metric in df_result.columns:
+            return float(
+                pd.to_numeric(
+                    df_result[halving_metric], errors="coerce"
+                ).mean()
             )
+        raise ValueError(
+            f"Metric '{halving_metric}' not found in run '{run.name}'"
+        )
+
+    def _prune_combinations(
+        combinations: List[Dict[str, str]]
+    ) -> List[Dict[str, str]]:
+        # Combinations are scored on slices of the first local dataset
+        mapped_dataset = next(
+            (
+                ds for ds in experiment.datasets
+                if ds.dataset.get_local_source(base_path)
+                and os.path.isfile(ds.dataset.get_local_source(base_path))
+            ),
+            None,
+        )
+        if mapped_dataset is None:
+            logger.warning(
+                "Successive halving requires a local dataset, skipping"
+            )
+            return combinations
+
+        with open(mapped_dataset.dataset.get_local_source(base_path)) as f:
+            rows = [line for line in f if line.strip()]
+        slice_dir = tempfile.mkdtemp()
+
+        def _score_combinations(
+            combinations: List[Dict[str, str]], row_count: int
+        ) -> List[float]:
+            slice_path = os.path.join(slice_dir, f"rows_{row_count}.jsonl")
+            with open(slice_path, "w") as slice_file:
+                slice_file.writelines(rows[:row_count])
+            slice_dataset = Dataset(
+                mapped_dataset.dataset.name, slice_path, None, None
+            ).with_mappings(mapped_dataset.mappings)
 
-            if (flow_type == FlowTypeOption.DAG_FLOW or
-                    flow_type == FlowTypeOption.FUNCTION_FLOW):
-                run = pf.run(
-                    flow=flow_detail.flow_path,
-                    data=(
-                        dataset.get_local_source(base_path)
-                        if EXECUTION_TYPE == "LOCAL"
-                        else dataset.get_remote_source(
-                            wrapper.get_property_value()
-                            )
-                    ),
-                    name=run_name,
-                    display_name=run_name,
-                    environment_variables=env_vars,
-                    column_mapping=column_mapping,
-                    tags={} if not build_id else {"build_id": build_id},
-                    resources=runtime_resources,
-                    runtime=experiment.runtime,
-                    stream=True,
+            slice_runs = [
+                PlannedRun(
+                    f"{experiment.name}_halving{row_count}_{index}_"
+                    f"{timestamp}",
+                    slice_dataset,
+                    {**flow_detail.default_variants, **combination},
+                    grid=True,
                 )
-            elif flow_type == FlowTypeOption.CLASS_FLOW:
-                run = pf.run(
-                    flow=flow_detail.flow_path,
-                    data=(
-                        dataset.get_local_source(base_path)
-                        if EXECUTION_TYPE == "LOCAL"
-                        else dataset.get_remote_source(
-                                wrapper.get_property_value()
-                            )
-                    ),
-                    name=run_name,
-                    display_name=run_name,
-                    environment_variables=env_vars,
-                    column_mapping=column_mapping,
-                    tags={} if not build_id else {"build_id": build_id},
-                    resources=runtime_resources,
-                    runtime=experiment.runtime,
-                    init=params_dict,
-                    stream=True,
+                for index, combination in enumerate(combinations)
+            ]
+            scores = [None] * len(slice_runs)
+            # Slices share the keys of the full runs, they aren't recorded
+            for index, (run, df_result) in run_in_parallel(
+                lambda slice_run: _execute_run(slice_run, checkpoint=False),
+                slice_runs,
+                max_parallel_runs,
+            ):
+                scores[index] = _get_score(run, df_result)
+                logger.info(
+                    f"{slice_runs[index].variant_label} scored "
+                    f"{scores[index]} on {row_count} rows"
                 )
-            run._experiment_name = experiment.name
-            print(run)
+            return scores
 
-            # Execute the run
-            logger.info(
-                f"Starting run '{run.name}' in Azure ML. This can take time.",
+        try:
+            return successive_halving(
+                combinations,
+                _score_combinations,
+                halving_rows,
+                len(rows),
+                halving_eta,
+                halving_keep,
             )
+        finally:
+            shutil.rmtree(slice_dir, ignore_errors=True)
 
-            df_result = pf.get_details(run=run)
-            run_ids.append(str(run.name))
-            logger.info(f"Run {run.name} completed with status {run.status}")
+    # Reports are appended as runs complete, not kept in memory
+    report_writer = None
+    if save_output or save_metric:
+        report_writer = StreamingReportWriter(
+            report_dir,
+            report_format=report_format,
+            write_html=not skip_html,
+            html_page_size=html_page_size,
+        )
+
+    shard_dir = tempfile.mkdtemp() if shards > 1 else None
+    # Combined flows are written outside of the flow folder of the use case
+    combination_dir = tempfile.mkdtemp() if combinations is not None else None
+    try:
+        if combinations is not None and halving_rows:
+            combinations = _prune_combinations(combinations)
+            planned_runs = plan_runs(
+                experiment.name,
+                experiment.datasets,
+                flow_detail,
+                variants_selector,
+                timestamp,
+                combinations,
+            )
             logger.info(
-                f"Results:\n{df_result.head(10)}",
+                f"Promoted {len(combinations)} combinations to the full data"
             )
-            logger.info("Finished processing default variant\n")
-
-            if save_output:
-                dataframes.append(df_result)
-            if save_metric:
-                metric_variant = df_result
-                metric_variant["dataset"] = dataset.name
-                metrics.append(metric_variant)
-
-        # Save outputs and metrics per dataset
-        if (save_output or save_metric) and not os.path.exists(report_dir):
-            os.makedirs(report_dir)
-
-        if save_output:
-            combined_results_df = pd.concat(dataframes, ignore_index=True)
-            combined_results_df.to_csv(
-                f"{report_dir}/{dataset.name}_result.csv"
+            logger.info(format_run_plan(planned_runs))
+
+        logger.info(
+            f"Executing {len(planned_runs)} runs, "
+            f"up to {max_parallel_runs} in parallel"
+        )
+        run_ids = [None] * len(planned_runs)
+        if submit_async:
+            executed_runs = _execute_runs_async(planned_runs)
+        else:
+            executed_runs = run_in_parallel(
+                _execute_run, planned_runs, max_parallel_runs
             )
-            styled_df = combined_results_df.to_html(index=False)
-            with open(
-                f"{report_dir}/{dataset.name}_result.html", "w"
-            ) as c_results:
-                c_results.write(styled_df)
-            all_df.append(combined_results_df)
-        if save_metric:
-            combined_metrics_df = pd.DataFrame(metrics)
-            combined_metrics_df.to_csv(
-                f"{report_dir}/{dataset.name}_metrics.csv"
+        for index, (run, df_result) in executed_runs:
+            # Sharded runs are evaluated shard by shard
+            run_ids[index] = (
+                run.shard_run_names
+                if isinstance(run, ShardedRun)
+                else [str(run.name)]
             )
+            logger.info(f"Run {run.name} completed with status {run.status}")
+            logger.info(f"Results:\n{df_result.head(10)}")
+            if report_writer is not None:
+                _append_run_report(
+                    report_writer,
+                    planned_runs[index],
+                    df_result,
+                    save_output,
+                    save_metric,
+                    experiment.name,
+                    build_id,
+                )
+    finally:
+        if combination_dir is not None:
+            shutil.rmtree(combination_dir, ignore_errors=True)
+        if shard_dir is not None:
+            shutil.rmtree(shard_dir, ignore_errors=True)
 
-            html_table_metrics = combined_metrics_df.to_html(index=False)
-
-            with open(
-                f"{report_dir}/{dataset.name}_metrics.html", "w"
-            ) as full_metric:
-                full_metric.write(html_table_metrics)
-            all_metrics.append(combined_metrics_df)
-
-    # Write to file run ids
+    # Write to file run ids, in plan order whatever the completion order
+    run_ids = [run_id for plan_run_ids in run_ids for run_id in plan_run_ids]
     if output_file is not None:
         with open(output_file, "w") as out_file:
             out_file.write(str(run_ids))
     logger.info(str(run_ids))
 
-    # Save outputs and metrics for experiment
+    if report_writer is None:
+        return
+
+    # Save outputs and metrics per dataset and for experiment.
+    # Parquet reports are partitioned by dataset, a single one is written.
+    per_dataset_reports = report_format == "csv"
+    dataset_names = [
+        mapped_dataset.dataset.name for mapped_dataset in experiment.datasets
+    ]
+    experiment_columns = {
+        "stage": env_name,
+        "experiment_name": experiment.name,
+        "build": build_id,
+    }
     if save_output:
-        final_results_df = pd.concat(all_df, ignore_index=True)
-        final_results_df["stage"] = env_name
-        final_results_df["experiment_name"] = experiment.name
-        final_results_df["build"] = build_id
-        final_results_df.to_csv(f"./{report_dir}/{experiment.name}_result.csv")
-        styled_df = final_results_df.to_html(index=False)
-        with open(
-            f"{report_dir}/{experiment.name}_result.html", "w"
-        ) as results:
-            results.write(styled_df)
+        for dataset_name in dataset_names if per_dataset_reports else []:
+            report_writer.write_report(f"{dataset_name}_result")
+        report_writer.write_report(
+            f"{experiment.name}_result",
+            [f"{dataset_name}_result" for dataset_name in dataset_names],
+            experiment_columns,
+        )
         logger.info(f"Saved the results in files in {report_dir} folder")
 
     if save_metric:
-        final_metrics_df = pd.concat(all_metrics, ignore_index=True)
-        final_metrics_df.to_csv(
-            f"./{report_dir}/{experiment.name}_metrics.csv"
+        for dataset_name in dataset_names if per_dataset_reports else []:
+            report_writer.write_report(f"{dataset_name}_metrics")
+        report_writer.write_report(
+            f"{experiment.name}_metrics",
+            [f"{dataset_name}_metrics" for dataset_name in dataset_names],
         )
-        html_table_metrics = final_metrics_df.to_html(index=False)
-        with open(
-            f"{report_dir}/{experiment.name}_metrics.html", "w"
-        ) as f_metrics:
-            f_metrics.write(html_table_metrics)
-
         logger.info(f"Saved the metrics in files in {report_dir} folder")
 
 
-def main():
+def _append_run_report(
+    report_writer: StreamingReportWriter,
+    planned_run: PlannedRun,
+    df_result: pd.DataFrame,
+    save_output: bool,
+    save_metric: bool,
+    experiment_name: str,
+    build_id: Optional[str],
+):
+    """
+    Append the details of a completed run to the dataset reports.
+
+    :param report_writer: Writer of the experiment reports.
+    :type report_writer: StreamingReportWriter
+    :param planned_run: The completed run.
+    :type planned_run: PlannedRun
+    :param df_result: Details of the run.
+    :type df_result: pd.DataFrame
+    :param save_output: Append the details to <dataset>_result.
+    :type save_output: bool
+    :param save_metric: Append the details with the variants and the
+    dataset name to <dataset>_metrics.
+    :type save_metric: bool
+    :param experiment_name: Name of the experiment, used as partition.
+    :type experiment_name: str
+    :param build_id: Build identifier, used as partition.
+    :type build_id: Optional[str]
+    """
+    dataset_name = planned_run.mapped_dataset.dataset.name
+    partition = {
+        "experiment": experiment_name,
+        "dataset": dataset_name,
+        "variant": planned_run.variant_label or "defaults",
+        "build_id": build_id,
+    }
+    if save_metric:
+        if planned_run.grid:
+            for node_id, variant_id in planned_run.combination.items():
+                df_result[node_id] = variant_id
+        elif planned_run.variant_id:
+            df_result[planned_run.variant_id] = planned_run.variant_string
+        df_result["dataset"] = dataset_name
+        report_writer.append(f"{dataset_name}_metrics", df_result, partition)
+    if save_output:
+        report_writer.append(f"{dataset_name}_result", df_result, partition)
+
+
+def main(argv: Optional[List[str]] = None):
     """
     Run experimentation loop by executing standard Prompt Flows.
 
@@ -511,7 +879,10 @@ def main():
     parser.add_argument(
         "--variants",
         type=str,
-        help="Variants to run. (* for all, defaults, or comma separated list)",
+        help=(
+            "Variants to run. (* for all, defaults, grid for every "
+            "combination, or comma separated list)"
+        ),
         default="*",
     )
     parser.add_argument(
@@ -559,7 +930,110 @@ def main():
         required=False,
         action="store_true",
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--max_parallel_runs",
+        type=int,
+        help="Maximum number of variant/dataset runs executed in parallel",
+        default=1,
+    )
+    parser.add_argument(
+        "--grid_sample",
+        type=int,
+        help="Number of combinations randomly sampled in grid mode",
+        default=None,
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        help="Seed of the grid sampling, for reproducible samples",
+        default=None,
+    )
+    parser.add_argument(
+        "--halving_rows",
+        type=int,
+        help="Rows of the first successive halving round in grid mode",
+        default=None,
+    )
+    parser.add_argument(
+        "--halving_metric",
+        type=str,
+        help="Run metric or details column maximised by successive halving",
+        default=None,
+    )
+    parser.add_argument(
+        "--halving_eta",
+        type=int,
+        help="Successive halving reduction factor",
+        default=2,
+    )
+    parser.add_argument(
+        "--halving_keep",
+        type=int,
+        help="Combinations promoted to the full datasets",
+        default=1,
+    )
+    parser.add_argument(
+        "--dry_run",
+        help="List the planned runs without executing them",
+        required=False,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--run_cache_dir",
+        type=str,
+        help="Folder of the run cache, unchanged runs are not re-executed",
+        default=None,
+    )
+    parser.add_argument(
+        "--report_format",
+        type=str,
+        choices=["csv", "parquet"],
+        help="Format of the saved outputs and metrics",
+        default="csv",
+    )
+    parser.add_argument(
+        "--skip_html",
+        help="Don't render the reports in html format",
+        required=False,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--html_page_size",
+        type=int,
+        help="Number of rows per html report page",
+        default=None,
+    )
+    parser.add_argument(
+        "--checkpoint_file",
+        type=str,
+        help="Checkpoint manifest, default is in the report dir",
+        default=None,
+    )
+    parser.add_argument(
+        "--resume",
+        help="Resume an interrupted execution from its checkpoint",
+        required=False,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--submit_async",
+        help="Submit all runs without streaming and poll their status",
+        required=False,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--poll_timeout",
+        type=float,
+        help="Seconds to wait for runs submitted with --submit_async",
+        default=None,
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        help="Number of row shards of every local dataset run in parallel",
+        default=1,
+    )
+    args = parser.parse_args(argv)
 
     prepare_and_execute(
         VariantsSelector.from_args(args.variants),
@@ -572,6 +1046,23 @@ def main():
         args.output_file,
         args.save_output,
         args.save_metric,
+        args.max_parallel_runs,
+        args.run_cache_dir,
+        args.dry_run,
+        args.grid_sample,
+        args.seed,
+        args.halving_rows,
+        args.halving_metric,
+        args.halving_eta,
+        args.halving_keep,
+        args.report_format,
+        args.skip_html,
+        args.html_page_size,
+        args.checkpoint_file,
+        args.resume,
+        args.submit_async,
+        args.poll_timeout,
+        args.shards,
     )
 
 
@@ -13,15 +13,10 @@ for execution or deployment.
 """
 
 import argparse
-import hashlib
 from dotenv import load_dotenv
-from typing import Optional
-
-from azure.ai.ml import MLClient
-from azure.ai.ml.entities import Data as AMLData
-from azure.ai.ml.constants import AssetTypes as AMLAssetTypes
-from azure.identity import DefaultAzureCredential
+from typing import List, Optional
 
+from llmops.common.common import generate_file_hash
 from llmops.common.experiment_cloud_config import ExperimentCloudConfig
 from llmops.common.experiment import load_experiment
 from llmops.common.logger import llmops_logger
@@ -30,22 +25,6 @@ from llmops.common.logger import llmops_logger
 logger = llmops_logger("register_data_asset")
 
 
-def generate_file_hash(file_path):
-    """
-    Generate hash of a file.
-
-    Returns:
-        hash as string
-    """
-    sha256 = hashlib.sha256()
-
-    with open(file_path, "rb") as file:
-        file_content = file.read()
-        sha256.update(file_content)
-
-    return sha256.hexdigest()
-
-
 def register_data_asset(
     base_path: str,
     exp_filename: Optional[str] = None,
@@ -53,6 +32,10 @@ def register_data_asset(
     env_name: Optional[str] = None,
 ):
     """Register data assets in Azure ML."""
+    from azure.ai.ml.entities import Data as AMLData
+    from azure.ai.ml.constants import AssetTypes as AMLAssetTypes
+    from llmops.common.clients import get_ml_client
+
     config = ExperimentCloudConfig(
         subscription_id=subscription_id, env_name=env_name
     )
@@ -61,11 +44,10 @@ def register_data_asset(
         filename=exp_filename, base_path=base_path, env=config.environment_name
     )
 
-    ml_client = MLClient(
-        subscription_id=config.subscription_id,
-        resource_group_name=config.resource_group_name,
-        workspace_name=config.workspace_name,
-        credential=DefaultAzureCredential(),
+    ml_client = get_ml_client(
+        config.subscription_id,
+        config.resource_group_name,
+        config.workspace_name,
     )
 
     # Get all used datasets
@@ -116,7 +98,7 @@ def register_data_asset(
             logger.info(aml_dataset.path)
 
 
-def main():
+def main(argv: Optional[List[str]] = None):
     """Entry main function to register data assets."""
     parser = argparse.ArgumentParser("register data assets")
     parser.add_argument(
@@ -145,7 +127,7 @@ def main():
         default=None,
     )
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     register_data_asset(
         args.base_path,
@@ -0,0 +1,490 @@
+"""
+Streaming report writer for experiment and evaluation results.
+
+Rows are appended to a JSON lines file in the report directory as soon as a
+run returns its details, so nothing is kept in memory and a late failure
+doesn't lose the results of completed runs. Reports are generated from these
+files at the end, reading them in fixed size chunks:
+- csv: <report_name>.csv
+- parquet: <report_name>.parquet/, a Parquet dataset partitioned by
+experiment, dataset, variant and build_id
+(experiment=<name>/dataset=<name>/variant=<label>/build_id=<id>/).
+It can be loaded with pandas.read_parquet or pyarrow.dataset.
+- html (optional): <report_name>.html, split in pages of a fixed number of
+rows if requested (<report_name>_page<n>.html).
+
+The parquet format requires the pyarrow package.
+
+The module contains the following classes:
+- StreamingReportWriter: Appends report rows and writes the reports.
+"""
+
+import json
+import math
+import os
+import shutil
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+from urllib.parse import quote
+
+import pandas as pd
+
+DEFAULT_CHUNK_SIZE = 1000
+REPORT_FORMATS = ("csv", "parquet")
+PARTITION_KEYS = ("experiment", "dataset", "variant", "build_id")
+
+# Partition value read back as null by pyarrow
+_NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+
+class StreamingReportWriter:
+    """
+    Appends report rows to JSON lines files and writes the reports.
+
+    Each report is identified by its name (example: <dataset>_result) and
+    stored in <report_dir>/<report_name>.jsonl. A report file is truncated
+    the first time rows are appended to it by the writer.
+
+    :param report_dir: The directory where the reports are stored.
+    It is created if it doesn't exist.
+    :type report_dir: str
+    :param chunk_size: Number of rows read at once when writing reports.
+    :type chunk_size: int
+    :param report_format: Format of the reports, csv or parquet.
+    :type report_format: str
+    :param write_html: Also write the reports in html format.
+    :type write_html: bool
+    :param html_page_size: Number of rows per html page.
+    Default is a single page.
+    :type html_page_size: Optional[int]
+    """
+
+    def __init__(
+        self,
+        report_dir: str,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        report_format: str = "csv",
+        write_html: bool = True,
+        html_page_size: Optional[int] = None,
+    ):
+        """Initialize StreamingReportWriter object."""
+        if report_format not in REPORT_FORMATS:
+            raise ValueError(
+                f"Invalid report format {report_format}, "
+                f"expected one of {', '.join(REPORT_FORMATS)}"
+            )
+        if html_page_size is not None and html_page_size < 1:
+            raise ValueError("html_page_size must be a positive number")
+        self.report_dir = report_dir
+        self.chunk_size = chunk_size
+        self.report_format = report_format
+        self.write_html = write_html
+        self.html_page_size = html_page_size
+        self._columns: Dict[str, List[str]] = {}
+        self._segments: Dict[str, List[Tuple[int, Dict[str, Any]]]] = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.report_dir, exist_ok=True)
+
+    def _path(self, report_name: str, extension: str) -> str:
+        return os.path.join(self.report_dir, f"{report_name}.{extension}")
+
+    @property
+    def report_names(self) -> List[str]:
+        """Names of the reports with appended rows, in creation order."""
+        return list(self._columns.keys())
+
+    def append(
+        self,
+        report_name: str,
+        rows: Union[pd.DataFrame, Dict[str, Any]],
+        partition: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        Append rows to a report.
+
+        :param report_name: Name of the report.
+        :type report_name: str
+        :param rows: Rows to append. A dictionary is appended as one row.
+        :type rows: Union[pd.DataFrame, Dict[str, Any]]
+        :param partition: Values of the partition keys (experiment, dataset,
+        variant, build_id) of the rows, used by the parquet format.
+        :type partition: Optional[Dict[str, Any]]
+        """
+        if isinstance(rows, dict):
+            rows = pd.DataFrame([rows])
+
+        with self._lock:
+            mode = "a" if report_name in self._columns else "w"
+            columns = self._columns.setdefault(report_name, [])
+            self._segments.setdefault(report_name, []).append(
+                (len(rows), partition or {})
+            )
+            with open(self._path(report_name, "jsonl"), mode) as report:
+                if len(rows) > 0:
+                    report.write(
+                        rows.to_json(orient="records", lines=True).rstrip()
+                    )
+                    report.write("\n")
+                report.flush()
+                os.fsync(report.fileno())
+            for column in rows.columns:
+                if column not in columns:
+                    columns.append(column)
+
+    def iter_chunks(
+        self,
+        report_names: List[str],
+        extra_columns: Optional[Dict[str, Any]] = None,
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Read the rows of one or more reports in chunks.
+
+        All chunks share the same columns: the union of the report columns
+        followed by the extra columns.
+
+        :param report_names: Names of the reports to read, in order.
+        :type report_names: List[str]
+        :param extra_columns: Constant columns added to every row.
+        :type extra_columns: Optional[Dict[str, Any]]
+        :return: Iterator of data frames with continuous indexes.
+        :rtype: Iterator[pd.DataFrame]
+        """
+        return self._iter_chunks(
+            report_names, self._union_columns(report_names), extra_columns
+        )
+
+    def _iter_chunks(
+        self,
+        report_names: List[str],
+        columns: List[str],
+        extra_columns: Optional[Dict[str, Any]] = None,
+    ) -> Iterator[pd.DataFrame]:
+        extra_columns = extra_columns or {}
+        offset = 0
+        for report_name in report_names:
+            path = self._path(report_name, "jsonl")
+            if not os.path.isfile(path) or os.path.getsize(path) == 0:
+                continue
+            with pd.read_json(
+                path,
+                orient="records",
+                lines=True,
+                chunksize=self.chunk_size,
+                dtype=False,
+                convert_dates=False,
+            ) as reader:
+                for chunk in reader:
+                    chunk = chunk.reindex(columns=columns)
+                    for key, value in extra_columns.items():
+                        chunk[key] = value
+                    chunk.index = range(offset, offset + len(chunk))
+                    offset += len(chunk)
+                    yield chunk
+
+    def write_report(
+        self,
+        report_name: str,
+        source_names: Optional[List[str]] = None,
+        extra_columns: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        Write a report in the configured formats.
+
+        :param report_name: Name of the generated report.
+        :type report_name: str
+        :param source_names: Reports combined in the generated report.
+        Default is the report with the same name.
+        :type source_names: Optional[List[str]]
+        :param extra_columns: Constant columns added to every row.
+        :type extra_columns: Optional[Dict[str, Any]]
+        """
+        source_names = source_names or [report_name]
+        columns = self._union_columns(source_names)
+        columns += [key for key in extra_columns or {} if key not in columns]
+
+        if self.report_format == "parquet":
+            self._write_parquet(
+                report_name, source_names, columns, extra_columns
+            )
+        else:
+            self._write_csv(report_name, source_names, columns, extra_columns)
+        if self.write_html:
+            self._write_html(report_name, source_names, columns, extra_columns)
+
+    def _write_csv(
+        self,
+        report_name: str,
+        source_names: List[str],
+        columns: List[str],
+        extra_columns: Optional[Dict[str, Any]],
+    ):
+        with open(self._path(report_name, "csv"), "w", newline="") as report:
+            header = True
+            for chunk in self._iter_chunks(
+                source_names, columns, extra_columns
+            ):
+                chunk.to_csv(report, header=header)
+                header = False
+            if header:
+                # No rows, write the header only
+                pd.DataFrame(columns=columns).to_csv(report)
+
+    def _write_html(
+        self,
+        report_name: str,
+        source_names: List[str],
+        columns: List[str],
+        extra_columns: Optional[Dict[str, Any]],
+    ):
+        row_count = sum(
+            count
+            for source_name in source_names
+            for count, _ in self._segments.get(source_name, [])
+        )
+        page_size = self.html_page_size or max(row_count, 1)
+        page_count = max(1, math.ceil(row_count / page_size))
+
+        page = _HtmlPage(
+            self._html_page_path(report_name, 1), 1, page_count, report_name
+        )
+        for chunk in self._iter_chunks(source_names, columns, extra_columns):
+            while len(chunk) > 0:
+                if page.row_count == page_size:
+                    page.close()
+                    page = _HtmlPage(
+                        self._html_page_path(report_name, page.number + 1),
+                        page.number + 1,
+                        page_count,
+                        report_name,
+                    )
+                rows = chunk.iloc[:page_size - page.row_count]
+                page.write(rows)
+                chunk = chunk.iloc[len(rows):]
+        if page.row_count == 0:
+            page.write(pd.DataFrame(columns=columns))
+        page.close()
+
+    def _html_page_path(self, report_name: str, number: int) -> str:
+        if number == 1:
+            return self._path(report_name, "html")
+        return self._path(f"{report_name}_page{number}", "html")
+
+    def _write_parquet(
+        self,
+        report_name: str,
+        source_names: List[str],
+        columns: List[str],
+        extra_columns: Optional[Dict[str, Any]],
+    ):
+        pa, pq = _import_pyarrow()
+
+        # Rows of a report can have different types in different chunks,
+        # the schema is computed from all of them first
+        kinds = {column: None for column in columns}
+        for chunk in self._iter_chunks(source_names, columns, extra_columns):
+            for column in columns:
+                kinds[column] = _merge_kinds(
+                    kinds[column], _column_kind(chunk[column])
+                )
+        data_columns = [
+            column for column in columns if column not in PARTITION_KEYS
+        ]
+        schema = pa.schema(
+            [
+                (column, _ARROW_TYPES[kinds[column] or "string"](pa))
+                for column in data_columns
+            ]
+        )
+
+        root = self._path(report_name, "parquet")
+        shutil.rmtree(root, ignore_errors=True)
+        writers = {}
+        try:
+            for rows, partition in self._iter_partitions(
+                source_names, columns, extra_columns
+            ):
+                values = tuple(
+                    _partition_value(partition.get(key))
+                    for key in PARTITION_KEYS
+                )
+                if values not in writers:
+                    partition_dir = os.path.join(
+                        root,
+                        *[
+                            f"{key}={value}"
+                            for key, value in zip(PARTITION_KEYS, values)
+                        ],
+                    )
+                    os.makedirs(partition_dir, exist_ok=True)
+                    writers[values] = pq.ParquetWriter(
+                        os.path.join(partition_dir, "part-0.parquet"), schema
+                    )
+                table = pa.Table.from_pandas(
+                    _normalize_columns(rows[data_columns], kinds),
+                    schema=schema,
+                    preserve_index=False,
+                )
+                writers[values].write_table(table)
+        finally:
+            for writer in writers.values():
+                writer.close()
+
+    def _iter_partitions(
+        self,
+        source_names: List[str],
+        columns: List[str],
+        extra_columns: Optional[Dict[str, Any]],
+    ) -> Iterator[Tuple[pd.DataFrame, Dict[str, Any]]]:
+        for source_name in source_names:
+            segments = iter(self._segments.get(source_name, []))
+            remaining, partition = 0, {}
+            for chunk in self._iter_chunks(
+                [source_name], columns, extra_columns
+            ):
+                while len(chunk) > 0:
+                    while remaining == 0:
+                        remaining, partition = next(segments)
+                    rows = chunk.iloc[:remaining]
+                    remaining -= len(rows)
+                    chunk = chunk.iloc[len(rows):]
+                    yield rows, partition
+
+    def _union_columns(self, report_names: List[str]) -> List[str]:
+        columns: List[str] = []
+        for report_name in report_names:
+            for column in self._columns.get(report_name, []):
+                if column not in columns:
+                    columns.append(column)
+        return columns
+
+
+def _split_html(html: str):
+    """Split a pandas HTML table into head, body rows and tail."""
+    head, rest = html.split("<tbody>", 1)
+    body, tail = rest.rsplit("</tbody>", 1)
+    return f"{head}<tbody>", body, f"</tbody>{tail}"
+
+
+class _HtmlPage:
+    """One page of an html report, written chunk by chunk."""
+
+    def __init__(
+        self, path: str, number: int, page_count: int, report_name: str
+    ):
+        """Open the page and write the navigation links."""
+        self.number = number
+        self.row_count = 0
+        self._file = open(path, "w")
+        self._tail = None
+        self._navigation = ""
+        if page_count > 1:
+            links = [f"Page {number} of {page_count}"]
+            if number > 1:
+                previous = (
+                    f"{report_name}.html"
+                    if number == 2
+                    else f"{report_name}_page{number - 1}.html"
+                )
+                links.append(f'<a href="{quote(previous)}">Previous</a>')
+            if number < page_count:
+                links.append(
+                    f'<a href="{quote(report_name)}_page{number + 1}.html">'
+                    "Next</a>"
+                )
+            self._navigation = f"<p>{' | '.join(links)}</p>\n"
+        self._file.write(self._navigation)
+
+    def write(self, rows: pd.DataFrame):
+        """Append rows to the page table."""
+        head, body, tail = _split_html(rows.to_html(index=False))
+        if self._tail is None:
+            self._file.write(head)
+        self._file.write(body)
+        self._tail = tail
+        self.row_count += len(rows)
+
+    def close(self):
+        """Close the table and the page."""
+        self._file.write(self._tail or "")
+        self._file.write(f"\n{self._navigation}")
+        self._file.close()
+
+
+_ARROW_TYPES = {
+    "bool": lambda pa: pa.bool_(),
+    "int": lambda pa: pa.int64(),
+    "float": lambda pa: pa.float64(),
+    "string": lambda pa: pa.string(),
+}
+
+
+def _import_pyarrow():
+    """Import pyarrow, only required by the parquet format."""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as error:
+        raise ValueError(
+            "The parquet report format requires the pyarrow package "
+            "(pip install pyarrow)"
+        ) from error
+    return pyarrow, pyarrow.parquet
+
+
+def _column_kind(column: pd.Series) -> Optional[str]:
+    """Get the kind of values of a column, None if all are null."""
+    values = column.dropna()
+    if len(values) == 0:
+        return None
+    if pd.api.types.is_bool_dtype(values):
+        return "bool"
+    if pd.api.types.is_integer_dtype(values):
+        return "int"
+    if pd.api.types.is_float_dtype(values):
+        return "float"
+    return "string"
+
+
+def _merge_kinds(kind: Optional[str], other: Optional[str]) -> Optional[str]:
+    """Get the kind able to store the values of both kinds."""
+    if kind is None or kind == other:
+        return other
+    if other is None:
+        return kind
+    if {kind, other} == {"int", "float"}:
+        return "float"
+    return "string"
+
+
+def _to_string(value: Any) -> Optional[str]:
+    """Convert a value to string, nested values are stored as JSON."""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return str(value)
+
+
+def _normalize_columns(
+    rows: pd.DataFrame, kinds: Dict[str, Optional[str]]
+) -> pd.DataFrame:
+    """Convert the columns of a chunk to the types of the report schema."""
+    rows = rows.copy()
+    for column in rows.columns:
+        kind = kinds[column] or "string"
+        if kind == "bool":
+            rows[column] = rows[column].astype("boolean")
+        elif kind == "int":
+            rows[column] = rows[column].astype("Int64")
+        elif kind == "float":
+            rows[column] = pd.to_numeric(rows[column]).astype("float64")
+        else:
+            rows[column] = rows[column].map(_to_string).astype(object)
+    return rows
+
+
+def _partition_value(value: Any) -> str:
+    """Encode a partition value as a hive directory name."""
+    if value is None:
+        return _NULL_PARTITION
+    return quote(str(value), safe="")
@@ -0,0 +1,162 @@
+"""
+Content-addressed cache of standard flow runs.
+
+A run is identified by everything that can change its outputs: the content
+of the flow folder, the selected variant, the dataset content, the column
+mapping, the environment variables and the flow init parameters. When a run
+with the same key already completed, its run ID and details are reused
+instead of executing the flow again.
+
+The cache is stored in a local folder, one metadata file and one details
+file per run key:
+- <key>.json: run name, status and creation time.
+- <key>.jsonl: run details (one line per data row).
+"""
+
+import datetime
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+_COMPLETED_STATUSES = ("Completed", "Finished")
+
+
+def compute_run_key(
+    flow_hash: str,
+    variant: Optional[str],
+    data_hash: str,
+    column_mapping: Optional[Dict[str, str]],
+    environment_variables: Optional[Dict[str, str]] = None,
+    init: Optional[Dict[str, Any]] = None,
+    execution_type: Optional[str] = None,
+) -> str:
+    """
+    Compute the cache key of a run.
+
+    :param flow_hash: Hash of the flow folder.
+    :type flow_hash: str
+    :param variant: Variant reference (example: ${node.variant_0}),
+    None when running the default variants.
+    :type variant: Optional[str]
+    :param data_hash: Hash of the local dataset file or versioned
+    reference of the remote dataset (example: azureml:name:1).
+    :type data_hash: str
+    :param column_mapping: Column mapping of the run.
+    :type column_mapping: Optional[Dict[str, str]]
+    :param environment_variables: Environment variables of the run.
+    :type environment_variables: Optional[Dict[str, str]]
+    :param init: Init parameters of class based flows.
+    :type init: Optional[Dict[str, Any]]
+    :param execution_type: Execution type (LOCAL or AZURE), run IDs are
+    only valid for the backend that created them.
+    :type execution_type: Optional[str]
+    :return: Hex digest identifying the run.
+    :rtype: str
+    """
+    payload = json.dumps(
+        {
+            "flow": flow_hash,
+            "variant": variant or "",
+            "data": data_hash,
+            "column_mapping": column_mapping or {},
+            "environment_variables": environment_variables or {},
+            "init": init or {},
+            "execution_type": execution_type or "",
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CachedRun:
+    """
+    Run restored from the run cache.
+
+    :param name: Name (ID) of the cached run.
+    :type name: str
+    :param status: Status of the run when it was cached.
+    :type status: str
+    :param details: Details of the run, as returned by get_details.
+    :type details: pd.DataFrame
+    """
+
+    def __init__(self, name: str, status: str, details: pd.DataFrame):
+        """Initialize CachedRun object."""
+        self.name = name
+        self.status = status
+        self.details = details
+
+
+class RunCache:
+    """
+    Persistent local cache of completed runs.
+
+    :param cache_dir: Folder where cache entries are stored.
+    It is created if it doesn't exist.
+    :type cache_dir: str
+    """
+
+    def __init__(self, cache_dir: str):
+        """Initialize RunCache object."""
+        self.cache_dir = cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, key: str, extension: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.{extension}")
+
+    def get(self, key: str) -> Optional[CachedRun]:
+        """Get the cached run for the key, None if not found."""
+        meta_path = self._path(key, "json")
+        details_path = self._path(key, "jsonl")
+        if not (os.path.isfile(meta_path) and os.path.isfile(details_path)):
+            return None
+        try:
+            with open(meta_path, "r") as meta_file:
+                meta = json.load(meta_file)
+            details = pd.read_json(details_path, orient="records", lines=True)
+        except (OSError, ValueError):
+            # Corrupted entries are treated as cache misses
+            return None
+        return CachedRun(meta["run_name"], meta["status"], details)
+
+    def put(
+        self,
+        key: str,
+        run_name: str,
+        status: str,
+        details: pd.DataFrame,
+    ) -> bool:
+        """
+        Store a run in the cache.
+
+        Only completed runs are stored.
+
+        :return: True if the run was stored.
+        :rtype: bool
+        """
+        if status not in _COMPLETED_STATUSES:
+            return False
+
+        # Write details first, the metadata file marks the entry as valid
+        details_path = self._path(key, "jsonl")
+        details.to_json(
+            f"{details_path}.tmp", orient="records", lines=True
+        )
+        os.replace(f"{details_path}.tmp", details_path)
+
+        meta_path = self._path(key, "json")
+        with open(f"{meta_path}.tmp", "w") as meta_file:
+            json.dump(
+                {
+                    "run_name": run_name,
+                    "status": status,
+                    "created": datetime.datetime.now().isoformat(),
+                },
+                meta_file,
+            )
+        os.replace(f"{meta_path}.tmp", meta_path)
+        return True
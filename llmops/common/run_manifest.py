@@ -0,0 +1,140 @@
+"""
+Checkpoint manifest of the standard flow runs of an experiment.
+
+The manifest records, for every planned variant/dataset run, the name of the
+run submitted for it and whether it completed. It is rewritten atomically
+(temporary file and rename) after every change, so an interrupted execution
+can be resumed: completed runs are reused and runs that were still in
+progress are attached to again instead of being submitted twice.
+
+Example of manifest file:
+{
+    "experiment": "web_classification",
+    "runs": {
+        "dataset|node.variant_0": {
+            "run_name": "web_classification_variant_0_...",
+            "status": "Completed",
+            "updated": "2024-05-01T10:00:00"
+        }
+    }
+}
+
+The runs of a dataset split in shards are recorded shard by shard, with the
+shard index in their key (example: "dataset|node.variant_0|shard1").
+"""
+
+import datetime
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from llmops.common.run_planner import PlannedRun, variant_combination_key
+from llmops.common.run_poller import COMPLETED_STATUSES
+
+SUBMITTED = "Submitted"
+
+
+def checkpoint_key(
+    planned_run: PlannedRun, shard_index: Optional[int] = None
+) -> str:
+    """
+    Get the manifest key of a planned run.
+
+    The key is independent of the run name, which changes at every
+    execution.
+
+    :param planned_run: Planned run.
+    :type planned_run: PlannedRun
+    :param shard_index: Index of the shard for the runs of a dataset split
+    in shards.
+    :type shard_index: Optional[int]
+    :return: Dataset name and variant combination of the run, and shard
+    index.
+    :rtype: str
+    """
+    combination = ",".join(
+        f"{node}.{variant}"
+        for node, variant in variant_combination_key(planned_run.combination)
+    )
+    key = f"{planned_run.mapped_dataset.dataset.name}|{combination}"
+    if shard_index is not None:
+        key = f"{key}|shard{shard_index}"
+    return key
+
+
+class RunManifest:
+    """
+    Checkpoint manifest of the runs of an experiment.
+
+    :param path: Path of the manifest file.
+    :type path: str
+    :param experiment_name: Name of the experiment.
+    :type experiment_name: str
+    :param resume: Load the entries of an existing manifest. Otherwise the
+    manifest starts empty and overwrites any existing file.
+    :type resume: bool
+    """
+
+    def __init__(self, path: str, experiment_name: str, resume: bool = False):
+        """Initialize RunManifest object."""
+        self.path = path
+        self.experiment_name = experiment_name
+        self._runs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+        if resume and os.path.isfile(path):
+            with open(path, "r") as manifest_file:
+                manifest = json.load(manifest_file)
+            if manifest.get("experiment") != experiment_name:
+                raise ValueError(
+                    f"Manifest {path} belongs to experiment "
+                    f"{manifest.get('experiment')}, not {experiment_name}"
+                )
+            self._runs = manifest.get("runs", {})
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            self._save()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get the entry of a planned run, None if not recorded."""
+        with self._lock:
+            entry = self._runs.get(key)
+            return dict(entry) if entry else None
+
+    def is_completed(self, key: str) -> bool:
+        """Check if the run of the key completed."""
+        entry = self.get(key)
+        return entry is not None and entry["status"] in COMPLETED_STATUSES
+
+    def mark_submitted(self, key: str, run_name: str):
+        """Record the submission of a run, before waiting for it."""
+        self._update(key, run_name, SUBMITTED)
+
+    def mark_finished(self, key: str, run_name: str, status: str):
+        """Record the final status of a run."""
+        self._update(key, run_name, status)
+
+    def _update(self, key: str, run_name: str, status: str):
+        with self._lock:
+            self._runs[key] = {
+                "run_name": run_name,
+                "status": status,
+                "updated": datetime.datetime.now().isoformat(),
+            }
+            self._save()
+
+    def _save(self):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as manifest_file:
+            json.dump(
+                {"experiment": self.experiment_name, "runs": self._runs},
+                manifest_file,
+                indent=4,
+            )
+            manifest_file.flush()
+            os.fsync(manifest_file.fileno())
+        os.replace(temp_path, self.path)
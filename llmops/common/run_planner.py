@@ -0,0 +1,396 @@
+"""
+This module plans the standard flow runs of an experiment.
+
+The plan is computed before anything executes. Each planned run is a unique
+combination of node variants and dataset. Combinations are identified by a
+canonical, hashable key so duplicates are detected in constant time.
+
+The module contains the following classes:
+- VariantsSelector: Selects the variants to run.
+- PlannedRun: A standard flow run waiting to be submitted.
+
+The module contains the following functions:
+- variant_combination_key: Canonical key of a variant combination.
+- grid_combinations: Cartesian product of the variants of all nodes.
+- sample_combinations: Random subset of variant combinations.
+- successive_halving: Prune combinations on growing data slices.
+- plan_runs: Build the de-duplicated run matrix of an experiment.
+- format_run_plan: Describe a run plan, one line per run.
+"""
+
+import itertools
+import math
+import random
+from enum import Enum
+from typing import Callable, Dict, List, Optional, Tuple
+
+from llmops.common.experiment import FlowDetail, MappedDataset
+
+VariantCombinationKey = Tuple[Tuple[str, str], ...]
+
+
+def variant_combination_key(
+    combination: Dict[str, str]
+) -> VariantCombinationKey:
+    """
+    Get the canonical key of a variant combination.
+
+    :param combination: Dictionary from node name to variant name.
+    :type combination: Dict[str, str]
+    :return: Hashable key, independent of the dictionary order.
+    :rtype: VariantCombinationKey
+    """
+    return tuple(sorted(combination.items()))
+
+
+class VariantsSelector:
+    """Selects the variants to run. Options are default, all or custom."""
+
+    class VariantSelectionOption(Enum):
+        """provide enum options for variant selection."""
+
+        DEFAULTS_ONLY = 1
+        ALL = 2
+        CUSTOM = 3
+        GRID = 4
+
+    def __init__(
+        self,
+        selector: VariantSelectionOption,
+        selected_variants: Optional[list[str]] = None,
+    ):
+        """Store for variants and option."""
+        self._selector = selector
+        self._selected_variants = selected_variants or []
+
+    @property
+    def defaults_only(self) -> bool:
+        """Compare if default variant is selected."""
+        return self._selector == self.VariantSelectionOption.DEFAULTS_ONLY
+
+    @property
+    def grid(self) -> bool:
+        """Compare if the cartesian product of all variants is selected."""
+        return self._selector == self.VariantSelectionOption.GRID
+
+    def is_variant_enabled(self, node: str, variant: str) -> bool:
+        """Check if the variant is enabled."""
+        if self._selector in [
+            VariantsSelector.VariantSelectionOption.DEFAULTS_ONLY,
+            VariantsSelector.VariantSelectionOption.ALL,
+            VariantsSelector.VariantSelectionOption.GRID,
+        ]:
+            return True
+
+        for selected_variant in self._selected_variants:
+            if selected_variant in (variant, f"{node}.{variant}"):
+                return True
+        return False
+
+    @classmethod
+    def from_args(cls, variants: str):
+        """Parse the variants from the command line arguments."""
+        variants = variants.strip().lower()
+        if variants in ["*", "all"]:
+            return cls(cls.VariantSelectionOption.ALL)
+        if variants in ["defaults", "default"]:
+            return cls(cls.VariantSelectionOption.DEFAULTS_ONLY)
+        if variants == "grid":
+            return cls(cls.VariantSelectionOption.GRID)
+        return cls(
+            cls.VariantSelectionOption.CUSTOM,
+            [v.strip() for v in variants.split(",")]
+        )
+
+
+class PlannedRun:
+    """
+    A standard flow run waiting to be submitted.
+
+    :param run_name: Unique name of the run.
+    :type run_name: str
+    :param mapped_dataset: Dataset and column mapping used by the run.
+    :type mapped_dataset: MappedDataset
+    :param combination: Dictionary from node name to the variant used by
+    the run. Empty when the flow has no variants.
+    :type combination: Dict[str, str]
+    :param node_id: Node whose variant differs from the defaults,
+    None for default variants.
+    :type node_id: Optional[str]
+    :param variant_id: Variant selected for the node, None for defaults.
+    :type variant_id: Optional[str]
+    :param grid: True if the run uses a combination of variants of several
+    nodes, which prompt flow can't select with a single variant reference.
+    :type grid: bool
+    :param tags: Run tags added to the build tags, None for no tags.
+    :type tags: Optional[Dict[str, str]]
+    """
+
+    def __init__(
+        self,
+        run_name: str,
+        mapped_dataset: MappedDataset,
+        combination: Dict[str, str],
+        node_id: Optional[str] = None,
+        variant_id: Optional[str] = None,
+        grid: bool = False,
+        tags: Optional[Dict[str, str]] = None,
+    ):
+        """Initialize PlannedRun object."""
+        self.run_name = run_name
+        self.mapped_dataset = mapped_dataset
+        self.combination = combination
+        self.node_id = node_id
+        self.variant_id = variant_id
+        self.grid = grid
+        self.tags = tags or {}
+
+    @property
+    def variant_string(self) -> Optional[str]:
+        """Variant reference passed to prompt flow (${node.variant})."""
+        if self.node_id is None:
+            return None
+        return f"${{{self.node_id}.{self.variant_id}}}"
+
+    @property
+    def variant_label(self) -> Optional[str]:
+        """Description of the variants used by the run."""
+        if self.grid:
+            return ",".join(
+                f"{node}.{variant}"
+                for node, variant in variant_combination_key(self.combination)
+            )
+        return self.variant_string
+
+    @property
+    def key(self) -> Tuple[str, VariantCombinationKey]:
+        """Unique key of the run: dataset and variant combination."""
+        return (
+            self.mapped_dataset.dataset.name,
+            variant_combination_key(self.combination),
+        )
+
+
+def grid_combinations(flow_detail: FlowDetail) -> List[Dict[str, str]]:
+    """
+    Get the cartesian product of the variants of all nodes.
+
+    :param flow_detail: Details of the standard flow.
+    :type flow_detail: FlowDetail
+    :return: List of dictionaries from node name to variant name.
+    :rtype: List[Dict[str, str]]
+    """
+    node_variants: Dict[str, List[str]] = {}
+    for variant in flow_detail.all_variants:
+        for variant_id, node_id in variant.items():
+            node_variants.setdefault(node_id, []).append(variant_id)
+
+    nodes = list(node_variants.keys())
+    return [
+        dict(zip(nodes, variants))
+        for variants in itertools.product(*node_variants.values())
+    ]
+
+
+def sample_combinations(
+    combinations: List[Dict[str, str]],
+    sample_size: int,
+    seed: Optional[int] = None,
+) -> List[Dict[str, str]]:
+    """
+    Get a random subset of variant combinations.
+
+    :param combinations: Variant combinations.
+    :type combinations: List[Dict[str, str]]
+    :param sample_size: Number of combinations to keep.
+    :type sample_size: int
+    :param seed: Seed of the random generator, for reproducible samples.
+    :type seed: Optional[int]
+    :return: Sampled combinations, in their original order.
+    :rtype: List[Dict[str, str]]
+    """
+    if sample_size >= len(combinations):
+        return list(combinations)
+    indexes = random.Random(seed).sample(range(len(combinations)), sample_size)
+    return [combinations[index] for index in sorted(indexes)]
+
+
+def successive_halving(
+    combinations: List[Dict[str, str]],
+    score_combinations: Callable[[List[Dict[str, str]], int], List[float]],
+    min_rows: int,
+    max_rows: int,
+    eta: int = 2,
+    keep: int = 1,
+) -> List[Dict[str, str]]:
+    """
+    Prune variant combinations by evaluating them on growing data slices.
+
+    All combinations are scored on the first min_rows rows. Only the best
+    1/eta of them are kept and scored again on eta times more rows, until
+    keep combinations remain or the slice covers max_rows rows.
+
+    :param combinations: Variant combinations.
+    :type combinations: List[Dict[str, str]]
+    :param score_combinations: Function scoring combinations on the first
+    rows of the data, higher scores are better.
+    :type score_combinations: Callable[[List[Dict[str, str]], int],
+    List[float]]
+    :param min_rows: Number of rows used in the first round.
+    :type min_rows: int
+    :param max_rows: Number of rows in the dataset.
+    :type max_rows: int
+    :param eta: Reduction factor applied at each round.
+    :type eta: int
+    :param keep: Number of combinations to promote.
+    :type keep: int
+    :return: Promoted combinations, in their original order.
+    :rtype: List[Dict[str, str]]
+    """
+    if eta < 2:
+        raise ValueError("Successive halving requires eta >= 2")
+
+    rows = max(1, min_rows)
+    while len(combinations) > keep and rows < max_rows:
+        scores = [
+            -math.inf if score is None or math.isnan(score) else score
+            for score in score_combinations(combinations, rows)
+        ]
+        n_keep = max(keep, math.ceil(len(combinations) / eta))
+        ranking = sorted(
+            range(len(combinations)), key=lambda i: scores[i], reverse=True
+        )
+        combinations = [
+            combinations[index] for index in sorted(ranking[:n_keep])
+        ]
+        rows *= eta
+    return combinations
+
+
+def plan_runs(
+    experiment_name: str,
+    mapped_datasets: List[MappedDataset],
+    flow_detail: FlowDetail,
+    variants_selector: VariantsSelector,
+    timestamp: str,
+    combinations: Optional[List[Dict[str, str]]] = None,
+) -> List[PlannedRun]:
+    """
+    Build the de-duplicated run matrix of an experiment.
+
+    Each enabled variant is combined with the default variants of the other
+    nodes, for every dataset. A combination that was already planned for
+    the same dataset (for example the default variant of each node) is only
+    planned once.
+
+    In grid mode, every combination of node variants is planned instead,
+    or only the given combinations if provided.
+
+    :param experiment_name: Name of the experiment, used in run names.
+    :type experiment_name: str
+    :param mapped_datasets: Datasets used by the experiment.
+    :type mapped_datasets: List[MappedDataset]
+    :param flow_detail: Details of the standard flow.
+    :type flow_detail: FlowDetail
+    :param variants_selector: Selector of the variants to run.
+    :type variants_selector: VariantsSelector
+    :param timestamp: Timestamp used in run names.
+    :type timestamp: str
+    :param combinations: Variant combinations planned in grid mode.
+    Default is the cartesian product of all variants.
+    :type combinations: Optional[List[Dict[str, str]]]
+    :return: Planned runs, in execution order.
+    :rtype: List[PlannedRun]
+    """
+    planned_runs: List[PlannedRun] = []
+    planned_keys = set()
+    used_run_names = set()
+    default_variants = flow_detail.default_variants
+
+    if variants_selector.grid and len(flow_detail.all_variants) != 0:
+        if combinations is None:
+            combinations = grid_combinations(flow_detail)
+        for mapped_dataset in mapped_datasets:
+            for index, combination in enumerate(combinations):
+                planned_run = PlannedRun(
+                    f"{experiment_name}_grid{index}_{timestamp}_"
+                    f"{mapped_dataset.dataset.name}",
+                    mapped_dataset,
+                    {**default_variants, **combination},
+                    grid=True,
+                )
+                if planned_run.key in planned_keys:
+                    continue
+                planned_keys.add(planned_run.key)
+                planned_runs.append(planned_run)
+        return planned_runs
+
+    for mapped_dataset in mapped_datasets:
+        dataset = mapped_dataset.dataset
+
+        if (
+            len(flow_detail.all_variants) == 0
+            or variants_selector.defaults_only
+        ):
+            run_name = f"{experiment_name}_{timestamp}_{dataset.name}"
+            used_run_names.add(run_name)
+            planned_runs.append(
+                PlannedRun(run_name, mapped_dataset, dict(default_variants))
+            )
+            continue
+
+        for variant in flow_detail.all_variants:
+            for variant_id, node_id in variant.items():
+                if not variants_selector.is_variant_enabled(
+                    node_id, variant_id
+                ):
+                    continue
+                combination = dict(default_variants)
+                combination[node_id] = variant_id
+
+                # This validates that we are not running the same
+                # combination of variants more than once
+                planned_run = PlannedRun(
+                    f"{experiment_name}_{variant_id}_{timestamp}_"
+                    f"{dataset.name}",
+                    mapped_dataset,
+                    combination,
+                    node_id,
+                    variant_id,
+                )
+                if planned_run.key in planned_keys:
+                    continue
+                planned_keys.add(planned_run.key)
+
+                # Nodes commonly share variant ids (variant_0, ...)
+                if planned_run.run_name in used_run_names:
+                    planned_run.run_name = f"{planned_run.run_name}_{node_id}"
+                used_run_names.add(planned_run.run_name)
+                planned_runs.append(planned_run)
+
+    return planned_runs
+
+
+def format_run_plan(planned_runs: List[PlannedRun]) -> str:
+    """
+    Describe a run plan, one line per run.
+
+    :param planned_runs: Planned runs.
+    :type planned_runs: List[PlannedRun]
+    :return: Human readable description of the plan.
+    :rtype: str
+    """
+    lines = [f"{len(planned_runs)} planned runs:"]
+    for index, planned_run in enumerate(planned_runs):
+        combination = ", ".join(
+            f"{node}.{variant}"
+            for node, variant in variant_combination_key(
+                planned_run.combination
+            )
+        ) or "defaults"
+        lines.append(
+            f"  {index + 1}. {planned_run.run_name} "
+            f"[dataset={planned_run.mapped_dataset.dataset.name}; "
+            f"{combination}]"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,111 @@
+"""
+Poll the status of submitted prompt flow runs.
+
+Runs submitted without streaming are tracked by a single poller instead of a
+blocking process per run. Statuses are refreshed with an exponential backoff
+between polling rounds, and every run is returned as soon as it reaches a
+final status.
+
+The module contains the following classes:
+- RunPoller: Waits for a set of runs with exponential backoff.
+"""
+
+import logging
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+COMPLETED_STATUSES = ("Completed", "Finished")
+FINAL_STATUSES = COMPLETED_STATUSES + ("Failed", "Canceled")
+
+
+class RunPoller:
+    """
+    Waits for a set of runs with exponential backoff.
+
+    :param get_run: Function returning the up to date run of a run name,
+    for example PFClient.runs.get.
+    :type get_run: Callable[[str], Any]
+    :param logger: The used logger.
+    :type logger: logging.Logger
+    :param initial_delay: Seconds between the first polling rounds.
+    :type initial_delay: float
+    :param max_delay: Maximum number of seconds between polling rounds.
+    :type max_delay: float
+    :param backoff: Factor applied to the delay after every round.
+    :type backoff: float
+    :param timeout: Maximum number of seconds to wait, no limit if None.
+    :type timeout: Optional[float]
+    :param sleep: Function used to wait between rounds.
+    Default is time.sleep.
+    :type sleep: Optional[Callable[[float], None]]
+    """
+
+    def __init__(
+        self,
+        get_run: Callable[[str], Any],
+        logger: logging.Logger,
+        initial_delay: float = 5.0,
+        max_delay: float = 60.0,
+        backoff: float = 2.0,
+        timeout: Optional[float] = None,
+        sleep: Optional[Callable[[float], None]] = None,
+    ):
+        """Initialize RunPoller object."""
+        self.get_run = get_run
+        self.logger = logger
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.timeout = timeout
+        self.sleep = sleep or (lambda seconds: time.sleep(seconds))
+
+    def wait(self, run_names: List[str]) -> Iterator[Any]:
+        """
+        Wait for runs to reach a final status.
+
+        :param run_names: Names of the runs to wait for.
+        :type run_names: List[str]
+        :return: Iterator of runs, in the order they finish. Runs can have
+        a failed or canceled status.
+        :rtype: Iterator[Any]
+        :raises TimeoutError: If runs are still running after the timeout.
+        """
+        pending = list(dict.fromkeys(run_names))
+        total = len(pending)
+        delay = self.initial_delay
+        start = time.monotonic()
+
+        while pending:
+            statuses: Dict[str, int] = {}
+            still_pending = []
+            for run_name in pending:
+                run = self.get_run(run_name)
+                statuses[run.status] = statuses.get(run.status, 0) + 1
+                if run.status in FINAL_STATUSES:
+                    yield run
+                else:
+                    still_pending.append(run_name)
+            pending = still_pending
+
+            self.logger.info(
+                f"{total - len(pending)}/{total} runs finished ("
+                + ", ".join(
+                    f"{status}: {count}"
+                    for status, count in sorted(statuses.items())
+                )
+                + ")"
+            )
+            if not pending:
+                return
+
+            elapsed = time.monotonic() - start
+            if self.timeout is not None and elapsed >= self.timeout:
+                raise TimeoutError(
+                    f"Runs {', '.join(pending)} not finished after "
+                    f"{int(elapsed)} seconds"
+                )
+            if self.timeout is not None:
+                self.sleep(min(delay, self.timeout - elapsed))
+            else:
+                self.sleep(delay)
+            delay = min(delay * self.backoff, self.max_delay)
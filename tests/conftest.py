@@ -0,0 +1,30 @@
+"""Shared fixtures of the llmops tests."""
+import pytest
+
+from llmops.common.clients import clear_clients
+from llmops.common.flow_manifest import clear_flow_manifests
+from llmops.common.folder_hash import clear_file_digests
+
+
+@pytest.fixture(autouse=True)
+def _clear_clients():
+    """Don't share cached Azure clients between tests."""
+    clear_clients()
+    yield
+    clear_clients()
+
+
+@pytest.fixture(autouse=True)
+def _clear_flow_manifests():
+    """Don't share scanned flow folders between tests."""
+    clear_flow_manifests()
+    yield
+    clear_flow_manifests()
+
+
+@pytest.fixture(autouse=True)
+def _clear_file_digests():
+    """Don't share cached file digests between tests."""
+    clear_file_digests()
+    yield
+    clear_file_digests()
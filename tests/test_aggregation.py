@@ -0,0 +1,101 @@
+"""Tests for the aggregation module."""
+import math
+import statistics
+
+import pytest
+
+from llmops.common.aggregation import StreamingStats, merge_metrics
+
+
+def test_streaming_stats():
+    """Test count, mean, confidence interval and bounds of a stream."""
+    values = [1, 2, 5, 4, 5, 3]
+    stats = StreamingStats().update(values)
+
+    assert stats.count == 6
+    assert stats.mean == pytest.approx(statistics.mean(values))
+    assert stats.variance == pytest.approx(statistics.variance(values))
+    assert stats.ci95 == pytest.approx(
+        1.96 * statistics.stdev(values) / math.sqrt(len(values))
+    )
+    assert (stats.min, stats.max) == (1, 5)
+    assert stats.quantile(0.5) == pytest.approx(statistics.median(values))
+
+
+def test_streaming_stats_merge():
+    """Test merged shards give the statistics of the whole stream."""
+    values = list(range(100))
+    merged = StreamingStats(reservoir_size=10, seed=1).update(values[:30])
+    merged.merge(StreamingStats(reservoir_size=10, seed=2).update(values[30:]))
+    whole = StreamingStats().update(values)
+
+    assert merged.count == whole.count
+    assert merged.mean == pytest.approx(whole.mean)
+    assert merged.ci95 == pytest.approx(whole.ci95)
+    assert (merged.min, merged.max) == (0, 99)
+    assert len(merged.reservoir) == 10
+    assert set(merged.reservoir) <= set(values)
+
+
+def test_merge_metrics():
+    """Test shard metrics merge into the metrics of the whole evaluation."""
+    scores = [1, 2, 5, 4, 5]
+    shards = [
+        {
+            **StreamingStats().update(part).to_metrics("correctness"),
+            "average_correctness": statistics.mean(part),
+            "total": len(part),
+            "flow_name": "eval",
+            "dataset": f"shard_{index}",
+        }
+        for index, part in enumerate([scores[:2], scores[2:]])
+    ]
+
+    merged = merge_metrics(shards)
+
+    whole = StreamingStats().update(scores)
+    assert merged["correctness_mean"] == pytest.approx(whole.mean)
+    assert merged["correctness_ci95"] == pytest.approx(whole.ci95)
+    assert merged["average_correctness"] == pytest.approx(whole.mean)
+    assert merged["total"] == 5
+    assert merged["flow_name"] == "eval"
+    assert "dataset" not in merged
+
+
+def test_merge_metrics_invalid_scores():
+    """Test invalid scores of the shards are summed."""
+    shards = [
+        {
+            **StreamingStats().update(part).to_metrics("correctness"),
+            "total": len(part) + invalid,
+            "invalid_scores": invalid,
+        }
+        for part, invalid in [([1, 2], 1), ([5], 0), ([4, 5], 2)]
+    ]
+
+    merged = merge_metrics(shards)
+
+    assert merged["invalid_scores"] == 3
+    assert merged["total"] == 8
+    assert merged["correctness_count"] == 5
+
+
+def test_merge_metrics_accuracy():
+    """Test accuracies merge from the counts of correct grades."""
+    merged = merge_metrics([
+        {"accuracy": 0.5, "accuracy_count": 2, "accuracy_sum": 1},
+        {"accuracy": 1.0, "accuracy_count": 8, "accuracy_sum": 8},
+    ])
+
+    assert merged["accuracy"] == pytest.approx(0.9)
+    assert "accuracy_ci95" not in merged
+
+
+def test_merge_metrics_weights():
+    """Test metrics without statistics are averaged with the weights."""
+    merged = merge_metrics(
+        [{"gpt_relevance": 4.0, "name": "a"}, {"gpt_relevance": 1.0}],
+        weights=[3, 1],
+    )
+
+    assert merged == {"gpt_relevance": pytest.approx(3.25)}
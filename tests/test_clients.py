@@ -0,0 +1,86 @@
+"""Tests for the clients module and the llmops driver."""
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+from azure.core.credentials import AccessToken
+
+from llmops.__main__ import main, split_stages
+from llmops.common.clients import (
+    CachedTokenCredential,
+    get_credential,
+    get_ml_client,
+)
+
+
+def test_get_ml_client_cached_per_workspace():
+    """Test clients and credential are created once per workspace."""
+    with patch("llmops.common.clients.MLClient") as mock_ml_client, patch(
+        "llmops.common.clients.DefaultAzureCredential"
+    ) as mock_credential:
+        mock_ml_client.side_effect = lambda **kwargs: Mock()
+
+        client = get_ml_client("sub", "rg", "ws")
+        assert get_ml_client("sub", "rg", "ws") is client
+        assert get_ml_client("sub", "rg", "other_ws") is not client
+
+        assert mock_ml_client.call_count == 2
+        assert mock_credential.call_count == 1
+        assert (
+            mock_ml_client.call_args.kwargs["credential"] is get_credential()
+        )
+
+
+def test_cached_token_credential():
+    """Test tokens are reused until they are about to expire."""
+    credential = Mock()
+    credential.get_token.side_effect = [
+        AccessToken("token_1", int(time.time()) + 3600),
+        AccessToken("token_2", int(time.time()) + 60),
+        AccessToken("token_3", int(time.time()) + 3600),
+    ]
+    cached_credential = CachedTokenCredential(credential)
+
+    assert cached_credential.get_token("scope").token == "token_1"
+    assert cached_credential.get_token("scope").token == "token_1"
+    assert cached_credential.get_token("other_scope").token == "token_2"
+    # Expires in less than the refresh margin
+    assert cached_credential.get_token("other_scope").token == "token_3"
+    assert credential.get_token.call_count == 3
+
+
+def test_split_stages():
+    """Test the driver command line is split in stages."""
+    assert split_stages(
+        [
+            "prompt_pipeline", "--base_path", "exp", "--variants", "all",
+            "prompt_eval", "--run_id", "run_id.txt",
+            "register_model",
+        ]
+    ) == [
+        ("prompt_pipeline", ["--base_path", "exp", "--variants", "all"]),
+        ("prompt_eval", ["--run_id", "run_id.txt"]),
+        ("register_model", []),
+    ]
+
+    with pytest.raises(ValueError):
+        split_stages(["--base_path", "exp"])
+    with pytest.raises(ValueError):
+        split_stages([])
+
+
+def test_driver_runs_stages_in_order():
+    """Test the driver calls the main function of every stage."""
+    modules = {}
+
+    def _import_module(name):
+        return modules.setdefault(name, Mock())
+
+    with patch(
+        "llmops.__main__.importlib.import_module", side_effect=_import_module
+    ):
+        main(["prompt_pipeline", "--base_path", "exp", "prompt_eval"])
+
+    pipeline = modules["llmops.common.prompt_pipeline"]
+    pipeline.main.assert_called_once_with(["--base_path", "exp"])
+    modules["llmops.common.prompt_eval"].main.assert_called_once_with([])
@@ -40,7 +40,7 @@ def test_create_kubernetes_deployment():
     }
 
     with patch(
-        "llmops.common.deployment.provision_deployment.MLClient"
+        "llmops.common.clients.MLClient"
     ) as mock_ml_client:
         # Mock the MLClient
         ml_client_instance = Mock()
@@ -26,7 +26,7 @@ def test_create_provision_endpoint_when_not_exists():
     endpoint_name = "test-endpoint"
     endpoint_description = "test-endpoint-description"
     with patch(
-        "llmops.common.deployment.provision_endpoint.MLClient"
+        "llmops.common.clients.MLClient"
     ) as mock_ml_client:
         # Mock the MLClient
         ml_client_instance = Mock()
@@ -65,7 +65,7 @@ def test_create_provision_endpoint_when_exists():
     env_name = "dev"
     endpoint_name = "test-endpoint"
     with patch(
-        "llmops.common.deployment.provision_endpoint.MLClient"
+        "llmops.common.clients.MLClient"
     ) as mock_ml_client:
         # Mock the MLClient
         ml_client_instance = Mock()
@@ -45,7 +45,7 @@ def test_create_kubernetes_deployment():
     }
 
     with patch(
-        "llmops.common.deployment.kubernetes_deployment.MLClient"
+        "llmops.common.clients.MLClient"
     ) as mock_ml_client:
         # Mock the MLClient
         ml_client_instance = Mock()
@@ -27,7 +27,7 @@ def test_create_kubernetes_endpoint():
     endpoint_description = "k8s-test-endpoint-description"
     compute_name = "k8s-compute"
     with patch(
-        "llmops.common.deployment.kubernetes_endpoint.MLClient"
+        "llmops.common.clients.MLClient"
     ) as mock_ml_client:
         # Mock the MLClient
         ml_client_instance = Mock()
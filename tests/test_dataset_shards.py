@@ -0,0 +1,101 @@
+"""Tests for the dataset_shards module."""
+import json
+from unittest.mock import Mock
+
+import pandas as pd
+import pytest
+
+from llmops.common.dataset_shards import (
+    ShardedRun,
+    get_shard_rows,
+    merge_shard_details,
+    shard_tags,
+    slice_jsonl,
+    split_jsonl,
+)
+
+
+def _write_rows(path, count):
+    with open(path, "w") as data_file:
+        for row in range(count):
+            data_file.write(json.dumps({"row": row}) + "\n")
+            if row == 2:
+                data_file.write("\n")
+    return str(path)
+
+
+def _read_rows(path):
+    with open(path) as data_file:
+        return [json.loads(line)["row"] for line in data_file]
+
+
+def test_split_jsonl(tmp_path):
+    """Test shards are contiguous, balanced and skip blank lines."""
+    data = _write_rows(tmp_path / "data.jsonl", 7)
+    shards = split_jsonl(data, 3, str(tmp_path / "shards"))
+
+    assert [(shard.start, shard.end) for shard in shards] == [
+        (0, 3), (3, 5), (5, 7)
+    ]
+    assert [_read_rows(shard.path) for shard in shards] == [
+        [0, 1, 2], [3, 4], [5, 6]
+    ]
+
+
+def test_split_jsonl_more_shards_than_rows(tmp_path):
+    """Test small datasets get one shard per row."""
+    data = _write_rows(tmp_path / "data.jsonl", 2)
+    shards = split_jsonl(data, 4, str(tmp_path / "shards"))
+
+    assert [_read_rows(shard.path) for shard in shards] == [[0], [1]]
+    with pytest.raises(ValueError):
+        split_jsonl(data, 0, str(tmp_path / "shards"))
+
+
+def test_slice_jsonl(tmp_path):
+    """Test a range of rows is written, blank lines not counted."""
+    data = _write_rows(tmp_path / "data.jsonl", 6)
+    output_path = slice_jsonl(data, 2, 5, str(tmp_path / "slice.jsonl"))
+
+    assert _read_rows(output_path) == [2, 3, 4]
+
+
+def test_merge_shard_details(tmp_path):
+    """Test details are merged in row order with dataset line numbers."""
+    data = _write_rows(tmp_path / "data.jsonl", 5)
+    shards = split_jsonl(data, 2, str(tmp_path / "shards"))
+    details = [
+        pd.DataFrame({"inputs.line_number": [0, 1, 2], "out": list("abc")}),
+        pd.DataFrame({"inputs.line_number": [0, 1], "out": list("de")}),
+    ]
+
+    merged = merge_shard_details(details, shards)
+
+    assert merged["inputs.line_number"].tolist() == [0, 1, 2, 3, 4]
+    assert merged["out"].tolist() == ["a", "b", "c", "d", "e"]
+    assert merged.index.tolist() == [0, 1, 2, 3, 4]
+
+
+def test_sharded_run(tmp_path):
+    """Test the logical run status and the shard tags."""
+    data = _write_rows(tmp_path / "data.jsonl", 4)
+    shards = split_jsonl(data, 2, str(tmp_path / "shards"))
+    shard_runs = []
+    for name, status in [
+        ("run_shard0", "Completed"), ("run_shard1", "Failed")
+    ]:
+        shard_run = Mock()
+        shard_run.name = name
+        shard_run.status = status
+        shard_runs.append(shard_run)
+
+    assert ShardedRun("run", shard_runs[:1]).status == "Completed"
+    assert ShardedRun("run", shard_runs).status == "Failed"
+    assert ShardedRun("run", shard_runs).shard_run_names == [
+        "run_shard0", "run_shard1"
+    ]
+
+    tags = shard_tags("run", "ds", shards[1], len(shards))
+    assert tags["llmops.shard"] == "1/2"
+    assert get_shard_rows(tags) == (2, 4)
+    assert get_shard_rows({"build_id": "1"}) is None
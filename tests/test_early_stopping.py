@@ -0,0 +1,101 @@
+"""Tests for the early_stopping module."""
+import json
+
+import pandas as pd
+import pytest
+
+from llmops.common.early_stopping import (
+    EarlyStopping,
+    map_run_columns,
+    write_batch_data,
+)
+
+
+def _details(scores, start=0):
+    """Build the details of a batch evaluation run."""
+    return pd.DataFrame(
+        {
+            "inputs.line_number": range(start, start + len(scores)),
+            "outputs.score": scores,
+        }
+    )
+
+
+def test_early_stopping_batches():
+    """Test rows are split in batches of the batch size."""
+    assert EarlyStopping("score", 2).batches(5) == [(0, 2), (2, 4), (4, 5)]
+    with pytest.raises(ValueError):
+        EarlyStopping("score", 0)
+
+
+def test_early_stopping_stops_losers():
+    """Test variants worse than the best one by the margin are stopped."""
+    early_stopping = EarlyStopping("score", 4, margin=0.5, seed=0)
+    group = ("eval", "ds1_eval")
+    early_stopping.update(group, "best", _details([5, 4, 5, 4]))
+    early_stopping.update(group, "close", _details([5, 4, 4, 4]))
+    early_stopping.update(group, "worse", _details([1, 2, 1, 2]))
+
+    assert early_stopping.stop_losers(group) == ["worse"]
+    assert early_stopping.is_stopped(group, "worse")
+    assert not early_stopping.is_stopped(group, "close")
+    assert early_stopping.stop_losers(group) == []
+
+
+def test_early_stopping_waits_for_min_rows():
+    """Test variants are not compared on too few rows."""
+    early_stopping = EarlyStopping("score", 2, min_rows=4)
+    early_stopping.update("group", "a", _details([5, 5]))
+    early_stopping.update("group", "b", _details([1, 1]))
+    assert early_stopping.stop_losers("group") == []
+
+    early_stopping.update("group", "a", _details([5, 5], start=2))
+    early_stopping.update("group", "b", _details([1, 1], start=2))
+    assert early_stopping.stop_losers("group") == ["b"]
+
+
+def test_map_run_columns():
+    """Test run columns are mapped to the batch data columns."""
+    assert map_run_columns(
+        {
+            "answer": "${run.outputs.answer}",
+            "question": "${run.inputs.question}",
+            "truth": "${data.truth}",
+        }
+    ) == {
+        "answer": "${data.run_outputs_answer}",
+        "question": "${data.run_inputs_question}",
+        "truth": "${data.truth}",
+    }
+
+
+def test_write_batch_data(tmp_path):
+    """Test batch rows are written with the columns of the run."""
+    data_path = tmp_path / "data.jsonl"
+    data_path.write_text(
+        "\n".join(json.dumps({"truth": f"t{row}"}) for row in range(4))
+    )
+    run_details = pd.DataFrame(
+        {
+            "inputs.line_number": [3, 1, 2],
+            "inputs.question": ["q3", "q1", "q2"],
+            "outputs.answer": ["a3", "a1", "a2"],
+        }
+    )
+
+    write_batch_data(
+        str(data_path), run_details, 1, 3, str(tmp_path / "batch.jsonl")
+    )
+
+    rows = [
+        json.loads(line)
+        for line in (tmp_path / "batch.jsonl").read_text().splitlines()
+    ]
+    assert rows == [
+        {
+            "truth": f"t{row}",
+            "run_inputs_question": f"q{row}",
+            "run_outputs_answer": f"a{row}",
+        }
+        for row in (1, 2)
+    ]
@@ -0,0 +1,116 @@
+"""Tests for the eval_cache module."""
+import inspect
+import pickle
+
+import pytest
+
+from llmops.common.eval_cache import (
+    EVAL_CACHE_DIR_ENV,
+    CachedEvaluator,
+    EvalCache,
+    compute_evaluator_hash,
+    compute_line_key,
+    get_eval_cache,
+)
+
+
+def test_compute_line_key():
+    """Test the key changes with the evaluator and the line inputs."""
+    inputs = {"answer": "a", "ground_truth": "b"}
+    key = compute_line_key("v1", inputs)
+
+    assert key == compute_line_key("v1", {"ground_truth": "b", "answer": "a"})
+    assert key != compute_line_key("v2", inputs)
+    assert key != compute_line_key("v1", {"answer": "a", "ground_truth": "c"})
+
+
+def test_compute_evaluator_hash(tmp_path):
+    """Test the evaluator version changes with its files and settings."""
+    prompty = tmp_path / "eval.prompty"
+    prompty.write_text("Score the answer")
+    evaluator_hash = compute_evaluator_hash(str(tmp_path))
+
+    assert evaluator_hash != compute_evaluator_hash(
+        str(tmp_path), {"deployment": "gpt-4o"}
+    )
+    prompty.write_text("Score the answer from 1 to 5")
+    assert evaluator_hash != compute_evaluator_hash(str(tmp_path))
+
+
+def test_eval_cache(tmp_path):
+    """Test results are stored per line and counted."""
+    cache = EvalCache(str(tmp_path / "cache"), "v1")
+    inputs = {"answer": "a"}
+
+    assert cache.get(inputs) is None
+    cache.put(inputs, {"score": 5})
+    assert cache.get(inputs) == {"score": 5}
+    assert EvalCache(str(tmp_path / "cache"), "v2").get(inputs) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+class FakeEvaluator:
+    """Evaluator scoring the length of the answer."""
+
+    def __init__(self):
+        """Initialize the evaluator with no calls."""
+        self.calls = []
+
+    def __call__(self, *, answer: str, context: str):
+        """Score the answer and record the call."""
+        self.calls.append(answer)
+        return {"groundedness": len(answer)}
+
+
+def test_cached_evaluator(tmp_path):
+    """Test only new lines reach the evaluator, signature is kept."""
+    evaluator = FakeEvaluator()
+    cached_evaluator = CachedEvaluator(
+        evaluator, EvalCache(str(tmp_path), "v1")
+    )
+
+    assert list(inspect.signature(cached_evaluator).parameters) == [
+        "answer", "context"
+    ]
+    assert cached_evaluator(answer="ab", context="c") == {"groundedness": 2}
+    assert cached_evaluator(answer="ab", context="c") == {"groundedness": 2}
+    assert cached_evaluator(answer="abc", context="c") == {"groundedness": 3}
+    assert evaluator.calls == ["ab", "abc"]
+
+    # Batch runs pickle the evaluator to send it to their workers
+    copy = pickle.loads(pickle.dumps(cached_evaluator))
+    assert copy(answer="abc", context="c") == {"groundedness": 3}
+    assert copy.evaluator.calls == ["ab", "abc"]
+
+
+def test_cached_evaluator_is_a_flow_entry():
+    """Test promptflow resolves the evaluator as a flex flow entry."""
+    general_utils = pytest.importorskip(
+        "promptflow._sdk._utilities.general_utils"
+    )
+    signature_utils = pytest.importorskip(
+        "promptflow._sdk._utilities.signature_utils"
+    )
+
+    # pf.run runs callable objects from the entry of their class
+    assert (
+        general_utils.callable_to_entry_string(CachedEvaluator)
+        == "llmops.common.eval_cache:CachedEvaluator"
+    )
+    signature, _, _ = signature_utils.infer_signature_for_flex_flow(
+        entry=CachedEvaluator, language="python"
+    )
+    assert signature["inputs"] == {
+        "answer": {"type": "string"},
+        "context": {"type": "string"},
+    }
+
+
+def test_get_eval_cache(tmp_path, monkeypatch):
+    """Test the cache is only used when EVAL_CACHE_DIR is set."""
+    monkeypatch.delenv(EVAL_CACHE_DIR_ENV, raising=False)
+    assert get_eval_cache(str(tmp_path)) is None
+
+    monkeypatch.setenv(EVAL_CACHE_DIR_ENV, str(tmp_path / "cache"))
+    cache = get_eval_cache(str(tmp_path))
+    assert cache.cache_dir == str(tmp_path / "cache")
@@ -0,0 +1,107 @@
+"""Tests for the evaluator_registry module."""
+import pickle
+import sys
+
+import pytest
+
+from llmops.common.evaluator_registry import (
+    EvaluatorFunction,
+    EvaluatorRegistry,
+    call_evaluator,
+    run_evaluators,
+)
+
+EVALUATOR_SOURCE = '''
+import helper
+
+
+def eval_length(name, data, mappings, report_dir):
+    return (name, helper.size(data))
+
+
+def eval_name(name, data, mappings, report_dir):
+    return name
+
+
+def not_an_evaluator():
+    return None
+'''
+
+
+@pytest.fixture
+def evaluator_dir(tmp_path, monkeypatch):
+    """Create a folder of evaluators depending on a flow module."""
+    evaluators = tmp_path / "registry_evals" / "evaluators"
+    evaluators.mkdir(parents=True)
+    (tmp_path / "registry_evals" / "__init__.py").write_text("")
+    (evaluators / "__init__.py").write_text("")
+    (evaluators / "eval_module.py").write_text(EVALUATOR_SOURCE)
+    flow = tmp_path / "flow"
+    flow.mkdir()
+    (flow / "helper.py").write_text("def size(data):\n    return len(data)\n")
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "path", list(sys.path))
+    yield "registry_evals/evaluators", str(flow)
+    for name in list(sys.modules):
+        if name.startswith("registry_evals") or name == "helper":
+            del sys.modules[name]
+
+
+def test_discover_caches_evaluators(evaluator_dir):
+    """Test evaluator folders are listed and imported once."""
+    service_path, flow_dir = evaluator_dir
+    registry = EvaluatorRegistry()
+
+    evaluators = registry.discover(service_path, flow_dir)
+    path_size = len(sys.path)
+
+    assert [evaluator.function_name for evaluator in evaluators] == [
+        "eval_length",
+        "eval_name",
+    ]
+    assert evaluators[0].module_path == "registry_evals.evaluators.eval_module"
+    assert registry.discover(f"./{service_path}", flow_dir) is evaluators
+    assert registry.discover(service_path, flow_dir) is evaluators
+    assert len(sys.path) == path_size
+    assert registry.resolve(evaluators[0])("run", "abc", {}, "") == ("run", 3)
+
+
+def test_resolve_imports_undiscovered_evaluator(evaluator_dir):
+    """Test evaluators are resolved from their reference alone."""
+    service_path, flow_dir = evaluator_dir
+    evaluator = EvaluatorRegistry().discover(service_path, flow_dir)[1]
+    registry = EvaluatorRegistry()
+
+    assert registry.resolve(evaluator) is registry.resolve(evaluator)
+    assert call_evaluator(evaluator, ("run", "", {}, "")) == "run"
+    with pytest.raises(AttributeError):
+        registry.resolve(evaluator._replace(function_name="eval_missing"))
+
+
+@pytest.mark.parametrize("processes", [False, True])
+def test_run_evaluators(evaluator_dir, processes):
+    """Test evaluators are called in threads or worker processes."""
+    service_path, flow_dir = evaluator_dir
+    evaluators = EvaluatorRegistry().discover(service_path, flow_dir)
+    calls = [
+        (evaluators[0], (f"run_{index}", "x" * index, {}, ""))
+        for index in range(4)
+    ] + [(evaluators[1], ("named", "", {}, ""))]
+
+    results = dict(run_evaluators(calls, max_workers=2, processes=processes))
+
+    assert results == {
+        0: ("run_0", 0),
+        1: ("run_1", 1),
+        2: ("run_2", 2),
+        3: ("run_3", 3),
+        4: "named",
+    }
+
+
+def test_evaluator_function_is_picklable():
+    """Test evaluator references can be sent to worker processes."""
+    evaluator = EvaluatorFunction("package.eval_module", "eval_x", ("/a",))
+
+    assert pickle.loads(pickle.dumps(evaluator)) == evaluator
@@ -1,12 +1,14 @@
 """Tests for the experiment module."""
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 import os
 from pathlib import Path
 from typing import Any, List
 import copy
+import shutil
 
 import pytest
+from llmops.common import experiment as experiment_module
 from llmops.common.experiment import (
     Dataset,
     Evaluator,
@@ -748,3 +750,65 @@ def test_load_experiment_with_overlay(prepare_expected_overlay):
     assert experiment.datasets == expected_mapped_datasets
     assert experiment.evaluators == expected_evaluators
     assert experiment.runtime == "overridden_runtime"
+
+
+def test_load_experiment_snapshot(tmp_path, monkeypatch):
+    """Test experiments are parsed once until their files change."""
+    shutil.copytree(RESOURCE_PATH / "flows", tmp_path / "flows")
+    shutil.copy(RESOURCE_PATH / "experiment.yaml", tmp_path)
+    base_path = str(tmp_path)
+    monkeypatch.setenv(
+        experiment_module.EXPERIMENT_CACHE_DIR_ENV, str(tmp_path / "cache")
+    )
+
+    experiment = load_experiment("experiment.yaml", base_path)
+    with patch(
+        "llmops.common.experiment._load_base_experiment"
+    ) as mock_load_base:
+        cached = load_experiment("experiment.yaml", base_path)
+        # Snapshots are shared with other processes through the cache folder
+        monkeypatch.setattr(experiment_module, "_snapshots", {})
+        restored = load_experiment("experiment.yaml", base_path)
+    mock_load_base.assert_not_called()
+
+    assert cached is not experiment
+    assert cached.datasets == experiment.datasets
+    assert restored.evaluators == experiment.evaluators
+    assert len(list((tmp_path / "cache").glob("*.pkl"))) == 1
+
+    # Changed experiment files are parsed again
+    exp_file = tmp_path / "experiment.yaml"
+    exp_file.write_text(
+        exp_file.read_text().replace("runtime_name", "other_runtime")
+    )
+    assert load_experiment("experiment.yaml", base_path).runtime == (
+        "other_runtime"
+    )
+
+    # So are experiments whose evaluator flows appear
+    (tmp_path / "eval1").mkdir()
+    (tmp_path / "eval1" / "flow.dag.yaml").write_text("nodes: []\n")
+    with patch(
+        "llmops.common.experiment._load_base_experiment",
+        wraps=experiment_module._load_base_experiment,
+    ) as mock_load_base:
+        load_experiment("experiment.yaml", base_path)
+    mock_load_base.assert_called_once()
+
+
+def test_get_flow_detail_is_memoised():
+    """Test flow details are loaded once per process."""
+    base_path = str(RESOURCE_PATH)
+    experiment = load_experiment("experiment.yaml", base_path)
+    other = load_experiment("experiment.yaml", base_path)
+
+    with patch("llmops.common.experiment.load_yaml") as mock_load_yaml:
+        mock_load_yaml.side_effect = experiment_module.load_yaml
+        flow_detail = experiment.get_flow_detail(FlowTypeOption.DAG_FLOW)
+        assert other.get_flow_detail(FlowTypeOption.DAG_FLOW) is flow_detail
+
+    assert mock_load_yaml.call_count <= 1
+    assert flow_detail.default_variants == {
+        "node_var_0": "var_0",
+        "node_var_1": "var_3",
+    }
@@ -0,0 +1,107 @@
+"""Tests for the flow_manifest module."""
+import json
+import os
+from unittest.mock import patch
+
+import pytest
+
+from llmops.common.common import FlowTypeOption, hash_folder
+from llmops.common.flow_manifest import (
+    build_flow_manifest,
+    clear_flow_manifests,
+    get_flow_manifest,
+)
+
+CLASS_FLOW = '''
+class ChatFlow:
+    def __init__(self, model_config, max_tokens):
+        pass
+'''
+
+
+@pytest.fixture
+def flex_flow(tmp_path):
+    """Create a class based flex flow with vendored assets."""
+    flow = tmp_path / "chat"
+    (flow / "assets" / "nested").mkdir(parents=True)
+    (flow / "flow.flex.yaml").write_text("entry: flow:ChatFlow\n")
+    (flow / "flow.py").write_text(CLASS_FLOW)
+    (flow / "init.json").write_text(
+        json.dumps(
+            {
+                "model_config": {"api_key": "${api_key}", "api": "chat"},
+                "max_tokens": 256,
+                "prompt": "${prompt}",
+            }
+        )
+    )
+    (flow / "assets" / "nested" / "data.bin").write_bytes(b"x" * 100)
+    return flow
+
+
+def test_build_flex_flow_manifest(flex_flow, monkeypatch):
+    """Test a single scan resolves the type, init and files of a flow."""
+    monkeypatch.setenv("MODEL_CONFIG_API_KEY", "secret")
+    monkeypatch.delenv("PROMPT", raising=False)
+
+    manifest = build_flow_manifest(str(flex_flow))
+
+    assert manifest.flow_type == FlowTypeOption.CLASS_FLOW
+    assert manifest.is_flex
+    assert manifest.flow_file_path == str(flex_flow / "flow.flex.yaml")
+    assert manifest.init_params == {
+        "model_config": {"api_key": "secret", "api": "chat"},
+        "max_tokens": 256,
+        "prompt": "${prompt}",
+    }
+    files = dict(manifest.files)
+    assert files[os.path.join("assets", "nested", "data.bin")] == 100
+    assert len(files) == 4
+    assert manifest.size == sum(files.values())
+    assert manifest.content_hash == hash_folder(str(flex_flow))
+
+
+def test_build_flow_manifest_flow_types(tmp_path):
+    """Test dag, function and missing flows are recognised."""
+    dag = tmp_path / "dag"
+    dag.mkdir()
+    (dag / "flow.dag.yaml").write_text("nodes: []\n")
+    function = tmp_path / "function"
+    function.mkdir()
+    (function / "flow.flex.yaml").write_text("entry: flow:chat\n")
+    (function / "flow.py").write_text("def chat(question):\n    pass\n")
+
+    assert build_flow_manifest(str(dag)).flow_type == FlowTypeOption.DAG_FLOW
+    assert build_flow_manifest(str(function)).flow_type == (
+        FlowTypeOption.FUNCTION_FLOW
+    )
+    assert build_flow_manifest(str(function)).init_params == {}
+    missing = build_flow_manifest(str(tmp_path / "missing"))
+    assert missing.flow_type == FlowTypeOption.NO_FLOW
+    assert missing.flow_file_path is None
+    assert missing.files == []
+
+
+def test_build_flow_manifest_flex_wins_over_dag(flex_flow):
+    """Test a folder with flex and dag flow files is a flex flow."""
+    (flex_flow / "flow.dag.yaml").write_text("nodes: []\n")
+
+    manifest = build_flow_manifest(str(flex_flow))
+
+    assert manifest.flow_type == FlowTypeOption.CLASS_FLOW
+    assert manifest.is_flex
+    assert manifest.flow_file_path == str(flex_flow / "flow.flex.yaml")
+
+
+def test_get_flow_manifest_scans_once(flex_flow):
+    """Test flow folders are walked once per process."""
+    with patch(
+        "llmops.common.folder_hash.os.walk", wraps=os.walk
+    ) as mock_walk:
+        manifest = get_flow_manifest(str(flex_flow))
+        assert get_flow_manifest(f"{flex_flow}/") is manifest
+        assert mock_walk.call_count == 1
+
+        clear_flow_manifests()
+        assert get_flow_manifest(str(flex_flow)) is not manifest
+        assert mock_walk.call_count == 2
@@ -0,0 +1,175 @@
+"""Tests for the folder_hash module."""
+import hashlib
+import io
+import json
+import os
+from unittest.mock import patch
+
+import pytest
+
+from llmops.common.folder_hash import (
+    HASH_CACHE_DIR_ENV,
+    HASH_CACHE_FILENAME,
+    FileDigestCache,
+    IgnoreRules,
+    hash_file,
+    hash_files,
+    hash_folder_contents,
+    list_folder_files,
+)
+
+
+@pytest.fixture
+def flow(tmp_path):
+    """Create a flow folder with assets, ignored files and an ignore file."""
+    flow = tmp_path / "flow"
+    (flow / "assets" / "nested").mkdir(parents=True)
+    (flow / ".venv" / "lib").mkdir(parents=True)
+    (flow / "__pycache__").mkdir()
+    (flow / "flow.dag.yaml").write_text("nodes: []\n")
+    (flow / "assets" / "nested" / "data.bin").write_bytes(b"x" * 1000)
+    (flow / "assets" / "keep.log").write_text("kept")
+    (flow / "run.log").write_text("ignored")
+    (flow / ".venv" / "lib" / "site.py").write_text("ignored")
+    (flow / "__pycache__" / "flow.pyc").write_bytes(b"ignored")
+    (flow / ".gitignore").write_text(
+        "# Local files\n.venv/\n__pycache__/\n*.log\n!assets/keep.log\n"
+    )
+    return flow
+
+
+def test_list_folder_files_sorted_and_ignore_aware(flow):
+    """Test files are sorted and ignored files and folders are skipped."""
+    walk = os.walk
+    walked = []
+
+    def recording_walk(path):
+        for root, dir_names, file_names in walk(path):
+            walked.append(os.path.relpath(root, flow))
+            yield root, dir_names, file_names
+
+    with patch(
+        "llmops.common.folder_hash.os.walk", side_effect=recording_walk
+    ):
+        files = list_folder_files(str(flow))
+
+    assert [path for path, _ in files] == [
+        ".gitignore",
+        os.path.join("assets", "keep.log"),
+        os.path.join("assets", "nested", "data.bin"),
+        "flow.dag.yaml",
+    ]
+    assert dict(files)[os.path.join("assets", "nested", "data.bin")] == 1000
+    # Ignored folders are not walked
+    assert sorted(walked) == [
+        ".",
+        "assets",
+        os.path.join("assets", "nested"),
+    ]
+
+    # .amlignore has priority over .gitignore, generated files are skipped
+    (flow / ".amlignore").write_text("assets/\n")
+    assert [path for path, _ in list_folder_files(str(flow))] == [
+        ".amlignore",
+        ".gitignore",
+        os.path.join(".venv", "lib", "site.py"),
+        "flow.dag.yaml",
+        "run.log",
+    ]
+    (flow / ".amlignore").write_text("!__pycache__/\n!*.pyc\n")
+    assert os.path.join("__pycache__", "flow.pyc") in dict(
+        list_folder_files(str(flow))
+    )
+
+
+def test_ignore_rules():
+    """Test anchored, folder only and negated patterns."""
+    rules = IgnoreRules(["/build", "docs/*.md", "tmp/", "*.csv", "!keep.csv"])
+
+    assert rules.is_ignored("build", is_dir=True)
+    assert not rules.is_ignored("src/build", is_dir=True)
+    assert rules.is_ignored("docs/readme.md")
+    assert rules.is_ignored("tmp", is_dir=True)
+    assert not rules.is_ignored("tmp")
+    assert rules.is_ignored("data/rows.csv")
+    assert not rules.is_ignored("data/keep.csv")
+    assert not IgnoreRules(["", "# comment"])
+
+
+def test_hash_folder_contents_is_stable(flow, tmp_path):
+    """Test the hash depends on the paths and contents, not walk order."""
+    expected = hashlib.sha256()
+    for path in [
+        ".gitignore",
+        "assets/keep.log",
+        "assets/nested/data.bin",
+        "flow.dag.yaml",
+    ]:
+        expected.update(path.encode("utf-8") + b"\0")
+        expected.update(hashlib.sha256((flow / path).read_bytes()).digest())
+
+    folder_hash = hash_folder_contents(str(flow), max_workers=4, chunk_size=7)
+
+    assert folder_hash == expected.hexdigest()
+    assert hash_folder_contents(str(flow), max_workers=1) == folder_hash
+    walk = os.walk
+
+    def reversed_walk(path):
+        for root, dir_names, file_names in walk(path):
+            dir_names.reverse()
+            yield root, dir_names, file_names[::-1]
+
+    with patch(
+        "llmops.common.folder_hash.os.walk", side_effect=reversed_walk
+    ):
+        assert hash_folder_contents(str(flow)) == folder_hash
+
+    # Ignored files don't change the hash, renamed files do
+    (flow / "run.log").write_text("changed")
+    assert hash_folder_contents(str(flow)) == folder_hash
+    (flow / "flow.dag.yaml").rename(flow / "flow.dag.yml")
+    assert hash_folder_contents(str(flow)) != folder_hash
+
+
+def test_hash_file_chunks(tmp_path):
+    """Test files are read in chunks of the requested size."""
+    reads = []
+
+    class RecordingFile(io.BytesIO):
+        def read(self, size=-1):
+            reads.append(size)
+            return super().read(size)
+
+    with patch(
+        "llmops.common.folder_hash.open",
+        return_value=RecordingFile(b"abc" * 10),
+        create=True,
+    ):
+        digest = hash_file(str(tmp_path / "data.bin"), chunk_size=4)
+
+    assert digest == hashlib.sha256(b"abc" * 10).hexdigest()
+    assert reads == [4] * 9
+
+
+def test_file_digests_are_cached(flow, tmp_path, monkeypatch):
+    """Test unchanged files are not read again, across processes."""
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setenv(HASH_CACHE_DIR_ENV, str(cache_dir))
+    folder_hash = hash_folder_contents(str(flow))
+    cache_file = cache_dir / HASH_CACHE_FILENAME
+    assert len(json.loads(cache_file.read_text())) == 4
+
+    with patch(
+        "llmops.common.folder_hash.hash_file", wraps=hash_file
+    ) as mock_hash_file:
+        # A new cache reads the digests saved by a previous process
+        cache = FileDigestCache(str(cache_file))
+        paths = [path for path, _ in list_folder_files(str(flow))]
+        assert hash_files(str(flow), paths, cache=cache) == folder_hash
+        assert mock_hash_file.call_count == 0
+
+        data_file = flow / "assets" / "nested" / "data.bin"
+        data_file.write_bytes(b"y" * 1001)
+        assert hash_files(str(flow), paths, cache=cache) != folder_hash
+        assert mock_hash_file.call_count == 1
+        mock_hash_file.assert_called_with(str(data_file), 1024 * 1024)
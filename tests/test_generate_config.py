@@ -0,0 +1,78 @@
+"""Tests for the generate_config module."""
+import json
+
+import yaml
+
+from llmops.common.deployment.generate_config import (
+    init_config_env_vars,
+    main,
+    resolve_init_config,
+)
+
+FLEX_FLOW = {
+    "entry": "flow:ChatFlow",
+    "init": {
+        "model_config": {
+            "type": "AzureOpenAIModelConfiguration",
+            "default": {
+                "azure_endpoint": "${env:AZURE_OPENAI_ENDPOINT}",
+                "azure_deployment": "gpt-35-turbo",
+            },
+        },
+        "max_total_token": {"type": "int", "default": 1024},
+        "system_prompt": {"type": "string", "default": "${env:PROMPT}"},
+    },
+}
+
+
+def test_resolve_init_config(monkeypatch):
+    """Test init placeholders are resolved from the environment."""
+    monkeypatch.setenv("MODEL_CONFIG_AZURE_ENDPOINT", "https://endpoint")
+    monkeypatch.setenv("SYSTEM_PROMPT", "You are a helpful assistant.")
+
+    config = resolve_init_config(FLEX_FLOW)
+
+    assert config == {
+        "model_config": {
+            "azure_endpoint": "https://endpoint",
+            "azure_deployment": "gpt-35-turbo",
+        },
+        "max_total_token": 1024,
+        "system_prompt": "You are a helpful assistant.",
+    }
+    assert resolve_init_config({"entry": "flow:chat"}) == {}
+
+
+def test_resolve_sample_init_config(monkeypatch):
+    """Test the init element of the sample is used without flow init."""
+    monkeypatch.delenv("MODEL_CONFIG_API_KEY", raising=False)
+    data = {
+        "sample": {
+            "init": {
+                "model_config": {"api_key": "${env:KEY}", "api": "chat"},
+                "temperature": 1,
+            }
+        }
+    }
+
+    assert resolve_init_config(data) == {
+        "model_config": {"api_key": "${env:KEY}", "api": "chat"},
+        "TEMPERATURE": 1,
+    }
+
+
+def test_init_config_env_vars_keep_spaces(tmp_path, monkeypatch, capsys):
+    """Test configurations with spaces are returned whole."""
+    monkeypatch.setenv("SYSTEM_PROMPT", "You are a helpful assistant.")
+    flow_file = tmp_path / "flow.flex.yaml"
+    flow_file.write_text(yaml.safe_dump(FLEX_FLOW))
+
+    env_vars = init_config_env_vars(str(flow_file))
+
+    config = json.loads(env_vars["PF_FLOW_INIT_CONFIG"])
+    assert config["system_prompt"] == "You are a helpful assistant."
+
+    main([str(flow_file), "true"])
+    assert capsys.readouterr().out == (
+        f"-e PF_FLOW_INIT_CONFIG={env_vars['PF_FLOW_INIT_CONFIG']}\n"
+    )
@@ -0,0 +1,74 @@
+"""Tests for the import time of the llmops entry points."""
+import os
+import subprocess
+import sys
+
+import pytest
+
+THIS_PATH = os.path.dirname(__file__)
+ROOT_PATH = os.path.dirname(THIS_PATH)
+
+# Azure and prompt flow SDKs are imported on the code paths that use them
+HEAVY_MODULES = ("promptflow", "azure.ai.ml", "azure.identity")
+# Budget of the cumulative import time of an entry point, in microseconds.
+# Entry points import in about 0.2s, and in more than 2s with the SDKs. The
+# default leaves headroom for slow machines, IMPORT_TIME_BUDGET_US overrides
+# it.
+IMPORT_TIME_BUDGET_ENV = "IMPORT_TIME_BUDGET_US"
+DEFAULT_IMPORT_TIME_BUDGET = 1_000_000
+
+ENTRY_POINTS = [
+    "llmops.common.prompt_pipeline",
+    "llmops.common.prompt_eval",
+    "llmops.common.leaderboard",
+    "llmops.common.register_data_asset",
+    "llmops.common.get_workspace",
+    "llmops.common.prompt_local_connections",
+    "llmops.common.deployment.register_model",
+    "llmops.common.deployment.provision_endpoint",
+    "llmops.common.deployment.provision_deployment",
+    "llmops.common.deployment.kubernetes_endpoint",
+    "llmops.common.deployment.kubernetes_deployment",
+    "llmops.common.deployment.test_model_on_aml",
+    "llmops.common.deployment.test_model_on_kubernetes",
+    "llmops.common.deployment.migrate_connections",
+]
+
+
+def _import_times(module: str) -> dict:
+    """Import a module in a new interpreter, get the cumulative times."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT_PATH,
+        env={**os.environ, "PYTHONPATH": ROOT_PATH},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize("module", ENTRY_POINTS)
+def test_entry_point_import_time(module):
+    """Test entry points don't import heavy SDKs, and start fast."""
+    times = _import_times(module)
+
+    heavy = [
+        name
+        for name in times
+        if any(
+            name == prefix or name.startswith(f"{prefix}.")
+            for prefix in HEAVY_MODULES
+        )
+    ]
+    assert heavy == []
+    budget = int(
+        os.environ.get(IMPORT_TIME_BUDGET_ENV, DEFAULT_IMPORT_TIME_BUDGET)
+    )
+    assert times[module] < budget
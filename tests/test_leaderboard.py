@@ -0,0 +1,220 @@
+"""Tests for the leaderboard module."""
+import json
+import os
+import time
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from llmops.common.leaderboard import (
+    bootstrap_compare,
+    build_leaderboard,
+    compare_variants,
+    label_variants,
+    main,
+    pivot_scores,
+    select_winner,
+    to_score,
+)
+
+THIS_PATH = os.path.dirname(__file__)
+RESOURCE_PATH = os.path.join(THIS_PATH, "resources")
+
+
+def _details(scores: dict, node: str = "summarize") -> pd.DataFrame:
+    """Build evaluation details of prompt_eval, default variant first."""
+    frames = []
+    for variant, values in scores.items():
+        frame = pd.DataFrame(
+            {
+                "inputs.line_number": range(len(values)),
+                "outputs.correctness": values,
+                "flow_name": "eval",
+                "eval_dataset": "ds1_eval",
+            }
+        )
+        if variant != "defaults":
+            frame[node] = variant
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+def test_to_score():
+    """Test line outputs are converted to scores."""
+    assert to_score(4) == 4.0
+    assert to_score("3") == 3.0
+    assert to_score({"score": "5", "explanation": "ok"}) == 5.0
+    assert to_score("{'score': '2', 'explanation': 'ok'}") == 2.0
+    assert to_score("Correct") == 1.0
+    assert to_score("Incorrect") == 0.0
+    assert np.isnan(to_score("not a score"))
+    assert np.isnan(to_score(None))
+
+
+def test_label_variants():
+    """Test lines are labelled with the node variants they change."""
+    details = pd.DataFrame(
+        {
+            "summarize": [None, "variant_0", "variant_1", "variant_0"],
+            "classify": [None, "variant_1", "variant_0", "variant_0"],
+        }
+    )
+
+    labels = label_variants(
+        details, {"summarize": "variant_0", "classify": "variant_0"}
+    )
+
+    assert list(labels) == [
+        "defaults",
+        "classify=variant_1",
+        "summarize=variant_1",
+        "defaults",
+    ]
+
+
+def test_pivot_scores_pairs_lines():
+    """Test only the lines scored for every variant are compared."""
+    details = _details({"defaults": [1, 2, 3], "variant_1": [2, 3]})
+    details["variant"] = label_variants(details, {"summarize": "variant_0"})
+
+    scores = pivot_scores(details, "correctness")
+
+    assert list(scores.columns) == ["defaults", "summarize=variant_1"]
+    assert scores.to_numpy().tolist() == [[1, 2], [2, 3]]
+    with pytest.raises(ValueError):
+        pivot_scores(details, "fluency")
+
+
+def test_bootstrap_compare():
+    """Test the paired bootstrap statistics of every variant."""
+    rng = np.random.default_rng(0)
+    baseline = rng.normal(3, 1, 500)
+    scores = np.column_stack([baseline, baseline + 0.5, baseline])
+
+    stats = bootstrap_compare(scores, n_resamples=500, seed=1)
+
+    assert stats["mean"] == pytest.approx(scores.mean(axis=0))
+    assert np.all(stats["ci_low"] < stats["mean"])
+    assert np.all(stats["mean"] < stats["ci_high"])
+    # Paired differences of a constant shift have no variance
+    assert stats["diff_low"][1] == pytest.approx(0.5)
+    assert stats["diff_high"][1] == pytest.approx(0.5)
+    assert stats["p_better"].tolist() == [0, 1, 0]
+    assert stats["win_rate"].tolist() == [0, 1, 0]
+    assert stats["tie_rate"].tolist() == [1, 0, 1]
+
+    same_seed = bootstrap_compare(scores, n_resamples=500, seed=1)
+    assert same_seed["ci_low"] == pytest.approx(stats["ci_low"])
+    with pytest.raises(ValueError):
+        bootstrap_compare(np.empty((0, 2)))
+
+
+def test_bootstrap_compare_is_vectorised():
+    """Test thousands of lines and dozens of variants are compared fast."""
+    scores = np.random.default_rng(0).integers(1, 6, (5000, 40))
+
+    start = time.perf_counter()
+    stats = bootstrap_compare(scores, n_resamples=1000, seed=0)
+
+    assert time.perf_counter() - start < 10
+    assert stats["mean"].shape == (40,)
+
+
+def test_build_leaderboard_and_winner():
+    """Test variants are ranked and a significant winner selected."""
+    rng = np.random.default_rng(0)
+    baseline = rng.integers(1, 5, 300).astype(float)
+    scores = pd.DataFrame(
+        {
+            "defaults": baseline,
+            "better": baseline + rng.integers(0, 2, 300),
+            "noisy": baseline + rng.choice([-1, 0, 1], 300),
+        }
+    )
+
+    leaderboard = build_leaderboard(scores, seed=0)
+
+    assert list(leaderboard["variant"])[0] == "better"
+    assert list(leaderboard["rank"]) == [1, 2, 3]
+    assert set(leaderboard["lines"]) == {300}
+    significant = dict(zip(leaderboard["variant"], leaderboard["significant"]))
+    assert significant == {"better": 1, "defaults": 0, "noisy": 0}
+    assert select_winner(leaderboard) == "better"
+    assert select_winner(leaderboard[leaderboard["variant"] != "better"]) == (
+        "defaults"
+    )
+    with pytest.raises(ValueError):
+        build_leaderboard(scores, baseline="missing")
+
+
+def test_compare_variants_per_dataset():
+    """Test variants are compared per evaluation dataset and evaluator."""
+    details = pd.concat(
+        [
+            _details({"defaults": [1, 2, 3], "variant_1": [3, 4, 5]}),
+            _details({"defaults": [1, 1], "variant_1": [1, 1]}).assign(
+                eval_dataset="ds2_eval"
+            ),
+        ],
+        ignore_index=True,
+    )
+
+    leaderboard = compare_variants(
+        details, "correctness", {"summarize": "variant_0"}, seed=0
+    )
+
+    assert list(leaderboard["eval_dataset"]) == [
+        "ds1_eval",
+        "ds1_eval",
+        "ds2_eval",
+        "ds2_eval",
+    ]
+    assert leaderboard["variant"][0] == "summarize=variant_1"
+    assert leaderboard["diff"][0] == pytest.approx(2)
+
+
+@patch("llmops.common.leaderboard.resolve_flow_type")
+def test_main(mock_resolve_flow_type, tmp_path):
+    """Test the leaderboard of a result report of prompt_eval."""
+    mock_resolve_flow_type.return_value = (None, {})
+    _details(
+        {"defaults": [1, 2, 3, 2] * 10, "variant_1": [3, 4, 5, 4] * 10},
+        node="variant_0",
+    ).to_csv(tmp_path / "exp_result.csv")
+    output_file = tmp_path / "winner.json"
+
+    with patch(
+        "llmops.common.leaderboard.load_experiment"
+    ) as mock_load_experiment:
+        experiment = mock_load_experiment.return_value
+        experiment.name = "exp"
+        experiment.get_flow_detail.return_value.default_variants = {
+            "variant_0": "variant_0"
+        }
+        main(
+            [
+                "--base_path",
+                RESOURCE_PATH,
+                "--report_dir",
+                str(tmp_path),
+                "--metric",
+                "correctness",
+                "--seed",
+                "0",
+                "--output_file",
+                str(output_file),
+            ]
+        )
+
+    leaderboard = pd.read_csv(tmp_path / "exp_leaderboard.csv")
+    assert list(leaderboard["variant"]) == ["variant_0=variant_1", "defaults"]
+    assert json.loads(output_file.read_text()) == [
+        {
+            "eval_dataset": "ds1_eval",
+            "flow_name": "eval",
+            "metric": "correctness",
+            "variant": "variant_0=variant_1",
+        }
+    ]
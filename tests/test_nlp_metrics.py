@@ -0,0 +1,131 @@
+"""Tests for the nlp_metrics module."""
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from llmops.common.nlp_metrics import (
+    bleu,
+    compute_metrics,
+    embedding_cosine,
+    exact_match,
+    normalize_text,
+    normalized_match,
+    rouge_l,
+    select_mapped_column,
+    token_f1,
+)
+
+PREDICTIONS = [
+    "The cat sat on the mat.",
+    "quick brown fox jumps",
+    "",
+    "Paris",
+]
+REFERENCES = [
+    "the cat sat on a mat",
+    "quick brown dog jumps over",
+    "anything",
+    "Paris",
+]
+
+
+def test_normalize_text():
+    """Test texts are lowercased without punctuation and articles."""
+    assert list(normalize_text(["The  Cat, sat!", None])) == ["cat sat", ""]
+
+
+def test_match_metrics():
+    """Test exact and normalized matches."""
+    assert exact_match(PREDICTIONS, REFERENCES).tolist() == [0, 0, 0, 1]
+    assert normalized_match(PREDICTIONS, REFERENCES).tolist() == [1, 0, 0, 1]
+
+
+def test_overlap_metrics():
+    """Test token F1, BLEU and ROUGE-L against hand computed scores."""
+    assert token_f1(PREDICTIONS, REFERENCES) == pytest.approx(
+        [1, 2 * 0.75 * 0.6 / 1.35, 0, 1]
+    )
+    # Precisions 3/4, (1+1)/(3+1), 1/3, 1/2 and brevity penalty of 4/5
+    assert bleu(PREDICTIONS, REFERENCES) == pytest.approx(
+        [1, 0.5 * np.exp(1 - 5 / 4), 0, 1]
+    )
+    # Longest common subsequence: quick brown jumps
+    assert rouge_l(PREDICTIONS, REFERENCES) == pytest.approx(
+        [1, 2 * 0.75 * 0.6 / 1.35, 0, 1]
+    )
+    assert rouge_l(["y x"], ["x y"]) == pytest.approx([0.5])
+    assert token_f1(["x x y"], ["x y y"]) == pytest.approx([2 / 3])
+
+
+def test_embedding_cosine():
+    """Test the cosine similarity of the embeddings of a model."""
+    vectors = {"x": [1.0, 0.0], "y": [0.0, 2.0], "z": [3.0, 3.0]}
+
+    scores = embedding_cosine(
+        ["x", "x", "z"],
+        ["x", "y", "x"],
+        lambda texts: np.array([vectors[text] for text in texts]),
+    )
+
+    assert scores == pytest.approx([1, 0, np.sqrt(0.5)])
+
+
+def test_compute_metrics():
+    """Test metrics are computed over whole columns."""
+    scores = compute_metrics(PREDICTIONS, REFERENCES)
+
+    assert list(scores.columns) == [
+        "exact_match",
+        "normalized_match",
+        "token_f1",
+        "bleu",
+        "rouge_l",
+    ]
+    assert len(scores) == 4
+    with pytest.raises(ValueError):
+        compute_metrics(PREDICTIONS, REFERENCES, ["perplexity"])
+    with pytest.raises(ValueError):
+        compute_metrics(PREDICTIONS, REFERENCES[:2])
+
+
+def test_compute_metrics_is_vectorised():
+    """Test thousands of lines are scored in well under a second each."""
+    rng = np.random.default_rng(0)
+    words = np.array([f"w{index}" for index in range(2000)])
+    predictions = [" ".join(rng.choice(words, 30)) for _ in range(5000)]
+    references = [" ".join(rng.choice(words, 30)) for _ in range(5000)]
+
+    start = time.perf_counter()
+    compute_metrics(predictions, references)
+
+    assert time.perf_counter() - start < 5
+
+
+def test_select_mapped_column():
+    """Test evaluator inputs are read from the run and the dataset."""
+    run_details = pd.DataFrame(
+        {
+            "inputs.line_number": [1, 0],
+            "inputs.question": ["q1", "q0"],
+            "outputs.answer": ["a1", "a0"],
+        }
+    )
+    data = pd.DataFrame({"truth": ["t0", "t1", "t2"]})
+
+    answers = select_mapped_column("${run.outputs.answer}", run_details, data)
+    assert list(answers[:2]) == ["a0", "a1"]
+    assert pd.isna(answers[2])
+    assert list(
+        select_mapped_column("${run.inputs.question}", run_details, data)
+    )[:2] == ["q0", "q1"]
+    assert list(select_mapped_column("${data.truth}", run_details, data)) == [
+        "t0",
+        "t1",
+        "t2",
+    ]
+    with pytest.raises(ValueError):
+        select_mapped_column("${data.missing}", run_details, data)
+    with pytest.raises(ValueError):
+        select_mapped_column("constant", run_details, data)
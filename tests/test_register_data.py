@@ -27,7 +27,7 @@ def test_register_data_asset():
 
     data_hash = generate_file_hash(data_path)
     with patch(
-        "llmops.common.register_data_asset.MLClient"
+        "llmops.common.clients.MLClient"
     ) as mock_ml_client:
         # Mock the MLClient
         ml_client_instance = Mock()
@@ -62,7 +62,7 @@ def test_register_existing_data_asset():
     data_path = str(RESOURCE_PATH / "data/data.jsonl")
     data_hash = generate_file_hash(data_path)
     with patch(
-        "llmops.common.register_data_asset.MLClient"
+        "llmops.common.clients.MLClient"
     ) as mock_ml_client:
         # Mock the MLClient
         ml_client_instance = Mock()
@@ -23,7 +23,7 @@ def test_register_model():
     model_path = str(RESOURCE_PATH / "flows/exp_flow")
     model_hash = hash_folder(model_path)
     with patch(
-        "llmops.common.deployment.register_model.MLClient"
+        "llmops.common.clients.MLClient"
     ) as mock_ml_client:
         # Mock the MLClient
         ml_client_instance = Mock()
@@ -60,7 +60,7 @@ def test_register_existing_model():
     model_path = str(RESOURCE_PATH / "flows/exp_flow")
     model_hash = hash_folder(model_path)
     with patch(
-        "llmops.common.deployment.register_model.MLClient"
+        "llmops.common.clients.MLClient"
     ) as mock_ml_client:
         # Mock the MLClient
         ml_client_instance = Mock()
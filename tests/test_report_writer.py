@@ -0,0 +1,150 @@
+"""Tests for the report_writer module."""
+import pandas as pd
+import pytest
+
+from llmops.common.report_writer import StreamingReportWriter
+
+
+def test_report_writer_append_and_write(tmp_path):
+    """Test rows appended in several calls end up in one report."""
+    writer = StreamingReportWriter(str(tmp_path), chunk_size=2)
+    writer.append(
+        "ds1_result",
+        pd.DataFrame(
+            {"inputs.question": ["q1", "q2", "q3"], "score": [1, 2, 3]}
+        ),
+    )
+    writer.append("ds1_result", {"inputs.question": "q4", "variant_0": "v"})
+    writer.write_report("ds1_result")
+
+    report = pd.read_csv(tmp_path / "ds1_result.csv", index_col=0)
+    assert list(report.columns) == ["inputs.question", "score", "variant_0"]
+    assert list(report.index) == [0, 1, 2, 3]
+    assert list(report["inputs.question"]) == ["q1", "q2", "q3", "q4"]
+    assert pd.isna(report["score"][3])
+
+    html = (tmp_path / "ds1_result.html").read_text()
+    assert html.count("<table") == 1
+    assert html.count("<tbody>") == 1
+    assert html.count("</tr>") == 5
+    assert html.rstrip().endswith("</table>")
+
+
+def test_report_writer_combined_report(tmp_path):
+    """Test combining reports with extra columns."""
+    writer = StreamingReportWriter(str(tmp_path))
+    writer.append("ds1_result", pd.DataFrame({"a": [1, 2]}))
+    writer.append("ds2_result", pd.DataFrame({"b": [3]}))
+    assert writer.report_names == ["ds1_result", "ds2_result"]
+
+    writer.write_report(
+        "exp_result",
+        ["ds1_result", "ds2_result"],
+        {"stage": "dev", "build": "1"},
+    )
+
+    report = pd.read_csv(tmp_path / "exp_result.csv", index_col=0)
+    assert list(report.columns) == ["a", "b", "stage", "build"]
+    assert list(report.index) == [0, 1, 2]
+    assert list(report["stage"]) == ["dev"] * 3
+    assert list(report["b"].fillna(0)) == [0, 0, 3]
+
+
+def test_report_writer_truncates_previous_reports(tmp_path):
+    """Test a new writer doesn't keep rows of a previous execution."""
+    StreamingReportWriter(str(tmp_path)).append("r", {"a": 1})
+    writer = StreamingReportWriter(str(tmp_path))
+    writer.append("r", {"a": 2})
+    writer.write_report("r")
+
+    report = pd.read_csv(tmp_path / "r.csv", index_col=0)
+    assert list(report["a"]) == [2]
+
+
+def test_report_writer_empty_report(tmp_path):
+    """Test writing a report without rows."""
+    writer = StreamingReportWriter(str(tmp_path))
+    writer.write_report("empty", extra_columns={"stage": "dev"})
+
+    assert (tmp_path / "empty.csv").read_text().strip() == ",stage"
+    assert "<table" in (tmp_path / "empty.html").read_text()
+
+
+def test_report_writer_paginated_html(tmp_path):
+    """Test html reports split in pages with navigation links."""
+    writer = StreamingReportWriter(
+        str(tmp_path), chunk_size=2, html_page_size=3
+    )
+    writer.append("r", pd.DataFrame({"a": range(4)}))
+    writer.append("r", pd.DataFrame({"a": range(4, 7)}))
+    writer.write_report("r")
+
+    pages = [
+        (tmp_path / name).read_text()
+        for name in ["r.html", "r_page2.html", "r_page3.html"]
+    ]
+    assert [page.count("</tr>") - 1 for page in pages] == [3, 3, 1]
+    assert "Page 1 of 3" in pages[0]
+    assert 'href="r_page2.html"' in pages[0]
+    assert 'href="r.html"' in pages[1]
+    assert not (tmp_path / "r_page4.html").exists()
+
+
+def test_report_writer_skip_html(tmp_path):
+    """Test html rendering is optional."""
+    writer = StreamingReportWriter(str(tmp_path), write_html=False)
+    writer.append("r", {"a": 1})
+    writer.write_report("r")
+
+    assert (tmp_path / "r.csv").exists()
+    assert not (tmp_path / "r.html").exists()
+
+
+def test_report_writer_parquet(tmp_path):
+    """Test parquet reports partitioned by experiment/dataset/variant."""
+    pytest.importorskip("pyarrow")
+    writer = StreamingReportWriter(
+        str(tmp_path), chunk_size=2, report_format="parquet"
+    )
+    partition = {"experiment": "exp", "dataset": "ds1", "build_id": "1"}
+    writer.append(
+        "ds1_result",
+        pd.DataFrame({"score": [1, 2, 3], "output": ["a", "b", "c"]}),
+        {**partition, "variant": "${node.variant_0}"},
+    )
+    writer.append(
+        "ds1_result",
+        pd.DataFrame({"score": [0.5], "output": [{"nested": True}]}),
+        {**partition, "variant": "defaults"},
+    )
+    writer.append(
+        "ds2_result",
+        pd.DataFrame({"score": [4], "dataset": ["ignored"]}),
+        {**partition, "dataset": "ds2", "variant": "defaults"},
+    )
+    writer.write_report(
+        "exp_result", ["ds1_result", "ds2_result"], {"stage": "dev"}
+    )
+
+    assert not (tmp_path / "exp_result.csv").exists()
+    root = tmp_path / "exp_result.parquet"
+    assert (
+        root / "experiment=exp" / "dataset=ds1" / "variant=defaults"
+        / "build_id=1" / "part-0.parquet"
+    ).exists()
+
+    report = pd.read_parquet(root)
+    assert len(report) == 5
+    assert sorted(report["score"]) == [0.5, 1, 2, 3, 4]
+    assert set(report["variant"].astype(str)) == {
+        "${node.variant_0}", "defaults"
+    }
+    assert set(report["dataset"].astype(str)) == {"ds1", "ds2"}
+    assert '{"nested": true}' in list(report["output"])
+    assert set(report["stage"]) == {"dev"}
+
+
+def test_report_writer_invalid_format(tmp_path):
+    """Test unknown report formats are rejected."""
+    with pytest.raises(ValueError):
+        StreamingReportWriter(str(tmp_path), report_format="xlsx")
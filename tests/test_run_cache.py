@@ -0,0 +1,71 @@
+"""Tests for the run_cache module."""
+import pandas as pd
+
+from llmops.common.common import hash_folder
+from llmops.common.run_cache import RunCache, compute_run_key
+
+
+def test_compute_run_key():
+    """Test compute_run_key changes with every input."""
+    base_args = {
+        "flow_hash": "flow",
+        "variant": "${node.variant_0}",
+        "data_hash": "data",
+        "column_mapping": {"question": "${data.question}"},
+        "environment_variables": {"KEY": "value"},
+    }
+    key = compute_run_key(**base_args)
+    assert key == compute_run_key(**base_args)
+
+    for name, value in [
+        ("flow_hash", "other_flow"),
+        ("variant", "${node.variant_1}"),
+        ("data_hash", "other_data"),
+        ("column_mapping", {"question": "${data.other}"}),
+        ("environment_variables", {"KEY": "other"}),
+    ]:
+        assert key != compute_run_key(**{**base_args, name: value})
+
+
+def test_run_key_ignores_local_run_artifacts(tmp_path):
+    """Test files generated by local runs don't change the run key."""
+    flow = tmp_path / "flow"
+    flow.mkdir()
+    (flow / "flow.dag.yaml").write_text("nodes: []\n")
+    (flow / "tool.py").write_text("def tool():\n    pass\n")
+    key = compute_run_key(hash_folder(str(flow)), None, "data", None)
+
+    (flow / "__pycache__").mkdir()
+    (flow / "__pycache__" / "tool.cpython-311.pyc").write_bytes(b"pyc")
+    (flow / ".promptflow").mkdir()
+    (flow / ".promptflow" / "flow.tools.json").write_text("{}")
+    (flow / "compiled.pyc").write_bytes(b"pyc")
+    assert compute_run_key(hash_folder(str(flow)), None, "data", None) == key
+
+    (flow / "tool.py").write_text("def tool():\n    return 1\n")
+    assert compute_run_key(hash_folder(str(flow)), None, "data", None) != key
+
+
+def test_run_cache_roundtrip(tmp_path):
+    """Test storing and reading back a run."""
+    cache = RunCache(str(tmp_path / "cache"))
+    details = pd.DataFrame(
+        {"inputs.question": ["q1", "q2"], "outputs.answer": ["a1", "a2"]}
+    )
+
+    assert cache.get("key") is None
+    assert cache.put("key", "run_1", "Completed", details)
+
+    cached_run = cache.get("key")
+    assert cached_run.name == "run_1"
+    assert cached_run.status == "Completed"
+    pd.testing.assert_frame_equal(cached_run.details, details)
+
+
+def test_run_cache_skips_failed_runs(tmp_path):
+    """Test that runs which did not complete are not cached."""
+    cache = RunCache(str(tmp_path))
+    details = pd.DataFrame({"outputs.answer": ["a1"]})
+
+    assert not cache.put("key", "run_1", "Failed", details)
+    assert cache.get("key") is None
@@ -0,0 +1,337 @@
+"""Test the prompt_eval module."""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+import pandas as pd
+import pytest
+
+from llmops.common.experiment import load_experiment
+from llmops.common.prompt_eval import (
+    RunDatasetIndex,
+    fetch_runs,
+    prepare_and_execute,
+)
+
+THIS_PATH = Path(__file__).parent
+RESOURCE_PATH = THIS_PATH / "resources"
+
+
+@pytest.fixture(scope="module", autouse=True)
+def _set_required_env_vars():
+    """Set required environment variables."""
+    monkeypatch = pytest.MonkeyPatch()
+    monkeypatch.setenv("SUBSCRIPTION_ID", "TEST_SUBSCRIPTION_ID")
+    monkeypatch.setenv("RESOURCE_GROUP_NAME", "TEST_RESOURCE_GROUP_NAME")
+    monkeypatch.setenv("WORKSPACE_NAME", "TEST_WORKSPACE_NAME")
+
+
+def _standard_run(name, data, tags=None):
+    run = Mock()
+    run.name = name
+    run.data = data
+    run.tags = tags or {}
+    run.properties = {}
+    return run
+
+
+def _mock_pf_client(mock_pf_client, standard_runs):
+    """Mock a client running evaluations on the rows of their data."""
+    pf_client_instance = Mock()
+    mock_pf_client.return_value = pf_client_instance
+    submitted = {}
+
+    def _create_run(**kwargs):
+        with open(kwargs["data"]) as data_file:
+            submitted[kwargs["name"]] = [
+                json.loads(line)["data"] for line in data_file
+            ]
+        run = Mock()
+        run.name = kwargs["name"]
+        run.status = "Completed"
+        return run
+
+    pf_client_instance.runs.get.side_effect = lambda name: standard_runs[name]
+    pf_client_instance.run.side_effect = _create_run
+    pf_client_instance.get_details.side_effect = lambda run: pd.DataFrame(
+        {"outputs.score": submitted[run.name]}
+    )
+    pf_client_instance.get_metrics.side_effect = lambda run: {"score": 1}
+    return pf_client_instance, submitted
+
+
+def test_run_evaluation_flow_parallel(tmp_path):
+    """Test evaluations are planned up front and executed in parallel."""
+    data = str(RESOURCE_PATH / "data" / "rows.jsonl")
+    standard_runs = {
+        "run_1": _standard_run("run_1", data),
+        "run_2": _standard_run("run_2", data),
+    }
+    report_dir = str(tmp_path / "reports")
+    with patch("promptflow.client.PFClient") as mock_pf_client:
+        pf_client_instance, submitted = _mock_pf_client(
+            mock_pf_client, standard_runs
+        )
+        running = []
+        max_running = []
+        lock = threading.Lock()
+        create_run = pf_client_instance.run.side_effect
+
+        def _slow_run(**kwargs):
+            with lock:
+                running.append(kwargs["name"])
+                max_running.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.remove(kwargs["name"])
+            return create_run(**kwargs)
+
+        pf_client_instance.run.side_effect = _slow_run
+
+        prepare_and_execute(
+            str(["run_1", "run_2"]),
+            exp_filename="experiment_5.yaml",
+            base_path=str(RESOURCE_PATH),
+            report_dir=report_dir,
+            skip_html=True,
+            max_parallel_runs=4,
+        )
+
+        # 2 evaluators x 2 standard runs x 1 dataset
+        assert len(submitted) == 4
+        assert max(max_running) > 1
+        assert pf_client_instance.get_details.call_count == 4
+        assert pf_client_instance.get_metrics.call_count == 4
+
+        report = pd.read_csv(os.path.join(report_dir, "exp_result.csv"))
+        assert len(report) == 20
+        assert sorted(set(zip(report["flow_name"], report["exp_run"]))) == [
+            ("eval_a", "run_1"),
+            ("eval_a", "run_2"),
+            ("eval_b", "run_1"),
+            ("eval_b", "run_2"),
+        ]
+
+
+def test_run_evaluation_flow_shard_run(tmp_path):
+    """Test shard runs are evaluated on their rows of the dataset."""
+    standard_runs = {
+        "run_shard1": _standard_run(
+            "run_shard1",
+            str(tmp_path / "rows_shard1.jsonl"),
+            {
+                "llmops.logical_run": "run",
+                "llmops.dataset": "ds1",
+                "llmops.shard_rows": "3:5",
+            },
+        ),
+    }
+    report_dir = str(tmp_path / "reports")
+    with patch("promptflow.client.PFClient") as mock_pf_client, patch.dict(
+        os.environ
+    ):
+        pf_client_instance, submitted = _mock_pf_client(
+            mock_pf_client, standard_runs
+        )
+
+        prepare_and_execute(
+            str(["run_shard1"]),
+            exp_filename="experiment_5.yaml",
+            base_path=str(RESOURCE_PATH),
+            report_dir=report_dir,
+            skip_html=True,
+            eval_cache_dir=str(tmp_path / "eval_cache"),
+        )
+
+        assert list(submitted.values()) == [["row 3", "row 4"]] * 2
+        # Evaluators get the folder of the evaluation cache
+        assert all(
+            call.kwargs["environment_variables"]["EVAL_CACHE_DIR"]
+            == str(tmp_path / "eval_cache")
+            for call in pf_client_instance.run.call_args_list
+        )
+        report = pd.read_csv(os.path.join(report_dir, "exp_result.csv"))
+        assert set(report["exp_run"]) == {"run"}
+
+
+def test_run_evaluation_flow_early_stopping(tmp_path):
+    """Test the remaining rows of a losing variant are not evaluated."""
+    data = str(RESOURCE_PATH / "data" / "rows.jsonl")
+    standard_runs = {
+        "run_1": _standard_run("run_1", data),
+        "run_2": _standard_run("run_2", data),
+    }
+    report_dir = str(tmp_path / "reports")
+    with patch("promptflow.client.PFClient") as mock_pf_client:
+        pf_client_instance, submitted = _mock_pf_client(
+            mock_pf_client, standard_runs
+        )
+        column_mappings = {}
+        batch_rows = {}
+        create_run = pf_client_instance.run.side_effect
+
+        def _create_batch_run(**kwargs):
+            column_mappings[kwargs["name"]] = kwargs["column_mapping"]
+            with open(kwargs["data"]) as data_file:
+                batch_rows[kwargs["name"]] = [
+                    json.loads(line) for line in data_file
+                ]
+            return create_run(**kwargs)
+
+        def _get_details(run, all_results=False):
+            assert all_results
+            if run.name in standard_runs:
+                # run_1 answers score 5, run_2 answers score 1
+                score = 5 if run.name == "run_1" else 1
+                return pd.DataFrame(
+                    {
+                        "inputs.line_number": range(5),
+                        "outputs.output": [score] * 5,
+                    }
+                )
+            return pd.DataFrame(
+                {
+                    "inputs.line_number": range(len(batch_rows[run.name])),
+                    "outputs.score": [
+                        row["run_outputs_output"]
+                        for row in batch_rows[run.name]
+                    ],
+                }
+            )
+
+        pf_client_instance.run.side_effect = _create_batch_run
+        pf_client_instance.get_details.side_effect = _get_details
+
+        prepare_and_execute(
+            str(["run_1", "run_2"]),
+            exp_filename="experiment_5.yaml",
+            base_path=str(RESOURCE_PATH),
+            report_dir=report_dir,
+            skip_html=True,
+            max_parallel_runs=4,
+            early_stop_metric="score",
+            early_stop_batch_size=2,
+        )
+
+    # run_1 is evaluated on 3 batches, run_2 is stopped after the first one
+    assert sorted(len(rows) for rows in submitted.values()) == [
+        1, 1, 2, 2, 2, 2, 2, 2,
+    ]
+    assert set(
+        mapping["answer"] for mapping in column_mappings.values()
+    ) == {"${data.run_outputs_output}"}
+
+    report = pd.read_csv(os.path.join(report_dir, "exp_result.csv"))
+    run_1_lines = report[
+        (report["exp_run"] == "run_1") & (report["flow_name"] == "eval_a")
+    ]
+    assert list(run_1_lines["inputs.line_number"]) == [0, 1, 2, 3, 4]
+    metrics = pd.read_csv(os.path.join(report_dir, "exp_metrics.csv"))
+    stopped = dict(zip(metrics["exp_run"], metrics["early_stopped"]))
+    assert stopped == {"run_1": False, "run_2": True}
+    assert sorted(metrics["rows_evaluated"]) == [2, 2, 5, 5]
+
+
+def test_run_evaluation_flow_nlp_metrics(tmp_path):
+    """Test runs are scored with LLM-free metrics before the evaluators."""
+    data = str(RESOURCE_PATH / "data" / "rows.jsonl")
+    standard_runs = {"run_1": _standard_run("run_1", data)}
+    report_dir = str(tmp_path / "reports")
+    with patch("promptflow.client.PFClient") as mock_pf_client:
+        pf_client_instance, submitted = _mock_pf_client(
+            mock_pf_client, standard_runs
+        )
+        get_details = pf_client_instance.get_details.side_effect
+        calls = []
+
+        def _get_details(run, all_results=False):
+            calls.append(run.name)
+            if run.name in standard_runs:
+                assert not submitted
+                # Rows 0 and 1 are answered right
+                return pd.DataFrame(
+                    {
+                        "inputs.line_number": range(5),
+                        "outputs.output": [
+                            "row 0",
+                            "Row 1.",
+                            "row 20",
+                            "none",
+                            "none",
+                        ],
+                    }
+                )
+            return get_details(run=run)
+
+        pf_client_instance.get_details.side_effect = _get_details
+
+        prepare_and_execute(
+            str(["run_1"]),
+            exp_filename="experiment_5.yaml",
+            base_path=str(RESOURCE_PATH),
+            report_dir=report_dir,
+            skip_html=True,
+            nlp_metrics=["exact_match", "normalized_match", "token_f1"],
+            nlp_prediction="answer",
+        )
+
+    # Only eval_a maps a groundtruth, the run details are fetched once
+    assert calls.count("run_1") == 1
+    metrics = pd.read_csv(os.path.join(report_dir, "exp_metrics.csv"))
+    nlp_metrics = metrics[metrics["flow_name"] == "nlp_metrics"]
+    assert len(nlp_metrics) == 1
+    assert nlp_metrics["exact_match_mean"].iloc[0] == pytest.approx(0.2)
+    assert nlp_metrics["normalized_match_mean"].iloc[0] == pytest.approx(0.4)
+    assert nlp_metrics["total"].iloc[0] == 5
+    report = pd.read_csv(os.path.join(report_dir, "exp_result.csv"))
+    nlp_lines = report[report["flow_name"] == "nlp_metrics"]
+    assert list(nlp_lines["outputs.token_f1"]) == pytest.approx(
+        [1, 1, 0.5, 0, 0]
+    )
+
+    with pytest.raises(ValueError):
+        prepare_and_execute(
+            str(["run_1"]),
+            exp_filename="experiment_5.yaml",
+            base_path=str(RESOURCE_PATH),
+            nlp_metrics=["perplexity"],
+        )
+
+
+def test_fetch_runs():
+    """Test runs are fetched concurrently, duplicates once."""
+    barrier = threading.Barrier(3, timeout=5)
+    fetched = []
+
+    def _get_run(name):
+        fetched.append(name)
+        # Fails unless the three runs are fetched at the same time
+        barrier.wait()
+        return _standard_run(name, "data.jsonl")
+
+    runs = fetch_runs(_get_run, ["run_1", "run_2", "run_1", "run_3"])
+
+    assert sorted(fetched) == ["run_1", "run_2", "run_3"]
+    assert list(runs.keys()) == ["run_1", "run_2", "run_3"]
+    assert runs["run_2"].name == "run_2"
+
+
+def test_run_dataset_index():
+    """Test the dataset of a run is found by path, source or tag."""
+    experiment = load_experiment(
+        filename="experiment_3.yaml", base_path=str(RESOURCE_PATH)
+    )
+    index = RunDatasetIndex(experiment, str(RESOURCE_PATH))
+    data = str(RESOURCE_PATH / "data" / "data.jsonl")
+
+    # The ./data/data.jsonl source is found by its absolute path
+    assert index.find(_standard_run("run", data))[1].name == "ds1"
+    assert index.find(
+        _standard_run("run", "shard.jsonl", {"llmops.dataset": "ds1"})
+    )[1].name == "ds1"
+    assert index.find(_standard_run("run", "/other/data.jsonl")) == (
+        os.path.join("other", "data.jsonl"), None
+    )
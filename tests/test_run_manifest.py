@@ -0,0 +1,48 @@
+"""Tests for the run_manifest module."""
+import json
+
+import pytest
+
+from llmops.common.experiment import Dataset
+from llmops.common.run_manifest import RunManifest, checkpoint_key
+from llmops.common.run_planner import PlannedRun
+
+
+def test_checkpoint_key():
+    """Test the key doesn't depend on run names or node order."""
+    mapped_dataset = Dataset("ds", "data.jsonl", None, None).with_mappings({})
+    run = PlannedRun("run_1", mapped_dataset, {"b": "v1", "a": "v0"})
+    other = PlannedRun("run_2", mapped_dataset, {"a": "v0", "b": "v1"})
+
+    assert checkpoint_key(run) == "ds|a.v0,b.v1"
+    assert checkpoint_key(run) == checkpoint_key(other)
+
+
+def test_run_manifest_resume(tmp_path):
+    """Test entries are saved after every update and reloaded on resume."""
+    path = str(tmp_path / "checkpoint.json")
+    manifest = RunManifest(path, "exp")
+    manifest.mark_submitted("key_1", "run_1")
+    manifest.mark_finished("key_1", "run_1", "Completed")
+    manifest.mark_submitted("key_2", "run_2")
+
+    with open(path) as manifest_file:
+        saved = json.load(manifest_file)
+    assert saved["runs"]["key_2"]["status"] == "Submitted"
+
+    resumed = RunManifest(path, "exp", resume=True)
+    assert resumed.is_completed("key_1")
+    assert not resumed.is_completed("key_2")
+    assert resumed.get("key_2")["run_name"] == "run_2"
+
+    # Without resume the manifest starts empty
+    assert RunManifest(path, "exp").get("key_1") is None
+
+
+def test_run_manifest_other_experiment(tmp_path):
+    """Test resuming the manifest of another experiment fails."""
+    path = str(tmp_path / "checkpoint.json")
+    RunManifest(path, "exp").mark_submitted("key", "run")
+
+    with pytest.raises(ValueError):
+        RunManifest(path, "other_exp", resume=True)
@@ -0,0 +1,152 @@
+"""Tests for the run_planner module."""
+from llmops.common.experiment import Dataset, FlowDetail
+from llmops.common.run_planner import (
+    VariantsSelector,
+    format_run_plan,
+    grid_combinations,
+    plan_runs,
+    sample_combinations,
+    successive_halving,
+    variant_combination_key,
+)
+
+
+def _flow_detail():
+    """Return a flow with two nodes sharing variant names."""
+    return FlowDetail(
+        flow_path="flow",
+        all_variants=[
+            {"variant_0": "node_a", "variant_1": "node_a"},
+            {"variant_0": "node_b", "variant_1": "node_b"},
+        ],
+        all_llm_nodes={"node_a", "node_b"},
+        default_variants={"node_a": "variant_0", "node_b": "variant_0"},
+    )
+
+
+def _datasets():
+    """Return two mapped datasets."""
+    return [
+        Dataset(name, f"{name}_source", None, None).with_mappings({})
+        for name in ["ds1", "ds2"]
+    ]
+
+
+def test_variant_combination_key():
+    """Test that the key does not depend on the dictionary order."""
+    assert variant_combination_key(
+        {"node_a": "variant_0", "node_b": "variant_1"}
+    ) == variant_combination_key(
+        {"node_b": "variant_1", "node_a": "variant_0"}
+    )
+    assert variant_combination_key(
+        {"node_a": "variant_0"}
+    ) != variant_combination_key({"node_a": "variant_1"})
+
+
+def test_plan_runs_all_variants():
+    """Test that the default combination is only planned once."""
+    planned_runs = plan_runs(
+        "exp",
+        _datasets(),
+        _flow_detail(),
+        VariantsSelector.from_args("all"),
+        "20240101_000000",
+    )
+
+    # defaults, node_a.variant_1 and node_b.variant_1 for each dataset
+    assert [
+        (run.mapped_dataset.dataset.name, run.variant_string)
+        for run in planned_runs
+    ] == [
+        ("ds1", "${node_a.variant_0}"),
+        ("ds1", "${node_a.variant_1}"),
+        ("ds1", "${node_b.variant_1}"),
+        ("ds2", "${node_a.variant_0}"),
+        ("ds2", "${node_a.variant_1}"),
+        ("ds2", "${node_b.variant_1}"),
+    ]
+    assert planned_runs[2].combination == {
+        "node_a": "variant_0", "node_b": "variant_1"
+    }
+
+    # Run names stay unique although nodes share variant names
+    run_names = [run.run_name for run in planned_runs]
+    assert len(set(run_names)) == len(run_names)
+    assert "exp_variant_1_20240101_000000_ds1_node_b" in run_names
+
+    plan_description = format_run_plan(planned_runs)
+    assert plan_description.startswith("6 planned runs:")
+    assert "node_a.variant_0, node_b.variant_1" in plan_description
+
+
+def test_plan_runs_defaults():
+    """Test that only one run per dataset is planned for defaults."""
+    planned_runs = plan_runs(
+        "exp",
+        _datasets(),
+        _flow_detail(),
+        VariantsSelector.from_args("defaults"),
+        "20240101_000000",
+    )
+
+    assert [run.run_name for run in planned_runs] == [
+        "exp_20240101_000000_ds1",
+        "exp_20240101_000000_ds2",
+    ]
+    assert all(run.variant_string is None for run in planned_runs)
+
+
+def test_grid_combinations():
+    """Test the cartesian product of node variants."""
+    combinations = grid_combinations(_flow_detail())
+
+    assert combinations == [
+        {"node_a": "variant_0", "node_b": "variant_0"},
+        {"node_a": "variant_0", "node_b": "variant_1"},
+        {"node_a": "variant_1", "node_b": "variant_0"},
+        {"node_a": "variant_1", "node_b": "variant_1"},
+    ]
+
+
+def test_sample_combinations():
+    """Test that sampling is reproducible and keeps the grid order."""
+    combinations = grid_combinations(_flow_detail())
+
+    sample = sample_combinations(combinations, 2, seed=7)
+    assert sample == sample_combinations(combinations, 2, seed=7)
+    assert len(sample) == 2
+    assert sample == [c for c in combinations if c in sample]
+    assert sample_combinations(combinations, 10) == combinations
+
+
+def test_successive_halving():
+    """Test that the best combination is promoted on growing slices."""
+    combinations = grid_combinations(_flow_detail())
+    best = {"node_a": "variant_1", "node_b": "variant_0"}
+    scored_rows = []
+
+    def _score(candidates, rows):
+        scored_rows.append((len(candidates), rows))
+        return [1.0 if c == best else 0.5 for c in candidates]
+
+    promoted = successive_halving(combinations, _score, 10, 100)
+
+    assert promoted == [best]
+    assert scored_rows == [(4, 10), (2, 20)]
+
+
+def test_plan_runs_grid():
+    """Test that grid mode plans every combination for each dataset."""
+    planned_runs = plan_runs(
+        "exp",
+        _datasets(),
+        _flow_detail(),
+        VariantsSelector.from_args("grid"),
+        "20240101_000000",
+    )
+
+    assert len(planned_runs) == 8
+    assert all(run.grid for run in planned_runs)
+    assert planned_runs[3].variant_label == "node_a.variant_1,node_b.variant_1"
+    assert planned_runs[3].run_name == "exp_grid3_20240101_000000_ds1"
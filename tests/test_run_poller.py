@@ -0,0 +1,103 @@
+"""Tests for the run_poller module."""
+import logging
+from unittest.mock import Mock
+
+import pytest
+
+from llmops.common.common import STALE_JOB_TIMEOUT, wait_job_finish
+from llmops.common.run_poller import RunPoller
+
+logger = logging.getLogger("test_run_poller")
+
+
+def get_mocked_runs(statuses):
+    """Return a get_run function replaying a list of statuses per run."""
+    remaining = {name: list(values) for name, values in statuses.items()}
+
+    def _get_run(name):
+        run = Mock()
+        run.name = name
+        values = remaining[name]
+        run.status = values.pop(0) if len(values) > 1 else values[0]
+        return run
+
+    return _get_run
+
+
+def test_run_poller_wait():
+    """Test runs are returned as they finish, with exponential backoff."""
+    sleep = Mock()
+    poller = RunPoller(
+        get_mocked_runs(
+            {
+                "run_1": ["Running", "Completed"],
+                "run_2": ["Running", "Running", "Running", "Failed"],
+            }
+        ),
+        logger,
+        initial_delay=1,
+        max_delay=3,
+        sleep=sleep,
+    )
+
+    finished = [(run.name, run.status) for run in poller.wait(
+        ["run_1", "run_2", "run_1"]
+    )]
+
+    assert finished == [("run_1", "Completed"), ("run_2", "Failed")]
+    assert [call.args[0] for call in sleep.call_args_list] == [1, 2, 3]
+
+
+def test_run_poller_timeout():
+    """Test runs still running after the timeout raise an error."""
+    poller = RunPoller(
+        get_mocked_runs({"run_1": ["Running"]}),
+        logger,
+        timeout=0,
+        sleep=Mock(),
+    )
+
+    with pytest.raises(TimeoutError):
+        list(poller.wait(["run_1"]))
+
+
+def test_wait_job_finish():
+    """Test wait_job_finish refreshes the job until it completes."""
+    job = Mock()
+    job.name = "run_1"
+    job.status = "Running"
+    get_job = get_mocked_runs(
+        {"run_1": ["Running", "Running", "Completed"]}
+    )
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr("time.sleep", Mock())
+        wait_job_finish(job, logger, get_job)
+
+        with pytest.raises(Exception):
+            wait_job_finish(
+                job, logger, get_mocked_runs({"run_1": ["Failed"]})
+            )
+
+
+def test_wait_job_finish_stale_status(monkeypatch):
+    """Test a job whose status isn't refreshed doesn't wait forever."""
+    job = Mock()
+    job.name = "run_1"
+    job.status = "Running"
+    clock = [0.0]
+
+    def _sleep(seconds):
+        clock[0] += seconds
+
+    monkeypatch.setattr(
+        "llmops.common.run_poller.time",
+        Mock(monotonic=lambda: clock[0], sleep=_sleep),
+    )
+
+    with pytest.raises(Exception, match="exiting job with failure"):
+        wait_job_finish(job, logger)
+    assert clock[0] == STALE_JOB_TIMEOUT
+
+    job.status = "Completed"
+    wait_job_finish(job, logger)
@@ -1,12 +1,19 @@
 
 """Test the run_standard_flow function."""
+import json
+import os
 import random
 import string
+import threading
+import time
 
 from pathlib import Path
 from unittest.mock import Mock, patch
 
+import pandas as pd
 import pytest
+import yaml
+from llmops.common.common import resolve_run_ids
 from llmops.common.prompt_pipeline import VariantsSelector, prepare_and_execute
 
 THIS_PATH = Path(__file__).parent
@@ -66,11 +73,11 @@ def test_run_standard_flow_all():
     """Test run_standard_flow with all variants."""
     variant_selector = VariantsSelector.from_args("*")
     with patch(
-        "llmops.common.prompt_pipeline.PFClientLocal"
+        "promptflow.client.PFClient"
     ), patch(
-        "llmops.common.prompt_pipeline.PFClientAzure"
+        "promptflow.azure.PFClient"
     ) as mock_pf_client, patch(
-        "llmops.common.prompt_pipeline.MLClient"
+        "llmops.common.clients.MLClient"
     ) as mock_ml_client:
         # Mock the PFClient
         pf_client_instance = Mock()
@@ -155,11 +162,11 @@ def test_run_standard_flow_default():
     """Test run_standard_flow with the default variant."""
     variant_selector = VariantsSelector.from_args("default")
     with patch(
-        "llmops.common.prompt_pipeline.PFClientLocal"
+        "promptflow.client.PFClient"
     ), patch(
-        "llmops.common.prompt_pipeline.PFClientAzure"
+        "promptflow.azure.PFClient"
     ) as mock_pf_client, patch(
-        "llmops.common.prompt_pipeline.MLClient"
+        "llmops.common.clients.MLClient"
     ) as mock_ml_client:
         # Mock the PFClient
         pf_client_instance = Mock()
@@ -219,11 +226,11 @@ def test_run_standard_flow_custom():
         "node_var_0.var_1, node_var_1.var_4"
     )
     with patch(
-        "llmops.common.prompt_pipeline.PFClientLocal"
+        "promptflow.client.PFClient"
     ), patch(
-        "llmops.common.prompt_pipeline.PFClientAzure"
+        "promptflow.azure.PFClient"
     ) as mock_pf_client, patch(
-        "llmops.common.prompt_pipeline.MLClient"
+        "llmops.common.clients.MLClient"
     ) as mock_ml_client:
         # Mock the PFClient
         pf_client_instance = Mock()
@@ -287,3 +294,376 @@ def test_run_standard_flow_custom():
             assert run.data == expected_data[i]
             assert run.column_mapping == expected_column_mappings[i]
             assert run.environment_variables == {"key1": "value1"}
+
+
+def test_run_standard_flow_parallel(tmp_path):
+    """Test run_standard_flow executing variant runs in parallel."""
+    variant_selector = VariantsSelector.from_args("*")
+    output_file = tmp_path / "run_ids.txt"
+    with patch(
+        "promptflow.client.PFClient"
+    ) as mock_pf_client:
+        pf_client_instance = Mock()
+        mock_pf_client.return_value = pf_client_instance
+
+        def _create_run(**kwargs):
+            run = Mock()
+            run.name = kwargs["name"]
+            return run
+
+        pf_client_instance.run.side_effect = _create_run
+
+        # Start the run
+        prepare_and_execute(
+            variants_selector=variant_selector,
+            base_path=str(RESOURCE_PATH),
+            output_file=str(output_file),
+            max_parallel_runs=4,
+        )
+
+        # Expect the same 6 runs as the sequential execution
+        run_calls = pf_client_instance.run.call_args_list
+        assert len(run_calls) == 6
+        assert pf_client_instance.get_details.call_count == 6
+
+        submitted = sorted(
+            (call.kwargs["variant"], Path(call.kwargs["data"]).name)
+            for call in run_calls
+        )
+        assert submitted == sorted([
+            ("${node_var_0.var_0}", "ds1_source"),
+            ("${node_var_0.var_1}", "ds1_source"),
+            ("${node_var_1.var_4}", "ds1_source"),
+            ("${node_var_0.var_0}", "ds2_source"),
+            ("${node_var_0.var_1}", "ds2_source"),
+            ("${node_var_1.var_4}", "ds2_source"),
+        ])
+
+        # Run ids are written in plan order and are unique
+        run_names = [call.kwargs["name"] for call in run_calls]
+        assert len(set(run_names)) == len(run_names)
+        written_ids = resolve_run_ids(str(output_file))
+        assert sorted(written_ids) == sorted(run_names)
+        assert [name.endswith("_ds1") for name in written_ids] == [
+            True, True, True, False, False, False
+        ]
+
+
+def test_run_standard_flow_cached(tmp_path):
+    """Test that unchanged runs are reused from the run cache."""
+    variant_selector = VariantsSelector.from_args("defaults")
+    run_cache_dir = str(tmp_path / "run_cache")
+    with patch(
+        "promptflow.client.PFClient"
+    ) as mock_pf_client:
+        pf_client_instance = Mock()
+        mock_pf_client.return_value = pf_client_instance
+
+        run = Mock()
+        run.name = "cached_run"
+        run.status = "Completed"
+        pf_client_instance.run.return_value = run
+        pf_client_instance.get_details.return_value = pd.DataFrame(
+            {"outputs.output": ["answer"]}
+        )
+
+        for output_name in ["first.txt", "second.txt"]:
+            prepare_and_execute(
+                variants_selector=variant_selector,
+                exp_filename="experiment_3.yaml",
+                base_path=str(RESOURCE_PATH),
+                output_file=str(tmp_path / output_name),
+                run_cache_dir=run_cache_dir,
+            )
+
+        # The second execution reuses the first run
+        assert pf_client_instance.run.call_count == 1
+        assert resolve_run_ids(str(tmp_path / "second.txt")) == [
+            "cached_run"
+        ]
+
+
+def test_run_standard_flow_resume(tmp_path):
+    """Test resuming an interrupted execution from its checkpoint."""
+    variant_selector = VariantsSelector.from_args("*")
+    checkpoint_file = str(tmp_path / "checkpoint.json")
+    output_file = str(tmp_path / "run_ids.txt")
+    with patch(
+        "promptflow.client.PFClient"
+    ) as mock_pf_client:
+        pf_client_instance = Mock()
+        mock_pf_client.return_value = pf_client_instance
+        runs = {}
+        max_runs = [2]
+
+        def _create_run(**kwargs):
+            if len(runs) == max_runs[0]:
+                raise RuntimeError("Interrupted")
+            run = Mock()
+            run.name = kwargs["name"]
+            run.status = "Completed"
+            runs[run.name] = run
+            return run
+
+        pf_client_instance.run.side_effect = _create_run
+        pf_client_instance.runs.get.side_effect = lambda name: runs[name]
+
+        # The third run is interrupted
+        with pytest.raises(RuntimeError):
+            prepare_and_execute(
+                variants_selector=variant_selector,
+                base_path=str(RESOURCE_PATH),
+                checkpoint_file=checkpoint_file,
+            )
+        completed_runs = set(runs.keys())
+
+        # Only the 4 remaining runs are submitted again
+        max_runs[0] = None
+        pf_client_instance.run.reset_mock()
+        prepare_and_execute(
+            variants_selector=variant_selector,
+            base_path=str(RESOURCE_PATH),
+            checkpoint_file=checkpoint_file,
+            output_file=output_file,
+            resume=True,
+        )
+        assert pf_client_instance.run.call_count == 4
+        written_ids = resolve_run_ids(output_file)
+        assert len(written_ids) == 6
+        assert completed_runs <= set(written_ids)
+
+
+def test_run_standard_flow_submit_async(tmp_path):
+    """Test runs submitted without streaming and polled together."""
+    variant_selector = VariantsSelector.from_args("*")
+    output_file = str(tmp_path / "run_ids.txt")
+    with patch(
+        "promptflow.client.PFClient"
+    ) as mock_pf_client, patch("time.sleep"):
+        pf_client_instance = Mock()
+        mock_pf_client.return_value = pf_client_instance
+        polls = {}
+
+        def _create_run(**kwargs):
+            run = Mock()
+            run.name = kwargs["name"]
+            run.status = "NotStarted"
+            return run
+
+        def _get_run(name):
+            polls[name] = polls.get(name, 0) + 1
+            run = Mock()
+            run.name = name
+            run.status = "Completed" if polls[name] > 1 else "Running"
+            return run
+
+        pf_client_instance.run.side_effect = _create_run
+        pf_client_instance.runs.get.side_effect = _get_run
+
+        prepare_and_execute(
+            variants_selector=variant_selector,
+            base_path=str(RESOURCE_PATH),
+            output_file=output_file,
+            submit_async=True,
+        )
+
+        run_calls = pf_client_instance.run.call_args_list
+        assert len(run_calls) == 6
+        assert all(not call.kwargs["stream"] for call in run_calls)
+        assert sorted(polls.values()) == [2] * 6
+        assert pf_client_instance.get_details.call_count == 6
+        assert resolve_run_ids(output_file) == [
+            call.kwargs["name"] for call in run_calls
+        ]
+
+
+def test_run_standard_flow_dry_run():
+    """Test that a dry run only plans the runs."""
+    variant_selector = VariantsSelector.from_args("*")
+    with patch(
+        "promptflow.client.PFClient"
+    ) as mock_pf_client:
+        prepare_and_execute(
+            variants_selector=variant_selector,
+            base_path=str(RESOURCE_PATH),
+            dry_run=True,
+        )
+
+        mock_pf_client.assert_not_called()
+
+
+def test_run_standard_flow_grid():
+    """Test run_standard_flow with every combination of variants."""
+    variant_selector = VariantsSelector.from_args("grid")
+    flow_path = RESOURCE_PATH / "flows" / "exp_flow"
+    with patch(
+        "promptflow.client.PFClient"
+    ) as mock_pf_client:
+        pf_client_instance = Mock()
+        mock_pf_client.return_value = pf_client_instance
+        submitted_defaults = []
+        submitted_flows = []
+
+        def _create_run(**kwargs):
+            # A copy of the flow selects the combination through its defaults
+            submitted_flows.append(kwargs["flow"])
+            assert not kwargs["flow"].startswith(str(flow_path))
+            assert sorted(os.listdir(flow_path)) == ["flow.dag.yaml"]
+            flow_file_path = os.path.join(kwargs["flow"], "flow.dag.yaml")
+            with open(flow_file_path) as flow_file:
+                flow = yaml.safe_load(flow_file)
+            submitted_defaults.append(tuple(
+                node["default_variant_id"]
+                for node in flow["node_variants"].values()
+            ))
+            assert "variant" not in kwargs
+            return Mock()
+
+        pf_client_instance.run.side_effect = _create_run
+
+        prepare_and_execute(
+            variants_selector=variant_selector,
+            exp_filename="experiment_3.yaml",
+            base_path=str(RESOURCE_PATH),
+        )
+
+        assert submitted_defaults == [
+            ("var_0", "var_3"),
+            ("var_0", "var_4"),
+            ("var_1", "var_3"),
+            ("var_1", "var_4"),
+        ]
+        # The flow folder is untouched and the copies are removed
+        with open(flow_path / "flow.dag.yaml") as flow_file:
+            flow = yaml.safe_load(flow_file)
+        assert flow["node_variants"]["node_var_0"]["default_variant_id"] == (
+            "var_0"
+        )
+        assert not any(os.path.exists(flow) for flow in submitted_flows)
+
+
+def test_run_standard_flow_sharded(tmp_path):
+    """Test a dataset split in shards run in parallel and merged back."""
+    variant_selector = VariantsSelector.from_args("defaults")
+    output_file = str(tmp_path / "run_ids.txt")
+    report_dir = str(tmp_path / "reports")
+    with patch(
+        "promptflow.client.PFClient"
+    ) as mock_pf_client:
+        pf_client_instance = Mock()
+        mock_pf_client.return_value = pf_client_instance
+        submitted = {}
+
+        def _create_run(**kwargs):
+            with open(kwargs["data"]) as data_file:
+                submitted[kwargs["name"]] = (
+                    [json.loads(line)["data"] for line in data_file],
+                    kwargs["tags"],
+                )
+            run = Mock()
+            run.name = kwargs["name"]
+            run.status = "Completed"
+            return run
+
+        def _get_details(run):
+            rows = submitted[run.name][0]
+            return pd.DataFrame({
+                "inputs.line_number": list(range(len(rows))),
+                "outputs.output": rows,
+            })
+
+        pf_client_instance.run.side_effect = _create_run
+        pf_client_instance.get_details.side_effect = _get_details
+
+        prepare_and_execute(
+            variants_selector=variant_selector,
+            exp_filename="experiment_4.yaml",
+            base_path=str(RESOURCE_PATH),
+            output_file=output_file,
+            report_dir=report_dir,
+            save_output=True,
+            skip_html=True,
+            shards=2,
+        )
+
+        shard_names = resolve_run_ids(output_file)
+        assert len(shard_names) == 2
+        assert [submitted[name][0] for name in shard_names] == [
+            ["row 0", "row 1", "row 2"],
+            ["row 3", "row 4"],
+        ]
+        assert [
+            submitted[name][1]["llmops.shard_rows"] for name in shard_names
+        ] == ["0:3", "3:5"]
+        logical_name = submitted[shard_names[0]][1]["llmops.logical_run"]
+        assert shard_names == [
+            f"{logical_name}_shard0", f"{logical_name}_shard1"
+        ]
+
+        report = pd.read_csv(os.path.join(report_dir, "exp_result.csv"))
+        assert report["outputs.output"].tolist() == [
+            f"row {row}" for row in range(5)
+        ]
+        assert report["inputs.line_number"].tolist() == list(range(5))
+
+
+def test_run_standard_flow_sharded_resume(tmp_path):
+    """Test shards are checkpointed one by one and bounded in parallel."""
+    variant_selector = VariantsSelector.from_args("*")
+    checkpoint_file = str(tmp_path / "checkpoint.json")
+    output_file = str(tmp_path / "run_ids.txt")
+    with patch(
+        "promptflow.client.PFClient"
+    ) as mock_pf_client:
+        pf_client_instance = Mock()
+        mock_pf_client.return_value = pf_client_instance
+        runs = {}
+        in_flight = [0, 0]
+        lock = threading.Lock()
+
+        def _create_run(**kwargs):
+            with lock:
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight)
+            time.sleep(0.01)
+            with lock:
+                in_flight[0] -= 1
+            run = Mock()
+            run.name = kwargs["name"]
+            run.status = "Completed"
+            runs[run.name] = run
+            return run
+
+        pf_client_instance.run.side_effect = _create_run
+        pf_client_instance.runs.get.side_effect = lambda name: runs[name]
+        pf_client_instance.get_details.return_value = pd.DataFrame(
+            {"inputs.line_number": [0], "outputs.output": ["answer"]}
+        )
+
+        execution_args = {
+            "variants_selector": variant_selector,
+            "exp_filename": "experiment_4.yaml",
+            "base_path": str(RESOURCE_PATH),
+            "checkpoint_file": checkpoint_file,
+            "output_file": output_file,
+            "max_parallel_runs": 2,
+            "shards": 2,
+        }
+        prepare_and_execute(**execution_args)
+
+        # 3 variants run on 2 shards, at most 2 runs at the same time
+        assert pf_client_instance.run.call_count == 6
+        assert in_flight[1] <= 2
+        shard_names = resolve_run_ids(output_file)
+        with open(checkpoint_file) as manifest_file:
+            entries = json.load(manifest_file)["runs"]
+        assert sorted(entry["run_name"] for entry in entries.values()) == (
+            sorted(shard_names)
+        )
+        assert all(key.endswith(("|shard0", "|shard1")) for key in entries)
+
+        # Every shard is resumed from its own checkpoint entry
+        pf_client_instance.run.reset_mock()
+        prepare_and_execute(**execution_args, resume=True)
+        pf_client_instance.run.assert_not_called()
+        assert resolve_run_ids(output_file) == shard_names
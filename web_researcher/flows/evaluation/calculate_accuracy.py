@@ -5,13 +5,13 @@ from promptflow.core import log_metric, tool
 
 @tool
 def calculate_accuracy(grades: List[str]):
-    result = []
-    for index in range(len(grades)):
-        grade = grades[index]
-        result.append(grade)
-
-    # calculate accuracy for each variant
-    accuracy = round((result.count("Correct") / len(result)), 2)
+    # calculate accuracy for each variant, in a single pass over the grades
+    correct = sum(1 for grade in grades if grade == "Correct")
+    accuracy = round((correct / len(grades)), 2)
     log_metric("accuracy", accuracy)
+    # counts of the grades, the metrics of evaluation shards merge into
+    # the exact accuracy of the whole evaluation
+    log_metric("accuracy_count", len(grades))
+    log_metric("accuracy_sum", correct)
 
-    return result
+    return grades